@@ -1,24 +1,47 @@
 import os
-import requests
 import time
-import bs4
-from bs4 import BeautifulSoup
 import concurrent.futures
-import pandas as pd
-import numpy as np
-from time import sleep
-import time
 import warnings
 import uuid
-from requests_toolbelt import MultipartEncoder
-from decimal import Decimal
+import re
+import html
+import random
+from email.utils import parsedate_to_datetime
 import argparse
-
-try:
-	import jpredapi
-except ModuleNotFoundError:
-	print("You do not have the 'jpredapi' but that's no big deal.")
-	print("If you want to install it for next time, use the following command:\n$pip install jpredapi")
+import threading
+import asyncio
+import functools
+import sqlite3
+import hashlib
+import json
+import mmap
+from urllib.parse import urlparse
+import copy
+import io
+import importlib
+import importlib.util
+
+class LazyModule:
+	# Stands in for a heavy module and imports it the first time one of its attributes is used, so
+	# --help, cache hits and runs that never touch pandas (for example) do not pay for importing it
+
+	def __init__(self, name):
+		self.name = name
+		self.module = None
+
+	def __getattr__(self, attribute):
+		if self.module == None:
+			self.module = importlib.import_module(self.name)
+		return getattr(self.module, attribute)
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+bs4 = LazyModule('bs4')
+requests = LazyModule('requests')
+requests_adapters = LazyModule('requests.adapters')
+requests_toolbelt = LazyModule('requests_toolbelt')
+jpredapi = LazyModule('jpredapi')
+http_server = LazyModule('http.server')
 
 # Algos used:
 # (gor1, dpm, gor3, phd, predator, hnn, mlrc, sopm, dsc) via PRABI, (JPred) via JPred, (prof, sspro, yaspin, JNet, PSIPRED, sympred) via Sympred
@@ -56,6 +79,216 @@ jpred_seq_or_file = "sequence" # options are sequence or file
 jpred_input_file = ''
 check_jpred_status = int(60) # Number of minutes to keep checking the status before giving up.
 
+# Timeouts (seconds)
+jpred_timeout = 1300
+yaspin_timeout = 1300
+sympred_timeout = 1300
+
+# Output
+output_directory = None # None writes to the current working directory
+
+# Deadline and quorum
+# A job stops waiting once quorum predictions (of the 15) have arrived or deadline seconds have passed since it started,
+# whichever comes first. Runners that are still outstanding are cancelled (their polls stop) and vkabat is computed from
+# the predictions that arrived, so N counts only those. None waits for every predictor (up to its own timeout).
+deadline = None # seconds
+quorum = None # number of predictions
+
+# Variable regions
+# With smoothing_window set, the rolling mean and max of vkabat over that many residues (centred, cut short at the ends)
+# are added to the outputs as vkabat_mean and vkabat_max. With segment_threshold set, every run of at least
+# segment_min_length residues whose smoothed vkabat (or vkabat itself without smoothing) is at least segment_threshold
+# is written to <name>_vkabat_segments.csv (in batch mode to <fasta name>_vkabat_segments.csv for all sequences).
+smoothing_window = None # residues
+segment_threshold = None # vkabat
+segment_min_length = 1 # residues
+
+# Batch mode
+batch_concurrency = 4 # number of FASTA records processed at the same time (they share the per-host limits)
+
+# Service mode
+# --serve keeps PyVkabat running as a local service with a small HTTP API (submit a sequence or FASTA, query the
+# status, fetch the results). Every job goes through one persistent queue (service_queue_file, JSON lines) and all jobs
+# share one scheduler (per-host limits), one set of pooled connections, the prediction cache, the job journal and the
+# health tracker. service_concurrency jobs run at once and each writes its outputs to <output directory>/jobs/<job id>/.
+service_host = '127.0.0.1' # only reachable from this machine
+service_port = 8040
+service_queue_file = 'pyvkabat_queue.jsonl' # relative paths are placed in the output directory
+service_concurrency = 4 # number of jobs processed at the same time
+service_max_body = 50 * 1024 * 1024 # largest accepted submission in bytes
+
+# Recompute
+# --recompute recalculates vkabat from stored predictions (<name>_vkabat_dataframe.csv, <name>_vkabat.npz or packed
+# archive .pvk files, or directories holding them) without contacting any server, optionally for a subset of the predictors. The files are
+# spread over recompute_workers processes and the outputs go to the output directory (./recomputed by default).
+recompute_predictors = None # predictor or server names to keep, e.g. ('JPred', 'Sympred'); None keeps every stored predictor
+recompute_exclude = None # predictor or server names to leave out, e.g. ('PRABI',)
+recompute_workers = None # None starts one process per CPU
+
+# Request scheduler
+# Every request to a web server goes through the scheduler of its event loop, which limits, per host, how many requests
+# are in flight at once (max_concurrent) and how fast new requests are started (token bucket of
+# requests_per_second with room for burst requests). Sympred and Yaspin share the VU servers.
+# Jobs run on separate event loops (e.g. run_job called from several threads) are limited separately.
+host_limits = {
+				'npsa-prabi.ibcp.fr':{
+									'hosts':['npsa-prabi.ibcp.fr'],
+									'max_concurrent':4,
+									'requests_per_second':1.0,
+									'burst':4},
+
+				'compbio.dundee.ac.uk':{
+									'hosts':['www.compbio.dundee.ac.uk', 'compbio.dundee.ac.uk'],
+									'max_concurrent':2,
+									'requests_per_second':0.5,
+									'burst':2},
+
+				'ibi.vu.nl/zeus.few.vu.nl':{
+									'hosts':['www.ibi.vu.nl', 'ibi.vu.nl', 'zeus.few.vu.nl'],
+									'max_concurrent':2,
+									'requests_per_second':0.5,
+									'burst':2}
+				}
+
+# Predictor backends
+# Every prediction server with what the scheduler needs to know about it. Set 'enabled' to False to leave a backend out
+# of every run, and add or replace one by editing this table or with register_backend().
+#   runner:         name of the coroutine that takes a VkabatJob and returns {predictor: per-residue assignments}
+#   parser:         name of the result page parser the runner uses (Sympred and Yaspin parsers also take n_residues)
+#   host:           group of host_limits (or one of its hosts) its requests count against, whatever URL they are sent to
+#   latency:        expected seconds until its predictions arrive; a job starts its slowest backends first
+#   max_concurrent: requests of this backend in flight at once over all sequences (None: only the host limits apply),
+#                   so a slow backend cannot take every request slot of a host it shares with a fast one
+#   max_length:     longest sequence it accepts (None: no limit); longer sequences are split into windows
+#   predictors:     the prediction columns it returns
+backends = {
+			'PRABI':{
+					'runner':'runPrabi_async',
+					'parser':'parse_prabi_page',
+					'host':'npsa-prabi.ibcp.fr',
+					'latency':60,
+					'max_concurrent':None,
+					'max_length':None,
+					'predictors':('gor1', 'gor3', 'dpm', 'predator', 'hnn', 'sopm', 'mlrc', 'dsc'),
+					'enabled':True},
+
+			'YASPIN':{
+					'runner':'runYaspin_async',
+					'parser':'parse_yaspin_page',
+					'host':'ibi.vu.nl/zeus.few.vu.nl',
+					'latency':300,
+					'max_concurrent':None,
+					'max_length':None,
+					'predictors':('YASPIN',),
+					'enabled':True},
+
+			'JPred':{
+					'runner':'run_alt_JPred_async',
+					'parser':'parse_jpred_page',
+					'host':'compbio.dundee.ac.uk',
+					'latency':600,
+					'max_concurrent':None,
+					'max_length':800, # JPred single sequence submissions accept 20-800 residues
+					'predictors':('JPred',),
+					'enabled':True},
+
+			'Sympred':{
+					'runner':'runSympred5_async',
+					'parser':'parse_sympred_page',
+					'host':'ibi.vu.nl/zeus.few.vu.nl',
+					'latency':900,
+					'max_concurrent':1, # leaves the other VU request slot to Yaspin
+					'max_length':None,
+					'predictors':('PHD', 'PROF', 'SSPRO', 'JNET', 'PSIPRED'),
+					'enabled':True},
+
+			'Local':{
+					'runner':'run_local_async',
+					'parser':None,
+					'host':None,
+					'latency':0,
+					'max_concurrent':None,
+					'max_length':None,
+					'predictors':('gor1_local', 'chou_fasman'),
+					'enabled':False} # --local adds it to the web servers, --local_only runs it alone
+			}
+
+# Local predictors
+# GOR I and Chou-Fasman computed in this process (the 'Local' backend), for a fast provisional vkabat without any
+# network. GOR I uses the information table in gor_table_file (JSON: {state: {amino acid: 17 values in centinats for
+# window offsets -8..8}}) and the job's dch/dce/dct/dcc decision constants unless constants is "0"; a constant whose
+# state is not in the table (e.g. dct for an H/E/C table) is not used. Without a table file gor1_local is left out and
+# only chou_fasman is predicted.
+gor_table_file = None
+local_workers = 0 # number of worker processes for the local predictors (0 runs them on the event loop)
+
+# Long sequences
+# A sequence longer than the max_length of a backend is split into windows of at most that length which overlap by
+# chunk_overlap residues. The windows are submitted concurrently and stitched back together: in the overlap of two
+# neighbouring windows, the first half of the residues is taken from the left window and the second half from the
+# right one, so every residue comes from the window where it is furthest from an edge.
+chunk_overlap = 100 # residues
+
+# Incremental output
+incremental_output = False # write <name>_vkabat_partial.csv each time a predictor finishes
+
+# Server health
+# Outcomes and latencies of every predictor are kept in a small JSON file (in the output directory) across runs.
+# After breaker_failures failures in a row a predictor's circuit breaker opens and it is skipped without submitting
+# for breaker_cooldown seconds. Then one job is let through to probe the server (half-open): a success closes the
+# circuit, a failure opens it for another cooldown.
+use_health = True
+health_file = 'pyvkabat_health.json' # relative paths are placed in the output directory
+breaker_failures = 3
+breaker_cooldown = 600 # seconds
+health_window = 100 # number of recent latencies kept per predictor
+
+# Output formats
+# 'csv' writes <name>_vkabat_dataframe.csv and <name>_vkabat.csv, 'parquet' writes <name>_vkabat.parquet (needs pyarrow)
+# and 'npz' writes <name>_vkabat.npz. In batch mode 'parquet' appends one row group per sequence to <fasta name>_vkabat.parquet.
+# 'archive' writes the predictions packed into 2 bits per residue per predictor to <name>_vkabat.pvk (with its offset
+# index <name>_vkabat.pvk.index); in batch mode every sequence is appended to <fasta name>_vkabat.pvk.
+output_formats = ('csv',)
+
+# Metrics
+metrics_jsonl_file = None # append one JSON line per timed stage (submit, queue_wait, poll, download, parse, process_data, ...)
+metrics_prometheus_file = None # Prometheus textfile with stage histograms and counters, rewritten after every sequence
+metrics_buckets = (0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1200) # histogram buckets in seconds
+
+# Server override
+server_override = None # e.g. 'http://127.0.0.1:8000' to send every request to the offline mock server (pyvkabat_mock_server.py)
+
+# HTTP requests
+request_timeout = (10, 60) # (connect, read) seconds; a request to a server that stops answering fails after this
+
+# Result polling
+# Submitted JPred, Sympred and Yaspin jobs are checked by one shared poller. The delay between checks of a job
+# starts at poll_initial_delay and grows by poll_backoff_factor up to poll_max_delay, with +/- poll_jitter
+# (fraction) of random jitter. A Retry-After header sent by the server takes precedence.
+poll_initial_delay = 5 # seconds
+poll_backoff_factor = 1.5
+poll_max_delay = 60 # seconds
+poll_jitter = 0.2
+
+# Result parsing
+parse_workers = 0 # number of worker processes used to parse result pages (0 parses them on the event loop)
+
+# Prediction cache
+# Predictions are stored in a local SQLite file keyed by a hash of (sequence, predictor, parameters)
+# so repeat runs of the same protein do not resubmit it to the web servers.
+use_cache = True
+cache_file = 'pyvkabat_cache.sqlite' # relative paths are placed in the output directory
+cache_ttl = 30 * 24 * 60 * 60 # seconds a cached prediction stays valid (30 days)
+cache_max_entries = 100000 # least recently used predictions are evicted above this size
+cache_evict_to = 0.9 # fraction of cache_max_entries kept by an eviction, so evictions only run every few thousand new entries
+
+# Job journal
+# Every JPred, Sympred and Yaspin submission (predictor, job ID, results URL, submit time) is appended to a journal
+# before its results are polled. A run that is restarted reattaches to jobs that are still in flight instead of
+# submitting them again.
+use_journal = True
+journal_file = 'pyvkabat_journal.jsonl' # relative paths are placed in the output directory
+
 #############################################################################
 
 def parse_arguments():
@@ -63,7 +296,7 @@ def parse_arguments():
 	parser = argparse.ArgumentParser(description='Calculates secondary structure variability (vkabat = k * N / n1) for each resiue in a protein sequence.')
 
 	# positional arguments
-	parser.add_argument('sequence', metavar='<sequence>', type=str, help='Enter sequence (using 1 letter amino acid abbreviations)')
+	parser.add_argument('sequence', metavar='<sequence>', type=str, nargs='?', help='Enter sequence (using 1 letter amino acid abbreviations)')
 
 	# optional arguments
 	parser.add_argument('--name', metavar='<protein name>', type=str, help='Enter the name of the protein sequence or job name. This is a way to keep track of the submission and will affect the csv file names deposited in the project folder.')
@@ -72,56 +305,1222 @@ def parse_arguments():
 	parser.add_argument('--jpred_timeout', metavar='<time>', type=int, help='Enter the maximum allowable time for JPred data retreival in seconds.')
 	parser.add_argument('--yaspin_timeout', metavar='<time>', type=int, help='Enter the maximum allowable time for Yaspin data retreival in seconds.')
 	parser.add_argument('--sympred_timeout', metavar='<time>', type=int, help='Enter the maximum allowable time for Sympred data retreival in seconds.')
+	parser.add_argument('--deadline', metavar='<time>', type=int, help='Enter the maximum time in seconds to wait for predictions. Vkabat is computed from the predictions that arrived by then.')
+	parser.add_argument('--quorum', metavar='<predictions>', type=int, help='Enter the number of predictions (of 15) after which vkabat is computed without waiting for the rest.')
+	parser.add_argument('--fasta', metavar='<fasta file>', type=str, help='Enter the path to a (multi-record) FASTA file to run in batch mode instead of a single sequence. Records are read one at a time and each gets its own csv files.')
+	parser.add_argument('--recompute', metavar='<stored predictions>', type=str, nargs='+', help='Enter one or more <name>_vkabat_dataframe.csv, <name>_vkabat.npz or .pvk archive files (or directories holding them) to recompute vkabat from, without contacting the web servers.')
+	parser.add_argument('--predictors', metavar='<predictor>', type=str, nargs='+', choices=predictor_choices(), help='Enter the predictors (or servers: PRABI, JPred, Sympred, YASPIN) to keep when recomputing.')
+	parser.add_argument('--exclude', metavar='<predictor>', type=str, nargs='+', choices=predictor_choices(), help='Enter the predictors (or servers: PRABI, JPred, Sympred, YASPIN) to leave out when recomputing.')
+	parser.add_argument('--recompute_workers', metavar='<processes>', type=int, help='Enter the number of worker processes used to recompute stored predictions (default: one per CPU).')
+	parser.add_argument('--serve', action='store_true', help='Run as a long-running local service with an HTTP API to submit sequences or FASTA files, query their status and fetch their results.')
+	parser.add_argument('--port', metavar='<port>', type=int, help='Enter the port the service listens on.')
+	parser.add_argument('--bind', metavar='<address>', type=str, help='Enter the address the service listens on (default 127.0.0.1, only reachable from this machine).')
+	parser.add_argument('--max_concurrent', metavar='<requests>', type=int, help='Override the maximum number of simultaneous requests sent to each host (and by each backend that has a limit of its own).')
+	parser.add_argument('--requests_per_second', metavar='<rate>', type=float, help='Override the maximum rate at which new requests are sent to each host.')
+	parser.add_argument('--output_format', metavar='<format>', type=str, nargs='+', choices=['csv', 'parquet', 'npz', 'archive'], help='Enter one or more output formats: csv, parquet (typed columns, one dataset per batch), npz and/or archive (2-bit packed predictions, one archive per batch).')
+	parser.add_argument('--max_length', metavar='<residues>', type=int, help='Override the maximum sequence length sent to each predictor. Longer sequences are split into overlapping windows.')
+	parser.add_argument('--local', action='store_true', help='Add the local Chou-Fasman (and, with --gor_table, GOR I) predictions (computed without any network) to the web server predictions.')
+	parser.add_argument('--local_only', action='store_true', help='Only use the local GOR I and Chou-Fasman predictors (needs --gor_table), for a fast provisional vkabat without contacting any web server.')
+	parser.add_argument('--gor_table', metavar='<table file>', type=str, help='Enter the path to a GOR I information table (JSON) for the local GOR I predictor, which is left out without one. Decision constants of states the table does not have (dct for an H/E/C table) are not used.')
+	parser.add_argument('--local_workers', metavar='<processes>', type=int, help='Enter the number of worker processes used by the local predictors (useful for large batches).')
+	parser.add_argument('--disable', metavar='<backend>', type=str, nargs='+', choices=list(backends.keys()), help='Enter the prediction servers (PRABI, YASPIN, JPred, Sympred) to leave out of the run.')
+	parser.add_argument('--chunk_overlap', metavar='<residues>', type=int, help='Enter the number of residues neighbouring windows of a long sequence overlap by.')
+	parser.add_argument('--smooth', metavar='<residues>', type=int, help='Enter the window width of the rolling mean and max of vkabat added to the outputs (vkabat_mean and vkabat_max).')
+	parser.add_argument('--segment_threshold', metavar='<vkabat>', type=float, help='Enter the (smoothed) vkabat at or above which residues form a variable segment. The segments are written to <name>_vkabat_segments.csv.')
+	parser.add_argument('--segment_min_length', metavar='<residues>', type=int, help='Enter the minimum length of a variable segment.')
+	parser.add_argument('--incremental', action='store_true', help='Write a partial vkabat csv file (<name>_vkabat_partial.csv) each time a predictor finishes.')
+	parser.add_argument('--parse_workers', metavar='<processes>', type=int, help='Enter the number of worker processes used to parse result pages (useful for large batches).')
+	parser.add_argument('--server', metavar='<url>', type=str, help='Send every request to this server instead of the public web servers (for example the offline mock server, pyvkabat_mock_server.py).')
+	parser.add_argument('--metrics_jsonl', metavar='<file>', type=str, help='Append per-stage timings (one JSON line per span) to this file.')
+	parser.add_argument('--metrics_prometheus', metavar='<file>', type=str, help='Write stage timing histograms and counters to this Prometheus textfile.')
+	parser.add_argument('--cache', metavar='<cache file>', type=str, help='Enter the path to the prediction cache (SQLite) file.')
+	parser.add_argument('--cache_ttl', metavar='<time>', type=int, help='Enter the maximum age of a cached prediction in seconds.')
+	parser.add_argument('--no_cache', action='store_true', help='Always submit to the web servers and do not read or write the prediction cache.')
+	parser.add_argument('--journal', metavar='<journal file>', type=str, help='Enter the path to the job journal file used to resume polling of submitted jobs after a restart.')
+	parser.add_argument('--no_journal', action='store_true', help='Do not record submitted jobs and always submit new ones.')
+	parser.add_argument('--health', metavar='<health file>', type=str, help='Enter the path to the server health file used by the circuit breakers.')
+	parser.add_argument('--no_health', action='store_true', help='Do not track server health and never skip a predictor.')
+	parser.add_argument('--breaker_cooldown', metavar='<time>', type=int, help='Enter the number of seconds a failing predictor is skipped before it is tried again.')
+	parser.add_argument('--batch_concurrency', metavar='<sequences>', type=int, help='Enter the number of FASTA records processed at the same time in batch mode.')
 
 	args = parser.parse_args()
 
-	# seq_name
-	global seq_name
-	if args.name == None:
-		seq_name = "test"
-	else:
-		seq_name = args.name
-	print(f'Sequence Name: {seq_name}')
+	if [args.sequence, args.fasta, args.recompute, args.serve or None].count(None) != 3:
+		parser.error('Enter either a <sequence>, --fasta <fasta file>, --recompute <stored predictions> or --serve.')
+	if args.recompute == None and (args.predictors != None or args.exclude != None):
+		parser.error('--predictors and --exclude are only used with --recompute.')
+	if args.local_only and args.gor_table == None:
+		parser.error('--local_only needs a --gor_table: with Chou-Fasman as the only predictor, vkabat is always 1.')
 
-	# sequence
-	global sequence
-	sequence = args.sequence
-	print(f'Input Sequence: {sequence}')
-	print(f'Sequence length: {len(sequence)}')
+	# name and sequence (the job itself is made by main)
+	if args.name == None:
+		args.name = "test"
+	print(f'Sequence Name: {args.name}')
+
+	if args.sequence != None:
+		print(f'Input Sequence: {args.sequence}')
+		print(f'Sequence length: {len(args.sequence)}')
+
+	# email
+	global email
+	if args.email != None:
+		email = args.email
+
+	# fasta_file
+	global fasta_file
+	fasta_file = args.fasta
+	if fasta_file != None:
+		print(f'FASTA file: {fasta_file}')
+
+	# recompute
+	global recompute_paths
+	global recompute_predictors
+	global recompute_exclude
+	global recompute_workers
+	recompute_paths = args.recompute
+	if args.predictors != None:
+		recompute_predictors = tuple(args.predictors)
+	if args.exclude != None:
+		recompute_exclude = tuple(args.exclude)
+	if args.recompute_workers != None:
+		recompute_workers = max(args.recompute_workers, 1)
+	if recompute_paths != None:
+		print(f'Recomputing stored predictions: {", ".join(recompute_paths)}')
+
+	# service
+	global serve
+	global service_host
+	global service_port
+	serve = args.serve
+	if args.bind != None:
+		service_host = args.bind
+	if args.port != None:
+		service_port = args.port
+
+	# host_limits
+	for limits in host_limits.values():
+		if args.max_concurrent != None:
+			limits['max_concurrent'] = args.max_concurrent
+		if args.requests_per_second != None:
+			limits['requests_per_second'] = args.requests_per_second
 
 	# jpred_timeout
 	global jpred_timeout
-	if args.jpred_timeout == None:
-		jpred_timeout = 1300 # 30 minutes (1300 seconds)
-	else:
+	if args.jpred_timeout != None:
 		jpred_timeout = args.jpred_timeout
 	print(f'Maximum time allowed for JPred: {jpred_timeout} seconds.')
 
 	# yaspin_timeout
 	global yaspin_timeout
-	if args.yaspin_timeout == None:
-		yaspin_timeout = 1300 # 30 minutes (1300 seconds)
-	else:
+	if args.yaspin_timeout != None:
 		yaspin_timeout = args.yaspin_timeout
 	print(f'Maximum time allowed for Yaspin: {yaspin_timeout} seconds.')
 
 	# sympred_timeout
 	global sympred_timeout
-	if args.sympred_timeout == None:
-		sympred_timeout = 1300 # 30 minutes (1300 seconds)
-	else:
+	if args.sympred_timeout != None:
 		sympred_timeout = args.sympred_timeout
 	print(f'Maximum time allowed for Sympred: {sympred_timeout} seconds.')
 
+	# deadline and quorum
+	global deadline
+	global quorum
+	if args.deadline != None:
+		deadline = args.deadline
+		print(f'Deadline: {deadline} seconds.')
+	if args.quorum != None:
+		quorum = args.quorum
+		print(f'Quorum: {quorum} predictions.')
+
+	# variable regions
+	global smoothing_window
+	global segment_threshold
+	global segment_min_length
+	if args.smooth != None:
+		if args.smooth < 1:
+			parser.error('--smooth must be at least 1 residue.')
+		smoothing_window = args.smooth
+		print(f'Smoothing window: {smoothing_window} residues.')
+	if args.segment_threshold != None:
+		segment_threshold = args.segment_threshold
+		print(f'Variable segments: vkabat >= {segment_threshold}')
+	if args.segment_min_length != None:
+		segment_min_length = max(args.segment_min_length, 1)
+
 	# output_directory
 	global output_directory
-	if args.dir == None:
+	if args.dir == None and recompute_paths != None:
+		output_directory = os.path.join(os.getcwd(), 'recomputed')
+	elif args.dir == None:
 		output_directory = os.getcwd()
 	else:
 		output_directory = args.dir
 	print(f'Output Directory: {output_directory}')
 
-def runPrabi():
+	# incremental_output
+	global incremental_output
+	if args.incremental:
+		incremental_output = True
+
+	# backends
+	for backend in backends.values():
+		if args.max_concurrent != None and backend['max_concurrent'] != None:
+			backend['max_concurrent'] = args.max_concurrent
+	if args.max_length != None:
+		for backend in backends.values():
+			backend['max_length'] = args.max_length
+	if args.local or args.local_only:
+		backends['Local']['enabled'] = True
+	if args.local_only:
+		for name, backend in backends.items():
+			backend['enabled'] = name == 'Local'
+	if args.disable != None:
+		for name in args.disable:
+			backends[name]['enabled'] = False
+
+	# local predictors
+	global gor_table_file
+	global local_workers
+	if args.gor_table != None:
+		gor_table_file = args.gor_table
+	if args.local_workers != None:
+		local_workers = max(args.local_workers, 0)
+	if backends['Local']['enabled']:
+		if gor_table_file == None:
+			print('Local predictors: chou_fasman (gor1_local needs a --gor_table)')
+		else:
+			gor_states = load_gor_table(gor_table_file)[0]
+			print(f'Local predictors: gor1_local ({gor_table_file}, states {", ".join(gor_states)}), chou_fasman')
+			unused_constants = [f'dc{state.lower()}' for state in ('H', 'E', 'T', 'C') if state not in gor_states]
+			if len(unused_constants) > 0:
+				print(f'Local predictors: {", ".join(unused_constants)} not used, the GOR table has no such state')
+	print(f'Prediction servers: {", ".join(name for name, backend in backends.items() if backend["enabled"])}')
+
+	# chunk_overlap
+	global chunk_overlap
+	if args.chunk_overlap != None:
+		chunk_overlap = args.chunk_overlap
+
+	# output_formats
+	global output_formats
+	if args.output_format != None:
+		output_formats = tuple(args.output_format)
+	print(f'Output formats: {", ".join(output_formats)}')
+
+	# parse_workers
+	global parse_workers
+	if args.parse_workers != None:
+		parse_workers = args.parse_workers
+
+	# server_override
+	global server_override
+	if args.server != None:
+		server_override = args.server
+		print(f'Sending every request to {server_override}')
+
+	# metrics
+	global metrics_jsonl_file
+	global metrics_prometheus_file
+	if args.metrics_jsonl != None:
+		metrics_jsonl_file = args.metrics_jsonl
+	if args.metrics_prometheus != None:
+		metrics_prometheus_file = args.metrics_prometheus
+
+	# recompute and the local predictors never contact a server, so they have no use for the cache, journal or health file
+	global use_cache
+	global use_journal
+	global use_health
+	if recompute_paths != None or args.local_only:
+		use_cache = False
+		use_journal = False
+		use_health = False
+
+	# cache
+	global cache_file
+	global cache_ttl
+	if args.no_cache:
+		use_cache = False
+	if args.cache != None:
+		cache_file = args.cache
+	if args.cache_ttl != None:
+		cache_ttl = args.cache_ttl
+	if use_cache:
+		print(f'Prediction cache: {os.path.join(output_directory, cache_file)}')
+	else:
+		print('Prediction cache: disabled')
+
+	# journal
+	global journal_file
+	if args.no_journal:
+		use_journal = False
+	if args.journal != None:
+		journal_file = args.journal
+	if use_journal:
+		print(f'Job journal: {os.path.join(output_directory, journal_file)}')
+	else:
+		print('Job journal: disabled')
+
+	# health
+	global health_file
+	global breaker_cooldown
+	if args.no_health:
+		use_health = False
+	if args.health != None:
+		health_file = args.health
+	if args.breaker_cooldown != None:
+		breaker_cooldown = args.breaker_cooldown
+
+	# batch_concurrency (also the number of jobs the service runs at once)
+	global batch_concurrency
+	global service_concurrency
+	if args.batch_concurrency != None:
+		batch_concurrency = max(args.batch_concurrency, 1)
+		service_concurrency = batch_concurrency
+
+	return args
+
+class VkabatJob:
+	# Everything one run needs to know about its sequence: name, sequence, output directory, email, timeouts and the
+	# PRABI parameters. Runners only read the job they are given, so many jobs can run at once in one process.
+	# Settings that are not passed are taken from the Configuration Area.
+
+	settings = ('output_directory', 'email', 'jpred_timeout', 'yaspin_timeout', 'sympred_timeout', 'deadline', 'quorum',
+				'smoothing_window', 'segment_threshold', 'segment_min_length',
+				'alignment_width', 'constants', 'dch', 'dce', 'dct', 'dcc', 'use_dssp_or_stride', 'states', 'threshold', 'width')
+
+	def __init__(self, sequence, name='test', **settings):
+		unknown = [setting for setting in settings.keys() if setting not in self.settings]
+		if len(unknown) > 0:
+			raise TypeError(f'Unknown job settings: {", ".join(unknown)}')
+
+		self.sequence = sequence
+		self.name = str(name).replace(os.sep, '_')
+		for setting in self.settings:
+			setattr(self, setting, settings.get(setting, globals()[setting]))
+		if self.output_directory == None:
+			self.output_directory = os.getcwd()
+
+		# ColumnarDataset the job appends its parquet rows to instead of writing its own file (set by run_batch_async)
+		self.dataset = None
+
+		# PredictionArchive the job appends its packed predictions to instead of writing its own archive (set by run_batch_async)
+		self.archive = None
+
+		# open file the job appends its variable segments to instead of writing its own file (set by run_batch_async)
+		self.segment_file = None
+
+		# identifies the job (and its windows, which are copies) as the owner of a circuit breaker probe
+		self.id = uuid.uuid4().hex
+
+	def __repr__(self):
+		return f'VkabatJob(name={self.name!r}, length={len(self.sequence)})'
+
+	def window(self, start, end):
+		# Copy of the job for residues start:end (0-based, end exclusive), used to submit a window of a long sequence
+		window_job = copy.copy(self)
+		window_job.sequence = self.sequence[start:end]
+		window_job.name = f'{self.name}_{start + 1}-{end}'
+		return window_job
+
+class MetricsRecorder:
+	# Records how long each stage (submit, queue_wait, poll, download, parse, process_data, ...) takes per
+	# predictor and sequence, plus counters such as HTTP responses per host and status. Every span is appended
+	# to metrics_jsonl_file as one JSON line when it is set; aggregates can be written as a Prometheus textfile.
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.histograms = dict()
+		self.counters = dict()
+		self.jsonl = None
+
+	def record(self, stage, predictor, seconds, sequence=None, **fields):
+		with self.lock:
+			histogram = self.histograms.get((stage, predictor))
+			if histogram == None:
+				histogram = {'buckets': [0] * len(metrics_buckets), 'sum': 0.0, 'count': 0}
+				self.histograms[(stage, predictor)] = histogram
+			for idx, bucket in enumerate(metrics_buckets):
+				if seconds <= bucket:
+					histogram['buckets'][idx] += 1
+			histogram['sum'] += seconds
+			histogram['count'] += 1
+
+			if metrics_jsonl_file != None:
+				if self.jsonl == None:
+					self.jsonl = open(metrics_jsonl_file, 'a')
+				event = {'time': time.time(), 'sequence': sequence, 'stage': stage, 'predictor': predictor, 'seconds': seconds}
+				event.update(fields)
+				self.jsonl.write(json.dumps(event) + '\n')
+				self.jsonl.flush()
+
+	def count(self, name, value=1, **labels):
+		# labels that are None (e.g. no predictor) are left out
+		key = (name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items() if label_value != None)))
+		with self.lock:
+			self.counters[key] = self.counters.get(key, 0) + value
+
+	def prometheus_text(self):
+		def series(name, labels):
+			# name{label="value",...}, without the labels that are None and with \, " and newlines escaped in the values
+			label_values = [(label, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for label, value in labels if value != None]
+			if len(label_values) == 0:
+				return name
+			return name + '{' + ','.join(f'{label}="{value}"' for label, value in label_values) + '}'
+
+		lines = ['# HELP pyvkabat_stage_seconds Time spent in each stage per predictor.', '# TYPE pyvkabat_stage_seconds histogram']
+		with self.lock:
+			for (stage, predictor), histogram in sorted(self.histograms.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+				labels = [('stage', stage), ('predictor', predictor)]
+				for bucket, bucket_count in zip(metrics_buckets, histogram['buckets']):
+					lines.append(f'{series("pyvkabat_stage_seconds_bucket", labels + [("le", bucket)])} {bucket_count}')
+				lines.append(f'{series("pyvkabat_stage_seconds_bucket", labels + [("le", "+Inf")])} {histogram["count"]}')
+				lines.append(f'{series("pyvkabat_stage_seconds_sum", labels)} {histogram["sum"]}')
+				lines.append(f'{series("pyvkabat_stage_seconds_count", labels)} {histogram["count"]}')
+
+			names = sorted({name for name, _ in self.counters.keys()})
+			for name in names:
+				lines.append(f'# TYPE pyvkabat_{name}_total counter')
+				for (counter_name, labels), value in sorted(self.counters.items()):
+					if counter_name == name:
+						lines.append(f'{series(f"pyvkabat_{name}_total", labels)} {value}')
+
+		return '\n'.join(lines) + '\n'
+
+	def write_prometheus(self, path):
+		temporary_path = path + '.tmp'
+		with open(temporary_path, 'w') as prometheus_file:
+			prometheus_file.write(self.prometheus_text())
+		os.replace(temporary_path, path)
+
+	def summary(self):
+		# Per predictor stage totals, poll counts and the HTTP status histogram, for the end of run log
+		lines = []
+		with self.lock:
+			for (stage, predictor), histogram in sorted(self.histograms.items(), key=lambda item: (str(item[0][1]), item[0][0])):
+				lines.append(f'  {predictor or "-":<10} {stage:<13} n={histogram["count"]:<5} total={histogram["sum"]:.3f}s mean={histogram["sum"] / histogram["count"]:.3f}s')
+			for (name, labels), value in sorted(self.counters.items()):
+				if name in ('polls', 'http_responses', 'timeouts', 'cancelled', 'skipped'):
+					lines.append(f'  {name} {dict(labels)}: {value}')
+		return '\n'.join(lines)
+
+metrics = MetricsRecorder()
+
+# Guards the lazy creation of the shared objects below, which may be reached from several threads at once
+shared_init_lock = threading.Lock()
+
+http_session = None
+
+def get_session():
+	# One requests session shared by all runners. Each host group gets its own keep-alive connection pool
+	# sized to its max_concurrent, so polls and submissions reuse connections instead of opening new ones.
+	global http_session
+	with shared_init_lock:
+		if http_session == None:
+			http_session = requests.Session()
+			http_session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+			for host_limit in host_limits.values():
+				adapter = requests_adapters.HTTPAdapter(pool_connections=2 * len(host_limit['hosts']), pool_maxsize=host_limit['max_concurrent'])
+				for host in host_limit['hosts']:
+					http_session.mount(f'http://{host}/', adapter)
+					http_session.mount(f'https://{host}/', adapter)
+	return http_session
+
+def session_stats():
+	# Counts requests sent and connections opened over all connection pools of the shared session
+	stats = {'requests': 0, 'connections': 0, 'reused': 0}
+	if http_session == None:
+		return stats
+
+	for adapter in set(http_session.adapters.values()):
+		pools = adapter.poolmanager.pools
+		for pool_key in pools.keys():
+			pool = pools[pool_key]
+			stats['requests'] += pool.num_requests
+			stats['connections'] += pool.num_connections
+
+	stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+	return stats
+
+def register_backend(name, runner, parser=None, host=None, latency=0, max_concurrent=None, max_length=None, predictors=(), enabled=True):
+	# Adds (or replaces) a prediction server. runner and parser may be functions or names of functions in this module.
+	backends[name] = {
+						'runner':runner,
+						'parser':parser,
+						'host':host,
+						'latency':latency,
+						'max_concurrent':max_concurrent,
+						'max_length':max_length,
+						'predictors':tuple(predictors),
+						'enabled':enabled}
+
+def backend_function(function):
+	# Backends name their runner and parser, since the table is defined before the functions are
+	return globals()[function] if isinstance(function, str) else function
+
+def backend_parser(name):
+	return backend_function(backends[name]['parser'])
+
+def backend_of(predictor):
+	# Name of the backend a predictor (or backend) name belongs to, or None
+	if predictor in backends:
+		return predictor
+	for name, backend in backends.items():
+		if predictor in backend['predictors']:
+			return name
+	return None
+
+class HostLimiter:
+	# Limits the number of requests in flight (semaphore) and the request rate (token bucket) for one host, and sends
+	# them from a thread pool with one thread per request slot
+
+	def __init__(self, name, max_concurrent, requests_per_second, burst):
+		self.semaphore = asyncio.Semaphore(max_concurrent)
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix=f'pyvkabat_{name}')
+		self.requests_per_second = float(requests_per_second)
+		self.capacity = float(burst)
+		self.tokens = float(burst)
+		self.last_refill = time.monotonic()
+
+	async def take_token(self):
+		while True:
+			now = time.monotonic()
+			self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.requests_per_second)
+			self.last_refill = now
+			if self.tokens >= 1:
+				self.tokens -= 1
+				return
+			await asyncio.sleep((1 - self.tokens) / self.requests_per_second)
+
+class RequestScheduler:
+	# Sends every request through the limiter of its host so all runners (and all sequences of a batch) share the same limits.
+	# A backend with a max_concurrent of its own also takes one of its slots first, before it queues for the host.
+	# Waiting (for a slot, a token or the next poll) happens on the event loop; only requests that are actually
+	# being sent occupy a thread of their host group's executor (made with its limiter, so groups registered later get
+	# threads too), so the thread count does not grow with the number of jobs.
+
+	def __init__(self, limits, loop):
+		self.loop = loop
+		self.limits = limits
+		# made on first use, so host groups and backends registered after the scheduler was created are limited too
+		self.limiters = dict()
+		self.backend_limiters = dict()
+
+		# a few threads for hosts without limits; the host groups have their own
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='pyvkabat_http')
+
+		self.poller = ResultPoller(self)
+
+	def host_limiter(self, host):
+		# The limiter of a host group of host_limits, given its name or one of its hosts, or None if host has no limits
+		for name, host_limit in self.limits.items():
+			if host == name or host in host_limit['hosts']:
+				if name not in self.limiters:
+					self.limiters[name] = HostLimiter(name, host_limit['max_concurrent'], host_limit['requests_per_second'], host_limit['burst'])
+				return self.limiters[name]
+		return None
+
+	def backend_limiter(self, name):
+		# Semaphore of a backend with a max_concurrent of its own, or None
+		if name not in backends or backends[name]['max_concurrent'] == None:
+			return None
+		if name not in self.backend_limiters:
+			self.backend_limiters[name] = asyncio.Semaphore(backends[name]['max_concurrent'])
+		return self.backend_limiters[name]
+
+	async def call(self, host, function, *args, predictor=None, stage='request', sequence=None, **kwargs):
+		# Runs a blocking call that talks to host (a request or a jpredapi call) under the limits of the host its
+		# predictor's backend declares (or of host itself when there is none) and of the backend. The time spent waiting
+		# for the limiters (queue_wait) and in the call itself (stage) are recorded in metrics.
+		blocking_call = functools.partial(function, *args, **kwargs)
+		queue_start = time.perf_counter()
+		backend = backend_of(predictor)
+		held = []
+		try:
+			backend_limiter = self.backend_limiter(backend)
+			if backend_limiter != None:
+				await backend_limiter.acquire()
+				held.append(backend_limiter)
+
+			declared_host = backends[backend]['host'] if backend != None else None
+			limiter = self.host_limiter(declared_host if declared_host != None else host)
+			if limiter != None:
+				await limiter.semaphore.acquire()
+				held.append(limiter.semaphore)
+				await limiter.take_token()
+			metrics.record('queue_wait', predictor, time.perf_counter() - queue_start, sequence, host=host)
+		except BaseException:
+			release_all(held)
+			raise
+
+		call_start = time.perf_counter()
+		executor = limiter.executor if limiter != None else self.executor
+		thread_future = executor.submit(blocking_call)
+		try:
+			result = await asyncio.wrap_future(thread_future, loop=self.loop)
+		finally:
+			# A cancelled caller cannot stop the thread, so the slots are only given back once the thread has returned
+			if thread_future.done():
+				release_all(held)
+			else:
+				thread_future.add_done_callback(functools.partial(self.release_when_returned, held, backend))
+
+		status = getattr(result, 'status_code', None)
+		n_bytes = len(result.content) if status != None else 0
+		metrics.record(stage, predictor, time.perf_counter() - call_start, sequence, host=host, status=status, bytes=n_bytes)
+		if status != None:
+			metrics.count('http_responses', host=host, status=status)
+			metrics.count('download_bytes', n_bytes, predictor=predictor)
+		return result
+
+	def release_when_returned(self, held, backend, thread_future):
+		# Called in the thread that made the call. A request of a cancelled runner (one still outstanding at the job's
+		# deadline) that then hits request_timeout still counts as a failure of its backend.
+		timed_out = backend != None and not thread_future.cancelled() and isinstance(thread_future.exception(), requests.exceptions.Timeout)
+		try:
+			self.loop.call_soon_threadsafe(release_all, held)
+			if timed_out:
+				self.loop.call_soon_threadsafe(health_record, backend, False)
+		except RuntimeError:
+			# the event loop has been closed, so nothing is waiting for the slots
+			pass
+
+	async def request(self, method, url, predictor=None, stage='request', sequence=None, **kwargs):
+		# Limits are applied by the original host, even when the request is redirected to server_override.
+		# Every request has a (connect, read) timeout so a server that stops answering cannot hold a thread forever.
+		kwargs.setdefault('timeout', request_timeout)
+		return await self.call(urlparse(url).hostname, get_session().request, method, server_url(url), predictor=predictor, stage=stage, sequence=sequence, **kwargs)
+
+	def close(self):
+		self.executor.shutdown(wait=False)
+		for limiter in self.limiters.values():
+			limiter.executor.shutdown(wait=False)
+
+def release_all(semaphores):
+	for semaphore in semaphores:
+		semaphore.release()
+
+def poll_delay(previous_delay=None, retry_after=None):
+	# Returns the number of seconds to wait before the next check of a job
+	if retry_after != None:
+		return min(retry_after, poll_max_delay)
+
+	if previous_delay == None:
+		delay = poll_initial_delay
+	else:
+		delay = min(previous_delay * poll_backoff_factor, poll_max_delay)
+	return delay * random.uniform(1 - poll_jitter, 1 + poll_jitter)
+
+def parse_retry_after(response):
+	# Retry-After is either a number of seconds or an HTTP date
+	value = response.headers.get('Retry-After')
+	if value == None:
+		return None
+	try:
+		return max(float(value), 0)
+	except ValueError:
+		pass
+	try:
+		return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+	except (TypeError, ValueError):
+		return None
+
+class ResultPoller:
+	# Tracks every outstanding job (results URL) and checks each one when it is due, from a single task.
+	# wait_for returns the first response whose status is not pending, so its body is used directly.
+
+	def __init__(self, scheduler):
+		self.scheduler = scheduler
+		self.jobs = dict()
+		self.wakeup = asyncio.Event()
+		self.task = None
+
+	async def wait_for(self, name, url, deadline, pending_statuses=(404,), sequence=None):
+		# Returns the response, or None once time.time() passes deadline. Waiters for the same URL (a job reattached
+		# to a submission this process is already polling) share one poll and its future, each with its own deadline.
+		job = self.jobs.get(url)
+		if job == None or job['future'].done():
+			job = {
+					'name': name,
+					'sequence': sequence,
+					'url': url,
+					'deadline': deadline,
+					'pending_statuses': pending_statuses,
+					'delay': poll_delay(),
+					'polls': 0,
+					'error': None,
+					'waiters': 0,
+					'future': self.scheduler.loop.create_future()}
+			job['next_check'] = time.time() + job['delay']
+			self.jobs[url] = job
+		job['waiters'] += 1
+		job['deadline'] = max(job['deadline'], deadline)
+
+		if self.task == None or self.task.done():
+			self.task = self.scheduler.loop.create_task(self.run())
+		self.wakeup.set()
+
+		try:
+			try:
+				response = await asyncio.wait_for(asyncio.shield(job['future']), timeout=max(deadline - time.time(), 0))
+			except asyncio.TimeoutError:
+				response = None
+			if response == None:
+				if job['error'] != None:
+					# the last check before the deadline could not reach the server
+					raise job['error']
+				metrics.count('timeouts', predictor=name)
+			return response
+		finally:
+			job['waiters'] -= 1
+			if job['waiters'] == 0 and self.jobs.get(url) is job:
+				self.jobs.pop(url)
+			self.wakeup.set()
+
+	def is_polling(self, url):
+		job = self.jobs.get(url)
+		return job != None and not job['future'].done()
+
+	async def run(self):
+		while len(self.jobs) > 0:
+			now = time.time()
+			for job in list(self.jobs.values()):
+				if job['future'].done() or job['next_check'] > now:
+					continue
+				if now >= job['deadline']:
+					metrics.count('polls', job['polls'], predictor=job['name'])
+					job['future'].set_result(None)
+				else:
+					# checked in its own task so a slow server does not hold up the other jobs
+					job['next_check'] = float('inf')
+					self.scheduler.loop.create_task(self.check(job))
+
+			waiting = [job['next_check'] for job in self.jobs.values() if not job['future'].done()]
+			self.wakeup.clear()
+			try:
+				await asyncio.wait_for(self.wakeup.wait(), timeout=max(min(waiting, default=60) - time.time(), 0))
+			except asyncio.TimeoutError:
+				pass
+
+	async def check(self, job):
+		# A check that fails to reach the server (connection error, request_timeout) is retried with the usual backoff;
+		# when the last check before the deadline failed, wait_for raises its error instead of returning None
+		try:
+			response = await self.scheduler.request('GET', job['url'], predictor=job['name'], stage='poll', sequence=job['sequence'])
+		except requests.exceptions.RequestException as e:
+			print(f'{job["name"]}: checking {job["url"]} failed with {type(e).__name__}, retrying')
+			metrics.count('poll_errors', predictor=job['name'])
+			job['error'] = e
+			job['delay'] = poll_delay(job['delay'])
+			job['next_check'] = min(time.time() + job['delay'], job['deadline'])
+			self.wakeup.set()
+			return
+		except Exception as e:
+			if not job['future'].done():
+				job['future'].set_exception(e)
+			self.wakeup.set()
+			return
+
+		job['error'] = None
+		job['polls'] += 1
+		if response.status_code in job['pending_statuses']:
+			job['delay'] = poll_delay(job['delay'], parse_retry_after(response))
+			job['next_check'] = min(time.time() + job['delay'], job['deadline'])
+		elif not job['future'].done():
+			print(f'{job["name"]}: results ready after {job["polls"]} checks')
+			metrics.count('polls', job['polls'], predictor=job['name'])
+			job['future'].set_result(response)
+		self.wakeup.set()
+
+def server_url(url):
+	# Sends the request to server_override (e.g. pyvkabat_mock_server.py) when one is set. The original
+	# host is kept as the first part of the path so the server knows which web server is meant.
+	if server_override == None:
+		return url
+
+	parsed = urlparse(url)
+	rewritten_url = f'{server_override.rstrip("/")}/{parsed.hostname}{parsed.path}'
+	if parsed.query != '':
+		rewritten_url += '?' + parsed.query
+	return rewritten_url
+
+# One scheduler per event loop, since its limiters and executor futures belong to the loop that made them
+schedulers = dict()
+
+def get_scheduler():
+	# The scheduler is built on first use so command line overrides of host_limits are applied.
+	# Each event loop (e.g. the asyncio.run of a sync wrapper in its own thread) gets its own scheduler. Only the
+	# schedulers of loops that have been closed are shut down, never one another loop is still using.
+	loop = asyncio.get_running_loop()
+	with shared_init_lock:
+		for closed_loop in [other_loop for other_loop in schedulers.keys() if other_loop.is_closed()]:
+			schedulers.pop(closed_loop).close()
+		scheduler = schedulers.get(loop)
+		if scheduler == None:
+			scheduler = RequestScheduler(host_limits, loop)
+			schedulers[loop] = scheduler
+	return scheduler
+
+def get_poller():
+	return get_scheduler().poller
+
+class PredictionCache:
+	# On-disk (SQLite) store of predictor outputs keyed by a hash of (sequence, predictor, parameters)
+
+	def __init__(self, path, ttl, max_entries):
+		self.ttl = ttl
+		self.max_entries = max_entries
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		self.connection.execute('CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, predictor TEXT, created REAL, last_used REAL, prediction TEXT)')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)')
+		self.connection.commit()
+		self.entries = self.connection.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+	@staticmethod
+	def make_key(sequence, predictor, parameters):
+		key_data = json.dumps([sequence, predictor, parameters], sort_keys=True)
+		return hashlib.sha256(key_data.encode()).hexdigest()
+
+	def get(self, sequence, predictor, parameters):
+		key = self.make_key(sequence, predictor, parameters)
+		now = time.time()
+		with self.lock:
+			row = self.connection.execute('SELECT created, prediction FROM predictions WHERE key = ?', (key,)).fetchone()
+			if row == None or (now - row[0]) > self.ttl:
+				self.misses += 1
+				return None
+
+			self.hits += 1
+			self.connection.execute('UPDATE predictions SET last_used = ? WHERE key = ?', (now, key))
+			self.connection.commit()
+			return json.loads(row[1])
+
+	def put(self, sequence, predictor, parameters, prediction):
+		key = self.make_key(sequence, predictor, parameters)
+		now = time.time()
+		with self.lock:
+			exists = self.connection.execute('SELECT 1 FROM predictions WHERE key = ?', (key,)).fetchone() != None
+			self.connection.execute('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)', (key, predictor, now, now, json.dumps(prediction)))
+			if not exists:
+				self.entries += 1
+			if self.entries > self.max_entries:
+				self.evict(now)
+			self.connection.commit()
+
+	def evict(self, now):
+		# Called once the cache holds more than max_entries: drops expired predictions, then the least recently used
+		# ones down to cache_evict_to of max_entries, cut off by last_used (indexed) instead of sorting the whole table
+		self.entries -= self.connection.execute('DELETE FROM predictions WHERE created < ?', (now - self.ttl,)).rowcount
+		cutoff = self.connection.execute('SELECT last_used FROM predictions ORDER BY last_used DESC LIMIT 1 OFFSET ?', (int(self.max_entries * cache_evict_to),)).fetchone()
+		if cutoff != None:
+			self.entries -= self.connection.execute('DELETE FROM predictions WHERE last_used <= ?', (cutoff[0],)).rowcount
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'entries': self.entries}
+
+prediction_cache = None
+
+def get_cache():
+	# Returns the shared prediction cache, or None when caching is disabled
+	global prediction_cache
+	if not use_cache:
+		return None
+	with shared_init_lock:
+		if prediction_cache == None:
+			prediction_cache = PredictionCache(os.path.join(output_directory or os.getcwd(), cache_file), cache_ttl, cache_max_entries)
+	return prediction_cache
+
+async def cache_lookup(job, predictor, parameters):
+	# The SQLite work of a lookup (and of cache_store) runs in the loop's default executor so it does not hold up the event loop
+	cache = get_cache()
+	if cache == None:
+		return None
+
+	prediction = await asyncio.get_running_loop().run_in_executor(None, cache.get, job.sequence, predictor, parameters)
+	if prediction != None:
+		print(f'{predictor}: using cached prediction')
+	return prediction
+
+async def cache_store(job, predictor, parameters, prediction):
+	cache = get_cache()
+	if cache == None or prediction == None:
+		return
+	await asyncio.get_running_loop().run_in_executor(None, cache.put, job.sequence, predictor, parameters, prediction)
+
+class JobJournal:
+	# Append-only JSON lines log of remote job submissions. A 'submitted' line is flushed to disk before the job is
+	# polled, and a line with the final status ('finished', 'failed' or 'timeout') is appended when it is done, so
+	# after a crash every job without a final line is still in flight. Jobs are keyed like the prediction cache.
+
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.in_flight = dict()
+		if os.path.exists(path):
+			self.load()
+			self.compact()
+		self.journal = open(path, 'a')
+
+	def load(self):
+		with open(self.path) as journal:
+			for line in journal:
+				try:
+					entry = json.loads(line)
+				except ValueError:
+					# last line cut short by a crash
+					continue
+				if entry.get('event') == 'submitted':
+					self.in_flight[entry['key']] = entry
+				else:
+					self.in_flight.pop(entry.get('key'), None)
+
+	def compact(self):
+		# Rewrites the journal with only the jobs that are still in flight
+		temporary_path = self.path + '.tmp'
+		with open(temporary_path, 'w') as journal:
+			for entry in self.in_flight.values():
+				journal.write(json.dumps(entry) + '\n')
+		os.replace(temporary_path, self.path)
+
+	def append(self, entry):
+		with self.lock:
+			self.journal.write(json.dumps(entry) + '\n')
+			self.journal.flush()
+			os.fsync(self.journal.fileno())
+
+	def submitted(self, key, predictor, name, job_id, results_url):
+		entry = {'event': 'submitted', 'key': key, 'predictor': predictor, 'name': name, 'job_id': job_id, 'results_url': results_url, 'submitted': time.time()}
+		self.append(entry)
+		with self.lock:
+			self.in_flight[key] = entry
+
+	def finished(self, key, status):
+		with self.lock:
+			if self.in_flight.pop(key, None) == None:
+				return
+		self.append({'event': status, 'key': key, 'time': time.time()})
+
+	def lookup(self, key, timeout):
+		# Returns the in-flight submission for key, or None if there is none or it is older than timeout
+		with self.lock:
+			entry = self.in_flight.get(key)
+		if entry == None or time.time() - entry['submitted'] > timeout:
+			return None
+		return entry
+
+job_journal = None
+
+def get_journal():
+	# Returns the shared job journal, or None when the journal is disabled
+	global job_journal
+	if not use_journal:
+		return None
+	with shared_init_lock:
+		if job_journal == None:
+			job_journal = JobJournal(os.path.join(output_directory or os.getcwd(), journal_file))
+	return job_journal
+
+def journal_lookup(job, predictor, parameters, timeout):
+	journal = get_journal()
+	if journal == None:
+		return None
+
+	entry = journal.lookup(PredictionCache.make_key(job.sequence, predictor, parameters), timeout)
+	if entry == None:
+		return None
+	if get_poller().is_polling(entry['results_url']):
+		# another job in this process submitted it and is still waiting, so its poll is shared rather than reattached
+		print(f'{predictor}: sharing job {entry["job_id"]} with the job already waiting for it')
+		metrics.count('shared', predictor=predictor)
+	else:
+		print(f'{predictor}: reattaching to job {entry["job_id"]} submitted {time.time() - entry["submitted"]:.0f} seconds ago')
+		metrics.count('reattached', predictor=predictor)
+	return entry
+
+async def journal_submitted(job, predictor, parameters, job_id, results_url):
+	# The journal is fsynced on every line, so the write runs in the loop's default executor (like the cache)
+	journal = get_journal()
+	if journal == None:
+		return
+	key = PredictionCache.make_key(job.sequence, predictor, parameters)
+	await asyncio.get_running_loop().run_in_executor(None, journal.submitted, key, predictor, job.name, job_id, results_url)
+
+async def journal_finished(job, predictor, parameters, status):
+	journal = get_journal()
+	if journal == None:
+		return
+	key = PredictionCache.make_key(job.sequence, predictor, parameters)
+	await asyncio.get_running_loop().run_in_executor(None, journal.finished, key, status)
+
+class CircuitOpenError(Exception):
+	pass
+
+class HealthTracker:
+	# Health record per predictor (host, consecutive failures, recent latencies, last success and failure, breaker
+	# state). Records are saved to path when a breaker changes state and at the end of every job (flush), in the
+	# default executor when there is an event loop. The half-open probe is only held in memory: after a restart the
+	# first job to reach an open circuit past its cooldown becomes the probe.
+
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.save_lock = threading.Lock()
+		self.records = dict()
+		self.probes = dict()
+		self.dirty = False
+		if os.path.exists(path):
+			try:
+				with open(path) as health:
+					self.records = json.load(health)
+			except ValueError:
+				print(f'Ignoring unreadable health file {path}')
+
+	def allow(self, predictor, owner):
+		# True if owner (a job id) may submit to predictor now
+		with self.lock:
+			record = self.records.get(predictor)
+			if record == None or record['state'] == 'closed' or self.probes.get(predictor) == owner:
+				return True
+			if predictor not in self.probes and time.time() - record['opened'] >= breaker_cooldown:
+				print(f'{predictor}: circuit breaker half-open, probing the server')
+				self.probes[predictor] = owner
+				return True
+			return False
+
+	def release(self, predictor, owner):
+		# Gives the probe back when its job is cancelled before an outcome was recorded
+		with self.lock:
+			if self.probes.get(predictor) == owner:
+				self.probes.pop(predictor)
+
+	def record(self, predictor, ok, seconds=None):
+		now = time.time()
+		with self.lock:
+			record = self.records.setdefault(predictor, {'host': None, 'state': 'closed', 'failures': 0, 'opened': None, 'last_success': None, 'last_failure': None, 'latencies': []})
+			record['host'] = backends.get(predictor, {}).get('host')
+			self.probes.pop(predictor, None)
+			previous_state = record['state']
+			if ok:
+				if record['state'] == 'open':
+					print(f'{predictor}: circuit breaker closed')
+				record['state'] = 'closed'
+				record['failures'] = 0
+				record['last_success'] = now
+			else:
+				record['failures'] += 1
+				record['last_failure'] = now
+				if record['failures'] >= breaker_failures:
+					if record['state'] == 'closed':
+						print(f'{predictor}: circuit breaker open after {record["failures"]} failures in a row, skipped for {breaker_cooldown} seconds')
+					record['state'] = 'open'
+					record['opened'] = now
+			if seconds != None:
+				record['latencies'] = (record['latencies'] + [round(seconds, 3)])[-health_window:]
+			self.dirty = True
+		if record['state'] != previous_state:
+			try:
+				asyncio.get_running_loop().run_in_executor(None, self.flush)
+			except RuntimeError:
+				self.flush()
+
+	def flush(self):
+		# Saves the records if they changed since the last save
+		with self.save_lock:
+			with self.lock:
+				if not self.dirty:
+					return
+				records = json.dumps(self.records, indent=1)
+				self.dirty = False
+			temporary_path = self.path + '.tmp'
+			with open(temporary_path, 'w') as health:
+				health.write(records)
+			os.replace(temporary_path, self.path)
+
+	def report(self):
+		# The records as returned by the service's /status: per predictor the breaker state, failures in a row, when
+		# the breaker opened, the last success and the latency percentiles (in seconds, None without latencies)
+		report = dict()
+		with self.lock:
+			for predictor, record in sorted(self.records.items()):
+				latency = None
+				if len(record['latencies']) > 0:
+					latency = dict(zip(('p50', 'p90', 'p99'), np.percentile(record['latencies'], [50, 90, 99]).round(3).tolist()))
+				report[predictor] = {
+						'host': record['host'],
+						'state': record['state'],
+						'failures': record['failures'],
+						'opened': record['opened'],
+						'last_success': record['last_success'],
+						'last_failure': record['last_failure'],
+						'latency': latency}
+		return report
+
+	def summary(self):
+		lines = []
+		with self.lock:
+			for predictor, record in sorted(self.records.items()):
+				if len(record['latencies']) > 0:
+					p50, p90, p99 = np.percentile(record['latencies'], [50, 90, 99])
+					latency = f'p50={p50:.1f}s p90={p90:.1f}s p99={p99:.1f}s'
+				else:
+					latency = 'no latencies'
+				last_success = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['last_success'])) if record['last_success'] != None else 'never'
+				lines.append(f'  {predictor:<8} {record["state"]:<7} failures in a row={record["failures"]} {latency} last success={last_success}')
+		return '\n'.join(lines)
+
+server_health = None
+
+def get_health():
+	# Returns the shared health tracker, or None when health tracking is disabled
+	global server_health
+	if not use_health:
+		return None
+	with shared_init_lock:
+		if server_health == None:
+			server_health = HealthTracker(os.path.join(output_directory or os.getcwd(), health_file))
+	return server_health
+
+def health_check(job, predictor):
+	# Called right before submitting; raises CircuitOpenError when the predictor is being skipped
+	health = get_health()
+	if health != None and not health.allow(predictor, job.id):
+		raise CircuitOpenError(f'{predictor} skipped, its circuit breaker is open after repeated failures')
+
+def health_record(predictor, ok, seconds=None):
+	health = get_health()
+	if health != None:
+		health.record(predictor, ok, seconds)
+
+# Result parsers
+# Targeted extraction of the <code>/<font> blocks of the PRABI and JPred result pages. Each page is scanned
+# once, so the work is linear in the page size. The parsers are plain module-level functions so they can be
+# sent to a process pool (see parse_workers).
+code_block_pattern = re.compile(r'<code\b[^>]*>(.*?)(?:</code\s*>|$)', re.IGNORECASE | re.DOTALL)
+font_block_pattern = re.compile(r'<font\b[^>]*>(.*?)</font\s*>', re.IGNORECASE | re.DOTALL)
+tag_pattern = re.compile(r'<[^>]*>')
+
+def html_text(fragment):
+	return html.unescape(tag_pattern.sub('', fragment))
+
+def parse_prabi_page(page):
+	# Returns the per-residue assignments of a PRABI result page (one <font> per residue in the first <code> block).
+	# PRABI turns (T) are counted as coil (C).
+	code_block = code_block_pattern.search(page)
+	if code_block == None:
+		raise ValueError('PRABI result page has no <code> block')
+
+	letters = [html_text(letter).upper() for letter in font_block_pattern.findall(code_block.group(1))]
+	return ['C' if letter == 'T' else letter for letter in letters]
+
+def parse_jpred_page(page):
+	# Returns the per-residue assignments of a JPred .simple.html page. The <code> block alternates
+	# sequence and prediction lines; coil ('-') is returned as C.
+	code_block = code_block_pattern.search(page)
+	if code_block == None:
+		raise ValueError('JPred result page has no <code> block')
+
+	lines = html_text(code_block.group(1)).split('\n')
+	return list(''.join(lines[1::2]).replace('-', 'C'))
+
+# Sympred and Yaspin results are plain text. Their parsers make one pass over the lines, copy each prediction track
+# into its own buffer (preallocated to the sequence length) and check the track lengths against the sequence.
+sympred_tracks = ('PHD', 'PROF', 'SSPRO', 'JNET', 'PSIPRED')
+
+def parse_sympred_lines(lines, n_residues=None):
+	# Returns {track: per-residue assignments} from the lines of a Sympred result.hpred file, with coil (' ') as C.
+	# Every block has an AA line and one line per track; the residues start in the column after the padding of the
+	# first AA line. Tracks whose length differs from n_residues (or from the AA track if n_residues is None) are left out.
+	size = n_residues if n_residues != None else 0
+	buffers = {track: bytearray(size) for track in ('AA',) + sympred_tracks}
+	positions = {track: 0 for track in buffers.keys()}
+	first_column = None
+
+	for line in lines:
+		line = line.rstrip('\r\n')
+		if line == '' or '#' in line:
+			continue
+		track = line.split(' ', 1)[0]
+		if track not in buffers:
+			continue
+		if first_column == None:
+			if track != 'AA':
+				raise ValueError(f'Sympred result has a {track} line before the first AA line')
+			first_column = len(line) - len(line[len(track):].lstrip(' '))
+
+		fragment = line[first_column:].encode('ascii', errors='replace')
+		buffer = buffers[track]
+		start = positions[track]
+		end = start + len(fragment)
+		if end > len(buffer):
+			buffer.extend(bytes(end - len(buffer)))
+		buffer[start:end] = fragment
+		positions[track] = end
+
+	if first_column == None:
+		raise ValueError('Sympred result has no AA lines')
+
+	expected = n_residues if n_residues != None else positions['AA']
+	output_data = dict()
+	for track in sympred_tracks:
+		if positions[track] != expected:
+			print(f'Sympred: {track} has {positions[track]} residues but the sequence has {expected}, not used')
+			continue
+		output_data[track] = list(buffers[track][:expected].replace(b' ', b'C').decode('ascii'))
+
+	if len(output_data) == 0:
+		raise ValueError('Sympred result has no prediction with the length of the sequence')
+	return output_data
+
+def parse_sympred_page(page, n_residues=None):
+	return parse_sympred_lines(io.StringIO(page), n_residues)
+
+def parse_yaspin_lines(lines, n_residues=None):
+	# Returns {'YASPIN': per-residue assignments} from the "Pred: " lines of a Yaspin results.out file, with coil ('-') as C
+	buffer = bytearray(n_residues if n_residues != None else 0)
+	position = 0
+	for line in lines:
+		if '*' in line:
+			continue
+		marker = line.find('Pred: ')
+		if marker == -1:
+			continue
+
+		fragment = line[marker + len('Pred: '):].rstrip('\r\n').encode('ascii', errors='replace')
+		end = position + len(fragment)
+		if end > len(buffer):
+			buffer.extend(bytes(end - len(buffer)))
+		buffer[position:end] = fragment
+		position = end
+
+	if n_residues != None and position != n_residues:
+		raise ValueError(f'YASPIN prediction has {position} residues but the sequence has {n_residues}')
+	return {'YASPIN': list(buffer[:position].replace(b'-', b'C').decode('ascii'))}
+
+def parse_yaspin_page(page, n_residues=None):
+	return parse_yaspin_lines(io.StringIO(page), n_residues)
+
+parse_executor = None
+
+def get_parse_executor():
+	# Process pool for the result parsers, or None to parse on the event loop (parse_workers = 0)
+	global parse_executor
+	if parse_workers > 0 and parse_executor == None:
+		parse_executor = concurrent.futures.ProcessPoolExecutor(max_workers=parse_workers)
+	return parse_executor
+
+async def parse_result(parser, page, predictor=None, sequence=None):
+	parse_start = time.perf_counter()
+	executor = get_parse_executor()
+	if executor == None:
+		result = parser(page)
+	else:
+		result = await asyncio.get_running_loop().run_in_executor(executor, parser, page)
+	metrics.record('parse', predictor, time.perf_counter() - parse_start, sequence)
+	return result
+
+async def runPrabi_async(job):
 	prabi_start_time = time.time()
 	print('Running PRABI')
 
@@ -129,100 +1528,95 @@ def runPrabi():
 					'gor1':{
 							'url':'https://npsa-prabi.ibcp.fr/cgi-bin/secpred_gor.pl',
 							'data':{
-									'title':str(seq_name),
-									'notice':str(sequence),
-									'ali_width':str(alignment_width),
-									'constants':str(constants),
-									'dch':str(dch),
-									'dce':str(dce),
-									'dct':str(dct),
-									'dcc':str(dcc)}},
+									'title':str(job.name),
+									'notice':str(job.sequence),
+									'ali_width':str(job.alignment_width),
+									'constants':str(job.constants),
+									'dch':str(job.dch),
+									'dce':str(job.dce),
+									'dct':str(job.dct),
+									'dcc':str(job.dcc)}},
 
 					'gor3':{
 							'url':'https://npsa-prabi.ibcp.fr/cgi-bin/secpred_gib.pl',
 							'data':{
-									'title':str(seq_name),
-									'notice':str(sequence),
-									'ali_width':str(alignment_width)}},
+									'title':str(job.name),
+									'notice':str(job.sequence),
+									'ali_width':str(job.alignment_width)}},
 
 					'dpm':{
 							'url':'https://npsa-prabi.ibcp.fr/cgi-bin/secpred_dpm.pl',
 							'data':{
-									'title':str(seq_name),
-									'notice':str(sequence),
-									'ali_width':str(alignment_width)}},
+									'title':str(job.name),
+									'notice':str(job.sequence),
+									'ali_width':str(job.alignment_width)}},
 
 					'predator':{
 								'url':'https://npsa-prabi.ibcp.fr/cgi-bin/secpred_preda.pl',
 								'data':{
-										'title':str(seq_name),
-										'notice':str(sequence),
-										'ali_width':str(alignment_width),
-										'predatorssmat':str(use_dssp_or_stride)}},
+										'title':str(job.name),
+										'notice':str(job.sequence),
+										'ali_width':str(job.alignment_width),
+										'predatorssmat':str(job.use_dssp_or_stride)}},
 
 					'hnn':{
 							'url':'https://npsa-prabi.ibcp.fr/cgi-bin/secpred_hnn.pl',
 							'data':{
-									'title':str(seq_name),
-									'notice':str(sequence),
-									'ali_width':str(alignment_width)}},
+									'title':str(job.name),
+									'notice':str(job.sequence),
+									'ali_width':str(job.alignment_width)}},
 
 					'sopm':{
 							'url':'https://npsa-prabi.ibcp.fr/cgi-bin/secpred_sopm.pl',
 							'data':{
-									'title':str(seq_name),
-									'notice':str(sequence),
-									'ali_width':str(alignment_width),
-									'states':str(states),
-									'threshold':str(threshold),
-									'width':str(width)}},
+									'title':str(job.name),
+									'notice':str(job.sequence),
+									'ali_width':str(job.alignment_width),
+									'states':str(job.states),
+									'threshold':str(job.threshold),
+									'width':str(job.width)}},
 
 					'mlrc':{
 							'url':'https://npsa-prabi.ibcp.fr/cgi-bin/secpred_mlr.pl',
 							'data':{
-									'title':str(seq_name),
-									'notice':str(sequence),
-									'ali_width':str(alignment_width)}},
+									'title':str(job.name),
+									'notice':str(job.sequence),
+									'ali_width':str(job.alignment_width)}},
 
 					'dsc':{
 							'url':'https://npsa-prabi.ibcp.fr/cgi-bin/secpred_dsc.pl',
 							'data':{
-									'title':str(seq_name),
-									'notice':str(sequence),
-									'ali_width':str(alignment_width)}}
+									'title':str(job.name),
+									'notice':str(job.sequence),
+									'ali_width':str(job.alignment_width)}}
 
 			}
 
 
 	# Define a function to run each algorithm in a thread
-	def run_algorithm(key):
+	async def run_algorithm(key):
+		# title and notice (the sequence itself) do not change the prediction, so they are not part of the cache key
+		parameters = {name: value for name, value in prabi_algos[key]['data'].items() if name not in ('title', 'notice')}
+		cached = await cache_lookup(job, key, parameters)
+		if cached != None:
+			return cached
+
+		health_check(job, 'PRABI')
 		print(f'Submitting request to PRABI for {key}')
-		response = requests.post(prabi_algos[key]['url'], data=prabi_algos[key]['data'])
-		soup = BeautifulSoup(response.text, features='html.parser')
-
-		output_list = []
-		for x in soup.find('code').findChildren('font'):
-			output_list.append(x.text)
-
-		modified_output_list = []
-		for letter in output_list:
-			letter = letter.upper()
-			if letter == 'T':
-				modified_output_list.append(letter.replace('T', 'C'))
-			else:
-				modified_output_list.append(letter)
+		submit_start_time = time.time()
+		response = await get_scheduler().request('POST', prabi_algos[key]['url'], predictor=key, stage='submit', sequence=job.name, data=prabi_algos[key]['data'])
+		modified_output_list = await parse_result(backend_parser('PRABI'), response.text, key, job.name)
 
 		print(f'{key}: {modified_output_list}')
 		print(f'{key} completed in {time.time()-prabi_start_time} seconds')
+		health_record('PRABI', True, time.time() - submit_start_time)
+		await cache_store(job, key, parameters, {key: modified_output_list})
 		return {key: modified_output_list}
 
-	# Run each algorithm in a separate thread
+	# Run every algorithm the PRABI backend lists concurrently on the event loop
 	output = {}
-	with concurrent.futures.ThreadPoolExecutor() as executor:
-		futures = [executor.submit(run_algorithm, key) for key in prabi_algos.keys()]
-		for future in concurrent.futures.as_completed(futures):
-			out = future.result()
-			output.update(out)
+	for out in await asyncio.gather(*[run_algorithm(key) for key in prabi_algos.keys() if key in backends['PRABI']['predictors']]):
+		output.update(out)
 
 	prabi_end_time = time.time()
 	prabi_execution_time = prabi_end_time - prabi_start_time
@@ -230,23 +1624,23 @@ def runPrabi():
 
 	return output
 
-def run_alt_JPred():
-	# This function removes the jpredapi requirement
-	alt_JPred_start_time = time.time()
+def runPrabi(job):
+	return asyncio.run(runPrabi_async(job))
 
-	print('Running alt JPred (no API)')
+async def submit_alt_JPred(job, jpred_parameters):
+	# Submits the sequence to the JPred web form and returns the job ID, or None if the submission failed
 
 	# Define the form data to be submitted
 	data = {
-		'seq': sequence,
+		'seq': job.sequence,
 		'fileup': ("", ""),
-		"input": "seq",
-		"pdb": "on",
-		'email': email,
-		"queryName": seq_name
+		"input": jpred_parameters['input'],
+		"pdb": jpred_parameters['pdb'],
+		'email': job.email,
+		"queryName": job.name
 	}
 
-	multipart_data = MultipartEncoder(fields=data, boundary="--------------------------124327508021125478525198")
+	multipart_data = requests_toolbelt.MultipartEncoder(fields=data, boundary="--------------------------124327508021125478525198")
 
 	# Set the headers for the request
 	headers = {
@@ -257,9 +1651,9 @@ def run_alt_JPred():
 	url = 'https://www.compbio.dundee.ac.uk/jpred/cgi-bin/jpred_form'
 
 	# Submit the form data using a POST request
-	response = requests.post(url, data=multipart_data, headers=headers)
+	response = await get_scheduler().request('POST', url, predictor='JPred', stage='submit', sequence=job.name, data=multipart_data, headers=headers)
 
-	soup = BeautifulSoup(response.text, features='html.parser')
+	soup = bs4.BeautifulSoup(response.text, features='html.parser')
 
 	output_list = []
 	for x in soup.find('div', {'id':'content'}).find('a'):
@@ -270,90 +1664,109 @@ def run_alt_JPred():
 	# Check if the POST request was successful
 	if response.status_code == 200:
 		print(f'JPred Job ID: {job_id}')
+		return job_id
+	else:
+		return None
+
+async def run_alt_JPred_async(job):
+	# This function removes the jpredapi requirement
+	alt_JPred_start_time = time.time()
+
+	print('Running alt JPred (no API)')
+
+	jpred_parameters = {'input': 'seq', 'pdb': 'on'}
+	cached = await cache_lookup(job, 'JPred', jpred_parameters)
+	if cached != None:
+		return cached
+
+	# A job submitted by an earlier run that was interrupted is polled again instead of resubmitted
+	journaled = journal_lookup(job, 'JPred', jpred_parameters, job.jpred_timeout)
+	if journaled != None:
+		alt_JPred_start_time = journaled['submitted']
+		job_id = journaled['job_id']
+	else:
+		health_check(job, 'JPred')
+		job_id = await submit_alt_JPred(job, jpred_parameters)
 
+	if job_id != None:
 		# Define the URL of the job results page
 		# Get result (not using the jpredapi)
 		jpred_result_base = 'http://www.compbio.dundee.ac.uk/jpred4/results'
 		jpred_simple_result_url = (f'{jpred_result_base}/{job_id}/{job_id}.simple.html')
+		if journaled == None:
+			await journal_submitted(job, 'JPred', jpred_parameters, job_id, jpred_simple_result_url)
 
 		# Wait for the job to complete and the results to become available
 		print('JPred: Waiting for results...')
 
-		while True:
-
-			# check elapsed time
-			if (time.time() - alt_JPred_start_time) > jpred_timeout:
-				print(f'JPred timed out. Exceeded {jpred_timeout} seconds.')
-				break
-
-			# Send a GET request to the results page
-			results_page = requests.get(jpred_simple_result_url)
-
-			if results_page.status_code == 404:
-				#print(f'Request failed with status code {results_page.status_code}')
-				sleep(5)
-			elif results_page.status_code == 200:
-				# Get result (not using the jpredapi)
-
-				jpred_results = requests.get(jpred_simple_result_url)
-				jpred_soup = BeautifulSoup(jpred_results.text, 'html.parser')
-				#print(jpred_soup)
-
-				jpred_file_string = ''
-				for x in jpred_soup.find('code'):
-					jpred_file_string = jpred_file_string + x.text
-
-				#print(jpred_file_string)
+		# The shared poller checks the results page with backoff and returns the first response that is not pending
+		try:
+			results_page = await get_poller().wait_for('JPred', jpred_simple_result_url, alt_JPred_start_time + job.jpred_timeout, pending_statuses=(404,), sequence=job.name)
+		except Exception:
+			# the results page could not be checked until the timeout
+			await journal_finished(job, 'JPred', jpred_parameters, 'failed')
+			raise
+
+		if results_page == None:
+			print(f'JPred timed out. Exceeded {job.jpred_timeout} seconds.')
+			await journal_finished(job, 'JPred', jpred_parameters, 'timeout')
+			health_record('JPred', False)
+			return None
+
+		elif results_page.status_code == 200:
+			# Get result (not using the jpredapi) from the body the poller already downloaded
+			out = {'JPred': await parse_result(backend_parser('JPred'), results_page.text, 'JPred', job.name)}
+			print(out)
+			await cache_store(job, 'JPred', jpred_parameters, out)
+			await journal_finished(job, 'JPred', jpred_parameters, 'finished')
+			health_record('JPred', True, time.time() - alt_JPred_start_time)
+
+			alt_JPred_end_time = time.time()
+			alt_JPred_execution_time = alt_JPred_end_time - alt_JPred_start_time
+			print(f'alt_JPred took {alt_JPred_execution_time} sec')
+
+			return out
 
-				string_list = jpred_file_string.split('\n')
-
-				out = ''
-				for i, string in enumerate(string_list):
-					if (i != 0) and (i % 2 != 0):
-						out = out + string
-
-				out_list = []
-				for letter in out:
-					if letter == '-':
-						out_list.append(letter.replace('-', 'C'))
-					else:
-						out_list.append(letter)
-
-				out = {'JPred': out_list}
-				print(out)
-
-				alt_JPred_end_time = time.time()
-				alt_JPred_execution_time = alt_JPred_end_time - alt_JPred_start_time
-				print(f'alt_JPred took {alt_JPred_execution_time} sec')
-
-				return out
-				break
-			else:
-				print(f'JPred: Request failed with status code {results_page.status_code}')
-				print(f'JPred: Aborting operation.')
-				return None
-				break
+		else:
+			print(f'JPred: Request failed with status code {results_page.status_code}')
+			print(f'JPred: Aborting operation.')
+			await journal_finished(job, 'JPred', jpred_parameters, 'failed')
+			health_record('JPred', False)
+			return None
 
 	else:
 		print('JPred: Unable to get job ID')
+		health_record('JPred', False)
 		return None
 
-def runJPred():
+def run_alt_JPred(job):
+	return asyncio.run(run_alt_JPred_async(job))
+
+async def runJPred_async(job):
 
 	jpred_start_time = time.time()
 
 	print('Running JPred')
 
+	if importlib.util.find_spec('jpredapi') == None:
+		print("You do not have the 'jpredapi' but that's no big deal.")
+		print("If you want to install it for next time, use the following command:\n$pip install jpredapi")
+		print('Aborting JPred.')
+		return None
+
 	# Run JPred API using the Python version of the perl API
 	# See https://github.com/MoseleyBioinformaticsLab/jpredapi for details
 	# Some Documentation: https://jpredapi.readthedocs.io/en/latest/tutorial.html#using-jpredapi-as-a-library
 
+	# jpredapi talks to the JPred server, so its calls share the JPred host limits
+	jpred_host = 'www.compbio.dundee.ac.uk'
+
 	# submit the request to jpredapi
 	print(f'Submitting request to JPred via jpredapi.')
 	if jpred_seq_or_file == 'sequence':
-		job = BeautifulSoup(jpredapi.submit(mode=str(jpred_mode), user_format=str(jpred_user_format), seq=str(sequence), skipPDB=skipPDB, email=str(email), silent=True).text, features='html.parser')
+		submission = bs4.BeautifulSoup((await get_scheduler().call(jpred_host, jpredapi.submit, predictor='JPred', stage='submit', sequence=job.name, mode=str(jpred_mode), user_format=str(jpred_user_format), seq=str(job.sequence), skipPDB=skipPDB, email=str(job.email), silent=True)).text, features='html.parser')
 	elif jpred_seq_or_file == 'file':
-		job = BeautifulSoup(jpredapi.submit(mode=str(jpred_mode), user_format=str(jpred_user_format), file=str(jpred_input_file), skipPDB=skipPDB, email=str(email), silent=True).text, features='html.parser')
+		submission = bs4.BeautifulSoup((await get_scheduler().call(jpred_host, jpredapi.submit, predictor='JPred', stage='submit', sequence=job.name, mode=str(jpred_mode), user_format=str(jpred_user_format), file=str(jpred_input_file), skipPDB=skipPDB, email=str(job.email), silent=True)).text, features='html.parser')
 	else:
 		print('Something went wrong with the JPred submission. Check the jpred_seq_or_file variable.')
 		print(f'Currently, jpred_seq_or_file = {jpred_seq_or_file}. Valid options are "sequence" or "file"')
@@ -362,17 +1775,18 @@ def runJPred():
 
 	# get the job id of the submission
 	link = []
-	for x in job.find('a'):
+	for x in submission.find('a'):
 		link.append(x.text)
 
 	job_id = str(link[0].split('/chklog?')[-1])
 
 	# Check the status of the job
+	jpred_poll_delay = None
 	i = int(1)
 	while i < (check_jpred_status + 1):
 		print(f'JPred status check: {str(i)}')
 
-		check = BeautifulSoup(jpredapi.status(jobid=job_id, silent=True).text, 'html.parser')
+		check = bs4.BeautifulSoup((await get_scheduler().call(jpred_host, jpredapi.status, predictor='JPred', stage='poll', sequence=job.name, jobid=job_id, silent=True)).text, 'html.parser')
 		#print(check)
 
 		info = []
@@ -393,7 +1807,8 @@ def runJPred():
 
 			elif 'complete...' in line:
 				i += 1
-				sleep(30)
+				jpred_poll_delay = poll_delay(jpred_poll_delay)
+				await asyncio.sleep(jpred_poll_delay)
 
 			else:
 				print('Breaking out of JPred while loop...')
@@ -403,31 +1818,8 @@ def runJPred():
 	jpred_result_base = 'http://www.compbio.dundee.ac.uk/jpred4/results'
 	jpred_simple_result_url = (f'{jpred_result_base}/{job_id}/{job_id}.simple.html')
 
-	jpred_results = requests.get(jpred_simple_result_url)
-	jpred_soup = BeautifulSoup(jpred_results.text, 'html.parser')
-	print(jpred_soup)
-
-	jpred_file_string = ''
-	for x in jpred_soup.find('code'):
-		jpred_file_string = jpred_file_string + x.text
-
-	#print(jpred_file_string)
-
-	string_list = jpred_file_string.split('\n')
-
-	out = ''
-	for i, string in enumerate(string_list):
-		if (i != 0) and (i % 2 != 0):
-			out = out + string
-
-	out_list = []
-	for letter in out:
-		if letter == '-':
-			out_list.append(letter.replace('-', 'C'))
-		else:
-			out_list.append(letter)
-
-	out = {'JPred': out_list}
+	jpred_results = await get_scheduler().request('GET', jpred_simple_result_url, predictor='JPred', stage='download', sequence=job.name)
+	out = {'JPred': await parse_result(backend_parser('JPred'), jpred_results.text, 'JPred', job.name)}
 	print(out)
 
 	jpred_end_time = time.time()
@@ -436,7 +1828,21 @@ def runJPred():
 
 	return out
 
-def runSympred5():
+def runJPred(job):
+	return asyncio.run(runJPred_async(job))
+
+async def submit_vu_job(job, predictor, url, headers, payload):
+	# Submits a Sympred or Yaspin form and returns the job ID, or None if the submission failed.
+	# The server redirects to the job page, whose URL contains the job ID.
+	response = await get_scheduler().request('POST', url, predictor=predictor, stage='submit', sequence=job.name, headers=headers, data=payload, allow_redirects=True)
+
+	# Check if the POST request was successful
+	if response.status_code == 202:
+		return response.url.split('/')[-2]
+	else:
+		return None
+
+async def runSympred5_async(job):
 
 	sympred_start_time = time.time()
 
@@ -444,13 +1850,13 @@ def runSympred5():
 
 	boundary = str(uuid.uuid4())
 
-	sequence_with_defline = '>abcd\n' + sequence
+	sequence_with_defline = '>abcd\n' + job.sequence
 
 	# Define the form data to be submitted
 	data = {
 		'seq': sequence_with_defline,
 		'seq_file': ('', ''),
-		'email': email,
+		'email': job.email,
 		'sympred': 'Do prediction',
 		'conmethod': 'D',
 		'conweight': 'N',
@@ -462,9 +1868,15 @@ def runSympred5():
 		'pred6': '-jnet',
 		'pred7': '-psipred',
 		'MB': '',
-		'mbjob[description]': seq_name
+		'mbjob[description]': job.name
 	}
 
+	# Only the prediction settings are part of the cache key (not the email or job description)
+	sympred_parameters = {key: value for key, value in data.items() if key in ('conmethod', 'conweight', 'window', 'database') or key.startswith('pred')}
+	cached = await cache_lookup(job, 'Sympred', sympred_parameters)
+	if cached != None:
+		return cached
+
 	# Set the headers for the request
 	headers = {
 		'Content-Type': 'multipart/form-data; boundary=' + boundary
@@ -486,175 +1898,77 @@ def runSympred5():
 	# Define the URL of the Sympred web form
 	url = "https://www.ibi.vu.nl/programs/sympredwww/"
 
-	# Submit the form data using a POST request
-	response = requests.post(url, headers=headers, data=payload, allow_redirects=True)
+	# A job submitted by an earlier run that was interrupted is polled again instead of resubmitted
+	journaled = journal_lookup(job, 'Sympred', sympred_parameters, job.sympred_timeout)
+	if journaled != None:
+		sympred_start_time = journaled['submitted']
+		job_id = journaled['job_id']
+	else:
+		# Submit the form data using a POST request
+		health_check(job, 'Sympred')
+		job_id = await submit_vu_job(job, 'Sympred', url, headers, payload)
 
-	# Check if the POST request was successful
-	if response.status_code == 202:
-		# Extract the job ID from the redirect URL
-		job_id = response.url.split('/')[-2]
+	if job_id != None:
 		print(f'Sympred Job ID: {job_id}')
 
 		# Define the URL of the job results page
 		results_url = f'http://zeus.few.vu.nl/jobs/{job_id}/result.hpred'
+		if journaled == None:
+			await journal_submitted(job, 'Sympred', sympred_parameters, job_id, results_url)
 
 		# Wait for the job to complete and the results to become available
 		print('Sympred: Waiting for results...')
 
-		while True:
+		# The shared poller checks the results page with backoff and returns the first response that is not pending
+		try:
+			results_page = await get_poller().wait_for('Sympred', results_url, sympred_start_time + job.sympred_timeout, pending_statuses=(202, 404), sequence=job.name)
+		except Exception:
+			# the results page could not be checked until the timeout
+			await journal_finished(job, 'Sympred', sympred_parameters, 'failed')
+			raise
+
+		if results_page == None:
+			print(f'Sympred timed out. Exceeded {job.sympred_timeout} seconds.')
+			await journal_finished(job, 'Sympred', sympred_parameters, 'timeout')
+			health_record('Sympred', False)
+			return None
+
+		elif results_page.status_code == 200:
+			try:
+				output_data = await parse_result(functools.partial(backend_parser('Sympred'), n_residues=len(job.sequence)), results_page.text, 'Sympred', job.name)
+			except ValueError as e:
+				print(f'Sympred: {e}')
+				await journal_finished(job, 'Sympred', sympred_parameters, 'failed')
+				health_record('Sympred', False)
+				return None
 
-			# check elapsed time
-			if (time.time() - sympred_start_time) > sympred_timeout:
-				print(f'Sympred timed out. Exceeded {sympred_timeout} seconds.')
-				break
+			print(output_data)
+			await cache_store(job, 'Sympred', sympred_parameters, output_data)
+			await journal_finished(job, 'Sympred', sympred_parameters, 'finished')
+			health_record('Sympred', True, time.time() - sympred_start_time)
 
-			# Send a GET request to the results page
-			results_page = requests.get(results_url)
-
-			if results_page.status_code == 202:
-				sleep(5)
-
-			elif results_page.status_code == 404:
-				sleep(5)
-
-			elif results_page.status_code == 200:
-
-				text_lines = results_page.text.split('\n')
-				text_lines_no_comments = []
-				for line in text_lines:
-					if "#" in line:
-						continue
-					elif line == '':
-						continue
-					else:
-						text_lines_no_comments.append(line)
-
-				AA_lines = []
-				PHD_lines = []
-				PROF_lines = []
-				SSPRO_lines = []
-				JNET_lines = []
-				PSIPRED_lines = []
-				#SYMPRED_lines = []
-
-				for line in text_lines_no_comments:
-					if 'AA    ' in line:
-						AA_lines.append(line)
-					elif 'PHD    ' in line:
-						PHD_lines.append(line)
-					elif 'PROF    ' in line:
-						PROF_lines.append(line)
-					elif 'SSPRO    ' in line:
-						SSPRO_lines.append(line)
-					elif 'JNET    ' in line:
-						JNET_lines.append(line)
-					elif 'PSIPRED    ' in line:
-						PSIPRED_lines.append(line)
-					#elif 'SYMPRED    ' in line:
-						#SYMPRED_lines.append(line)
-					else:
-						pass
-
-				space_count = 0
-				for letter in AA_lines[0]:
-					if letter == ' ':
-						space_count += 1
-				space_count += 2
-
-				aa = ''
-				for line in AA_lines:
-					aa += line.replace(line, line[space_count:])
-
-				phd = ''
-				for line in PHD_lines:
-					phd += line.replace(line, line[space_count:])
-
-				prof = ''
-				for line in PROF_lines:
-					prof += line.replace(line, line[space_count:])
-
-				sspro = ''
-				for line in SSPRO_lines:
-					sspro += line.replace(line, line[space_count:])
-
-				jnet = ''
-				for line in JNET_lines:
-					jnet += line.replace(line, line[space_count:])
-
-				psipred = ''
-				for line in PSIPRED_lines:
-					psipred += line.replace(line, line[space_count:])
-
-				#sympred = ''
-				#for line in SYMPRED_lines:
-					#sympred += line.replace(line, line[space_count:])
-
-				def replace_space_with_c(letter):
-					if letter == ' ':
-						out = letter.replace(letter, "C")
-					else:
-						out = letter
-
-					return(out)
-
-				aa_list = []
-				for letter in aa:
-					aa_list.append(letter)
-				aa_dict = {'AA':aa_list}
-
-				phd_list = []
-				for letter in phd:
-					phd_list.append(replace_space_with_c(letter))
-				phd_dict = {'PHD':phd_list}
-
-				prof_list = []
-				for letter in prof:
-					prof_list.append(replace_space_with_c(letter))
-				prof_dict = {'PROF':prof_list}
-
-				sspro_list = []
-				for letter in sspro:
-					sspro_list.append(replace_space_with_c(letter))
-				sspro_dict = {'SSPRO':sspro_list}
-
-				jnet_list = []
-				for letter in jnet:
-					jnet_list.append(replace_space_with_c(letter))
-				jnet_dict = {'JNET':jnet_list}
-
-				psipred_list = []
-				for letter in psipred:
-					psipred_list.append(replace_space_with_c(letter))
-				psipred_dict = {'PSIPRED':psipred_list}
-
-				# ~ sympred_list = []
-				# ~ for letter in sympred:
-					# ~ sympred_list.append(replace_space_with_c(letter))
-				# ~ sympred_dict = {'SYMPRED':sympred_list}
-
-
-				output_data = dict()
-				for dictionary in [phd_dict, prof_dict, sspro_dict, jnet_dict, psipred_dict]:
-					output_data.update(dictionary)
-
-				print(output_data)
-
-				sympred_end_time = time.time()
-				sympred_execution_time = sympred_end_time - sympred_start_time
-				print(f'Sympred took {sympred_execution_time} sec')
-
-
-				return output_data
-				break
-			else:
-				print(f'Sympred: Request failed with status code {results_page.status_code}')
-				print(f'Sympred: Aborting operation.')
-				break
+			sympred_end_time = time.time()
+			sympred_execution_time = sympred_end_time - sympred_start_time
+			print(f'Sympred took {sympred_execution_time} sec')
+
+
+			return output_data
+
+		else:
+			print(f'Sympred: Request failed with status code {results_page.status_code}')
+			print(f'Sympred: Aborting operation.')
+			await journal_finished(job, 'Sympred', sympred_parameters, 'failed')
+			health_record('Sympred', False)
+			return None
 
 	else:
 		print('Sympred: Unable to get job ID')
+		health_record('Sympred', False)
+
+def runSympred5(job):
+	return asyncio.run(runSympred5_async(job))
 
-def runYaspin():
+async def runYaspin_async(job):
 	yaspin_start_time = time.time()
 
 	print('Running Yaspin')
@@ -663,16 +1977,21 @@ def runYaspin():
 
 	# Define the form data to be submitted
 	data = {
-		'seq': sequence,
+		'seq': job.sequence,
 		'seq_file': ('', ''),
 		'pssm_file': ('', ''),
 		'smethod': 'nr',
 		'nnmethod': 'dssp',
-		'email': email,
-		'mbjob[description]': seq_name,
+		'email': job.email,
+		'mbjob[description]': job.name,
 		'yaspin_align': 'YASPIN prediction',
 	}
 
+	yaspin_parameters = {'smethod': data['smethod'], 'nnmethod': data['nnmethod']}
+	cached = await cache_lookup(job, 'YASPIN', yaspin_parameters)
+	if cached != None:
+		return cached
+
 	# Set the headers for the request
 	headers = {
 		'Content-Type': 'multipart/form-data; boundary=' + boundary
@@ -694,71 +2013,419 @@ def runYaspin():
 	# Define the URL of the Yaspin web form
 	url = 'https://www.ibi.vu.nl/programs/yaspinwww/'
 
-	# Submit the form data using a POST request
-	response = requests.post(url, headers=headers, data=payload, allow_redirects=True)
+	# A job submitted by an earlier run that was interrupted is polled again instead of resubmitted
+	journaled = journal_lookup(job, 'YASPIN', yaspin_parameters, job.yaspin_timeout)
+	if journaled != None:
+		yaspin_start_time = journaled['submitted']
+		job_id = journaled['job_id']
+	else:
+		# Submit the form data using a POST request
+		health_check(job, 'YASPIN')
+		job_id = await submit_vu_job(job, 'YASPIN', url, headers, payload)
 
-	# Check if the POST request was successful
-	if response.status_code == 202:
-		# Extract the job ID from the redirect URL
-		job_id = response.url.split('/')[-2]
+	if job_id != None:
 		print(f'Yaspin Job ID: {job_id}')
 
 		# Define the URL of the job results page
 		results_url = f'http://zeus.few.vu.nl/jobs/{job_id}/results.out'
+		if journaled == None:
+			await journal_submitted(job, 'YASPIN', yaspin_parameters, job_id, results_url)
 
 		# Wait for the job to complete and the results to become available
 		print('Yaspin: Waiting for results...')
 
-		while True:
+		# The shared poller checks the results page with backoff and returns the first response that is not pending
+		try:
+			results_page = await get_poller().wait_for('YASPIN', results_url, yaspin_start_time + job.yaspin_timeout, pending_statuses=(404,), sequence=job.name)
+		except Exception:
+			# the results page could not be checked until the timeout
+			await journal_finished(job, 'YASPIN', yaspin_parameters, 'failed')
+			raise
+
+		if results_page == None:
+			print(f'Yaspin timed out. Exceeded {job.yaspin_timeout} seconds.')
+			await journal_finished(job, 'YASPIN', yaspin_parameters, 'timeout')
+			health_record('YASPIN', False)
+			return None
+
+		elif results_page.status_code == 200:
+			try:
+				yaspin = await parse_result(functools.partial(backend_parser('YASPIN'), n_residues=len(job.sequence)), results_page.text, 'YASPIN', job.name)
+			except ValueError as e:
+				print(f'Yaspin: {e}')
+				await journal_finished(job, 'YASPIN', yaspin_parameters, 'failed')
+				health_record('YASPIN', False)
+				return None
 
-			# check elapsed time
-			if (time.time() - yaspin_start_time) > yaspin_timeout:
-				print(f'Yaspin timed out. Exceeded {yaspin_timeout} seconds.')
-				break
+			print(yaspin)
+			await cache_store(job, 'YASPIN', yaspin_parameters, yaspin)
+			await journal_finished(job, 'YASPIN', yaspin_parameters, 'finished')
+			health_record('YASPIN', True, time.time() - yaspin_start_time)
 
-			# Send a GET request to the results page
-			results_page = requests.get(results_url)
-
-			if results_page.status_code == 404:
-				sleep(5)
-			elif results_page.status_code == 200:
-				text_lines = results_page.text.split('\n')
-				yaspin_string = ''
-				for line in text_lines:
-					if '*' in line:
-						continue
-					elif 'Pred: ' in line:
-						yaspin_string += line.split('Pred: ')[1].split('\n')[0]
-					else:
-						continue
-
-				yaspin_out = []
-				for letter in yaspin_string:
-					if letter == '-':
-						yaspin_out.append(letter.replace('-', 'C'))
-					else:
-						yaspin_out.append(letter)
-
-				yaspin = {'YASPIN': yaspin_out}
-				print(yaspin)
-
-				yaspin_end_time = time.time()
-				yaspin_execution_time = yaspin_end_time - yaspin_start_time
-				print(f'Yaspin completed in {yaspin_execution_time} sec')
-				return yaspin
-				break
+			yaspin_end_time = time.time()
+			yaspin_execution_time = yaspin_end_time - yaspin_start_time
+			print(f'Yaspin completed in {yaspin_execution_time} sec')
+			return yaspin
 
-			else:
-				print(f'Yaspin: Request failed with status code {results_page.status_code}')
-				print(f'Yaspin: Aborting operation.')
-				return None
-				break
+		else:
+			print(f'Yaspin: Request failed with status code {results_page.status_code}')
+			print(f'Yaspin: Aborting operation.')
+			await journal_finished(job, 'YASPIN', yaspin_parameters, 'failed')
+			health_record('YASPIN', False)
+			return None
 
 	else:
 		print('Yaspin: Unable to get job ID')
+		health_record('YASPIN', False)
 		return None
 
-def process_data(data_list):
+def runYaspin(job):
+	return asyncio.run(runYaspin_async(job))
+
+# Local predictors
+# Chou-Fasman conformational parameters (P(a), P(b), P(turn) x 100; Chou & Fasman, 1978)
+chou_fasman_parameters = {
+							'A': (142, 83, 66), 'R': (98, 93, 95), 'N': (67, 89, 156), 'D': (101, 54, 146),
+							'C': (70, 119, 119), 'Q': (111, 110, 98), 'E': (151, 37, 74), 'G': (57, 75, 156),
+							'H': (100, 87, 95), 'I': (108, 160, 47), 'L': (121, 130, 59), 'K': (114, 74, 101),
+							'M': (145, 105, 60), 'F': (113, 138, 60), 'P': (57, 55, 152), 'S': (77, 75, 143),
+							'T': (83, 119, 96), 'W': (108, 137, 96), 'Y': (69, 147, 114), 'V': (106, 170, 50)}
+amino_acids = ''.join(chou_fasman_parameters.keys())
+gor_window = 17 # residues, offsets -8..8
+
+def encode_sequence(sequence):
+	# Index of every residue in amino_acids; anything else (X, B, Z, gaps, ...) gets index 20
+	lookup = np.full(256, len(amino_acids), dtype=np.intp)
+	for idx, aa in enumerate(amino_acids):
+		lookup[ord(aa)] = idx
+	return lookup[np.frombuffer(sequence.upper().encode('ascii', errors='replace'), dtype=np.uint8)]
+
+local_gor_tables = dict() # GOR I tables loaded by this (worker) process, by file
+
+def load_gor_table(path):
+	# Returns (states, array of shape (states, 21, 17)); row 20 (unknown residues) carries no information
+	if path not in local_gor_tables:
+		with open(path) as table_file:
+			table = {state: [values[aa] for aa in amino_acids] for state, values in json.load(table_file).items()}
+		states = tuple(table.keys())
+		information = np.zeros((len(states), len(amino_acids) + 1, gor_window))
+		for idx, state in enumerate(states):
+			information[idx, :len(amino_acids)] = table[state]
+		local_gor_tables[path] = (states, information)
+	return local_gor_tables[path]
+
+def predict_gor1(sequence, table_file, decision_constants=None):
+	# GOR I: the information of the 17 residues around each residue is summed per state (one gather over a strided
+	# window view of the padded sequence), the decision constants of the table's states are added and the highest
+	# scoring state is assigned
+	if len(sequence) == 0:
+		return []
+	states, information = load_gor_table(table_file)
+	half = gor_window // 2
+	padded = np.pad(encode_sequence(sequence), half, constant_values=len(amino_acids))
+	windows = np.lib.stride_tricks.sliding_window_view(padded, gor_window)
+	scores = information[:, windows, np.arange(gor_window)].sum(axis=2)
+	if decision_constants != None:
+		scores += np.array([decision_constants.get(state, 0) for state in states], dtype=np.float64)[:, None]
+	return np.array(states)[scores.argmax(axis=0)].tolist()
+
+def window_cover(starts, width, n_residues):
+	# Marks every residue inside a window of width that starts at one of the starts (a boolean per window start)
+	return np.convolve(starts.astype(np.int8), np.ones(width, dtype=np.int8))[:n_residues] > 0
+
+def grow_regions(propensity, nucleus_width, nucleus_formers, former_threshold, breaker_threshold, n_residues):
+	# Chou-Fasman region growth for one state: nuclei are windows of nucleus_width with at least nucleus_formers residues
+	# above former_threshold and at most one breaker (below breaker_threshold); each one is extended residue by residue
+	# in both directions and stops at the first 4-residue window (the new residue and the three region residues next to
+	# it) with a mean propensity below 1.00.
+	# Returns the region label of every residue (0 outside any region).
+	if n_residues < nucleus_width:
+		return np.zeros(n_residues, dtype=np.intp)
+	formers = np.lib.stride_tricks.sliding_window_view(propensity > former_threshold, nucleus_width).sum(axis=1)
+	breakers = np.lib.stride_tricks.sliding_window_view(propensity < breaker_threshold, nucleus_width).sum(axis=1)
+	nuclei = window_cover((formers >= nucleus_formers) & (breakers < 2), nucleus_width, n_residues)
+	# tetrapeptide idx covers residues idx..idx+3
+	tetrapeptides = np.lib.stride_tricks.sliding_window_view(propensity, 4).mean(axis=1) >= 1.0
+
+	regions = nuclei.copy()
+	edges = np.diff(np.concatenate(([0], nuclei.astype(np.int8), [0])))
+	for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+		while end < n_residues and tetrapeptides[end - 3]:
+			end += 1
+		while start > 0 and tetrapeptides[start - 1]:
+			start -= 1
+		regions[start:end] = True
+
+	return np.cumsum(np.diff(np.concatenate(([False], regions)).astype(np.int8)) == 1) * regions
+
+def region_means(labels, values):
+	# Mean of values over the region of every residue
+	sums = np.bincount(labels, weights=values)
+	counts = np.bincount(labels)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return (sums / counts)[labels]
+
+def predict_chou_fasman(sequence):
+	# Chou-Fasman helix (4 of 6 formers) and sheet (3 of 5 formers) nucleation, with at most one breaker (P < 0.78), and extension. A region is kept when its
+	# mean propensity is high enough and above the other state's; residues in both a helix and a sheet take the state
+	# of the region with the higher mean. Turns need the bend frequency tables and are left out, so the rest is C.
+	n_residues = len(sequence)
+	parameters = np.vstack([np.array(list(chou_fasman_parameters.values()), dtype=np.float64) / 100, np.ones(3)])
+	pa, pb, _ = parameters[encode_sequence(sequence)].T
+
+	helix = grow_regions(pa, 6, 4, 1.03, 0.78, n_residues)
+	sheet = grow_regions(pb, 5, 3, 1.00, 0.78, n_residues)
+	helix_pa, helix_pb = region_means(helix, pa), region_means(helix, pb)
+	sheet_pa, sheet_pb = region_means(sheet, pa), region_means(sheet, pb)
+	is_helix = (helix > 0) & (helix_pa > 1.03) & (helix_pa > helix_pb)
+	is_sheet = (sheet > 0) & (sheet_pb > 1.05) & (sheet_pb > sheet_pa)
+
+	both = is_helix & is_sheet
+	is_helix[both] = helix_pa[both] >= sheet_pb[both]
+	is_sheet[both] = ~is_helix[both]
+
+	assignments = np.full(n_residues, 'C')
+	assignments[is_helix] = 'H'
+	assignments[is_sheet] = 'E'
+	return assignments.tolist()
+
+def predict_local(sequence, decision_constants=None, table_file=None):
+	# The local predictions for one sequence (a module-level function, so it can run in a worker process).
+	# GOR I needs an information table, so without table_file only Chou-Fasman is predicted.
+	output = {'chou_fasman': predict_chou_fasman(sequence)}
+	if table_file != None:
+		output['gor1_local'] = predict_gor1(sequence, table_file, decision_constants)
+	return output
+
+local_executor = None
+
+def get_local_executor():
+	# Process pool for the local predictors, or None to run them on the event loop (local_workers = 0)
+	global local_executor
+	if local_workers > 0 and local_executor == None:
+		local_executor = concurrent.futures.ProcessPoolExecutor(max_workers=local_workers)
+	return local_executor
+
+async def run_local_async(job):
+	# The 'Local' backend: GOR I (with the job's decision constants) and Chou-Fasman, without any network
+	local_start_time = time.perf_counter()
+	decision_constants = None
+	if str(job.constants) != '0':
+		decision_constants = {'H': float(job.dch), 'E': float(job.dce), 'T': float(job.dct), 'C': float(job.dcc)}
+
+	executor = get_local_executor()
+	if executor == None:
+		output = predict_local(job.sequence, decision_constants, gor_table_file)
+	else:
+		output = await asyncio.get_running_loop().run_in_executor(executor, predict_local, job.sequence, decision_constants, gor_table_file)
+
+	metrics.record('local', 'Local', time.perf_counter() - local_start_time, job.name)
+	print(f'Local predictions completed in {time.perf_counter() - local_start_time} seconds')
+	return output
+
+def run_local(job):
+	return asyncio.run(run_local_async(job))
+
+# Secondary structure classes counted by the vkabat engine (column order of the count matrix)
+ss_classes = ('E', 'H', 'C', 'T')
+
+def encode_predictions(predictions):
+	# Encodes {predictor: per-residue assignments} as a uint8 matrix of shape (residues x predictors).
+	# Each cell holds the ASCII code of the assignment, so unexpected symbols are kept distinct.
+	columns = list(predictions.values())
+	if len(columns) == 0:
+		raise ValueError('No predictions to encode.')
+
+	lengths = {key: len(value) for key, value in predictions.items()}
+	if len(set(lengths.values())) != 1:
+		raise ValueError(f'Predictions have different lengths: {lengths}')
+
+	ss_matrix = np.empty((len(columns[0]), len(columns)), dtype=np.uint8)
+	for j, column in enumerate(columns):
+		ss_matrix[:, j] = np.frombuffer(''.join(column).encode('ascii', errors='replace'), dtype=np.uint8)
+
+	return ss_matrix
+
+def count_assignments(ss_matrix):
+	# Counts how often each residue (row of ss_matrix) was assigned each symbol, for all residues in one bincount.
+	# Returns (counts, symbols): the columns of counts follow symbols, which starts with E, H, C, T and then
+	# has one extra column for every other symbol found in ss_matrix.
+	n_residues = ss_matrix.shape[0]
+	symbols = list(ss_classes) + [chr(code) for code in np.unique(ss_matrix) if chr(code) not in ss_classes]
+
+	lookup = np.zeros(256, dtype=np.intp)
+	for idx, ss in enumerate(symbols):
+		lookup[ord(ss)] = idx
+	n_bins = len(symbols)
+	bins = lookup[ss_matrix] + n_bins * np.arange(n_residues, dtype=np.intp)[:, None]
+	counts = np.bincount(bins.ravel(), minlength=n_bins * n_residues).reshape(n_residues, n_bins)
+
+	return counts, tuple(symbols)
+
+def calc_vkabat_counts(counts, symbols):
+	# Computes E/H/C/T counts, percentages, k, N, n1 and vkabat for every residue from a count matrix.
+	# k = number of secondary structure classes predicted for a residue (1, 2, or 3)
+	# N = total number of predictions (15)
+	# n1 = how often most predicted ss is observed for a residue
+	# consensus = the most predicted of E, H, C, T (ties go to the first in that order)
+	# entropy = Shannon entropy (bits) of the assignments of a residue, over every symbol
+	if counts[:, len(ss_classes):].any():
+		print('Encountered secondary structure assignment other than E, H, C, or T!')
+
+	ss_counts = counts[:, :len(ss_classes)]
+	total_counts = ss_counts.sum(axis=1)
+
+	# k counts every distinct assignment of a residue, the same as np.unique on a single residue
+	k = np.count_nonzero(counts, axis=1)
+	N = counts.sum(axis=1)
+	n1 = ss_counts.max(axis=1)
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		percentages = np.round(ss_counts * 100 / total_counts[:, None], 2)
+		vkabat = k * N / n1
+		frequencies = counts / N[:, None]
+		entropy = -np.sum(frequencies * np.log2(np.where(counts > 0, frequencies, 1)), axis=1)
+
+	consensus = np.array(ss_classes)[ss_counts.argmax(axis=1)]
+
+	calc_dict = {
+					'E_COUNT': ss_counts[:, 0],
+					'H_COUNT': ss_counts[:, 1],
+					'C_COUNT': ss_counts[:, 2],
+					'T_COUNT': ss_counts[:, 3],
+					'total_counts': total_counts,
+					'E_perc': percentages[:, 0],
+					'H_perc': percentages[:, 1],
+					'C_perc': percentages[:, 2],
+					'T_perc': percentages[:, 3],
+					'k': k,
+					'N': N,
+					'n1': n1,
+					'vkabat': vkabat,
+					'consensus': consensus,
+					'entropy': entropy
+					}
+
+	return calc_dict
+
+def predictor_agreement(ss_matrix):
+	# (predictors x predictors) matrix of the fraction of residues two predictors assigned the same symbol, from one
+	# broadcast comparison of every pair of columns
+	return (ss_matrix[:, :, None] == ss_matrix[:, None, :]).mean(axis=0)
+
+def calc_vkabat_matrix(ss_matrix):
+	# Computes the vkabat metrics for every residue of an encoded (residues x predictors) matrix in one batched pass
+	counts, symbols = count_assignments(ss_matrix)
+	return calc_vkabat_counts(counts, symbols)
+
+def rolling_vkabat(vkabat, window):
+	# Centred rolling mean and max of a vkabat profile over window residues, for every residue at once: the mean from
+	# cumulative sums, the max from a strided view of the padded profile. Windows are cut short at the ends of the
+	# sequence and residues without a vkabat (nan) are left out of the windows they fall in.
+	vkabat = np.asarray(vkabat, dtype=np.float64)
+	n_residues = len(vkabat)
+	valid = ~np.isnan(vkabat)
+	before = (window - 1) // 2
+	after = window // 2
+
+	positions = np.arange(n_residues)
+	starts = np.maximum(positions - before, 0)
+	ends = np.minimum(positions + after + 1, n_residues)
+	sums = np.concatenate(([0.0], np.cumsum(np.where(valid, vkabat, 0.0))))
+	counts = np.concatenate(([0], np.cumsum(valid)))
+	with np.errstate(divide='ignore', invalid='ignore'):
+		vkabat_mean = (sums[ends] - sums[starts]) / (counts[ends] - counts[starts])
+
+	padded = np.pad(np.where(valid, vkabat, -np.inf), (before, after), constant_values=-np.inf)
+	vkabat_max = np.lib.stride_tricks.sliding_window_view(padded, window).max(axis=1)
+	vkabat_max[np.isneginf(vkabat_max)] = np.nan
+
+	return {'vkabat_mean': vkabat_mean, 'vkabat_max': vkabat_max}
+
+def find_segments(profile, threshold, min_length=1):
+	# Returns (starts, ends) (0-based, end exclusive) of the runs of at least min_length residues whose profile is at
+	# least threshold, from the rising and falling edges of the thresholded profile
+	above = np.asarray(profile) >= threshold
+	edges = np.flatnonzero(np.diff(np.concatenate(([0], above.astype(np.int8), [0]))))
+	starts = edges[0::2]
+	ends = edges[1::2]
+	keep = ends - starts >= min_length
+	return starts[keep], ends[keep]
+
+def segment_rows(name, vkabat, starts, ends):
+	# csv lines (name,start,end,length,mean_vkabat,max_vkabat; residues 1-based and inclusive) of the segments of one sequence
+	vkabat = np.asarray(vkabat, dtype=np.float64)
+	if len(starts) == 0:
+		return []
+
+	valid = ~np.isnan(vkabat)
+	sums = np.concatenate(([0.0], np.cumsum(np.where(valid, vkabat, 0.0))))
+	counts = np.concatenate(([0], np.cumsum(valid)))
+	with np.errstate(divide='ignore', invalid='ignore'):
+		means = (sums[ends] - sums[starts]) / (counts[ends] - counts[starts])
+	# fmax.reduceat over interleaved (start, end) indices reduces every segment in one call; the appended nan keeps
+	# an end at the last residue a valid index
+	maxima = np.fmax.reduceat(np.append(vkabat, np.nan), np.column_stack((starts, ends)).ravel())[0::2]
+
+	return [f'{name},{start + 1},{end},{end - start},{mean},{maximum}\n' for start, end, mean, maximum in zip(starts.tolist(), ends.tolist(), means.tolist(), maxima.tolist())]
+
+segment_header = 'name,start,end,length,mean_vkabat,max_vkabat\n'
+
+def write_segments(job, vkabat_out_dict):
+	# Finds the variable segments of the job's (smoothed) vkabat profile and writes or appends them to the segment table
+	profile = vkabat_out_dict.get('vkabat_mean', vkabat_out_dict['vkabat'])
+	starts, ends = find_segments(profile, job.segment_threshold, job.segment_min_length)
+	rows = segment_rows(job.name, vkabat_out_dict['vkabat'], starts, ends)
+	print(f'{job.name}: {len(rows)} variable segments (vkabat >= {job.segment_threshold})')
+
+	if job.segment_file != None:
+		job.segment_file.writelines(rows)
+		job.segment_file.flush()
+		return
+
+	segment_file_name_path = os.path.join(job.output_directory, str(job.name) + '_vkabat_segments.csv')
+	print(f'Writing vkabat segments csv file {segment_file_name_path}')
+	with open(segment_file_name_path, 'w') as segment_file:
+		segment_file.write(segment_header)
+		segment_file.writelines(rows)
+
+class VkabatAccumulator:
+	# Running count matrix that predictor outputs are added to as they arrive, so a partial vkabat
+	# profile is available before every predictor has finished
+
+	def __init__(self, n_residues):
+		self.n_residues = n_residues
+		self.counts = np.zeros((n_residues, len(ss_classes)), dtype=np.int64)
+		self.symbols = ss_classes
+		self.predictors = []
+
+	def add(self, predictions):
+		ss_matrix = encode_predictions(predictions)
+		if ss_matrix.shape[0] != self.n_residues:
+			raise ValueError(f'Expected {self.n_residues} residues but got {ss_matrix.shape[0]} from {list(predictions.keys())}')
+
+		counts, symbols = count_assignments(ss_matrix)
+		new_symbols = [ss for ss in symbols if ss not in self.symbols]
+		if len(new_symbols) > 0:
+			self.counts = np.hstack([self.counts, np.zeros((self.n_residues, len(new_symbols)), dtype=np.int64)])
+			self.symbols = self.symbols + tuple(new_symbols)
+
+		self.counts[:, [self.symbols.index(ss) for ss in symbols]] += counts
+		self.predictors.extend(predictions.keys())
+
+	def result(self):
+		return calc_vkabat_counts(self.counts, self.symbols)
+
+def write_partial_vkabat(accumulator, job):
+	# Replaces <job name>_vkabat_partial.csv with the profile of the predictors that have finished so far
+	partial_file_name_path = os.path.join(job.output_directory, str(job.name) + '_vkabat_partial.csv')
+	df = pd.DataFrame(data=accumulator.result())
+	temporary_file_name_path = partial_file_name_path + '.tmp'
+	df.to_csv(temporary_file_name_path, index=False)
+	os.replace(temporary_file_name_path, partial_file_name_path)
+	print(f'Updated partial vkabat csv file {partial_file_name_path} ({len(accumulator.predictors)} predictions: {", ".join(accumulator.predictors)})')
+
+def process_data(data_list, job):
 	pd_start = time.time()
 	print(f'Processing data...')
 
@@ -770,151 +2437,295 @@ def process_data(data_list):
 	for key, value in zip(all_algos_dict.keys(), all_algos_dict.values()):
 		print(f'{key}: {value}\n')
 
-	def calc_vkabat(ss_assignment_list):
-		# k = number of secondary structure classes predicted for a residue (1, 2, or 3)
-		# N = total number of predictions (15)
-		# n1 = how often most predicted ss is observed for a residue
-
-		N = len(ss_assignment_list)
-
-		unique_ss_assignment_list = np.unique(np.array(ss_assignment_list))
-
-		k = len(unique_ss_assignment_list)
-
-		counts_list = []
-		E_COUNT = 0
-		H_COUNT = 0
-		C_COUNT = 0
-		T_COUNT = 0
-		for ss in ss_assignment_list:
-				if ss == 'E':
-					E_COUNT += 1
-				elif ss == 'H':
-					H_COUNT += 1
-				elif ss == 'C':
-					C_COUNT += 1
-				elif ss == 'T':
-					T_COUNT += 1
-				else:
-					print('Encountered secondary structure assignment other than E, H, C, or T!')
-
-		counts_list.append(E_COUNT)
-		counts_list.append(H_COUNT)
-		counts_list.append(C_COUNT)
-		counts_list.append(T_COUNT)
-
-		total_counts = 0
-		for count in counts_list:
-			total_counts += count
-
-		E_perc = round(Decimal(str(E_COUNT / total_counts * 100)), 2)
-		H_perc = round(Decimal(str(H_COUNT / total_counts * 100)), 2)
-		C_perc = round(Decimal(str(C_COUNT / total_counts * 100)), 2)
-		T_perc = round(Decimal(str(T_COUNT / total_counts * 100)), 2)
-
-		n1 = max(counts_list)
+	# Encode every predictor column into one (residues x predictors) matrix and run the vkabat engine once
+	predictors = list(all_algos_dict.keys())
+	ss_matrix = encode_predictions(all_algos_dict)
+	vkabat_out_dict = calc_vkabat_matrix(ss_matrix)
+	if job.smoothing_window != None:
+		vkabat_out_dict.update(rolling_vkabat(vkabat_out_dict['vkabat'], job.smoothing_window))
+
+	agreement = predictor_agreement(ss_matrix)
+
+	print(f'vkabat: {vkabat_out_dict["vkabat"].tolist()}')
+	print(f'consensus: {"".join(vkabat_out_dict["consensus"])}')
+
+	if job.segment_threshold != None:
+		write_segments(job, vkabat_out_dict)
+
+	if 'csv' in output_formats:
+		all_algos_dict.update(vkabat_out_dict)
+		df = pd.DataFrame(data=all_algos_dict)
+
+		print('')
+		print(df)
+		print('')
+
+		# Write DataFrame csv file
+		vkabat_dataframe_file_name = str(job.name) + '_vkabat_dataframe.csv'
+		vkabat_dataframe_file_name_path = os.path.join(job.output_directory, vkabat_dataframe_file_name)
+		print(f'Writing vkabat (data frame) csv file {vkabat_dataframe_file_name_path}')
+		df.to_csv(vkabat_dataframe_file_name_path)
+
+		# Write vkabat csv file
+		vkabat_only_file_name = str(job.name) + '_vkabat.csv'
+		vkabat_only_file_name_path = os.path.join(job.output_directory, vkabat_only_file_name)
+		print(f'Writing vkabat (only) csv file {vkabat_only_file_name_path}')
+		df2 = pd.DataFrame(data={'vkabat': vkabat_out_dict["vkabat"]})
+		df2.to_csv(vkabat_only_file_name_path, index=False)
+
+		# Write predictor agreement csv file
+		vkabat_agreement_file_name = str(job.name) + '_vkabat_agreement.csv'
+		vkabat_agreement_file_name_path = os.path.join(job.output_directory, vkabat_agreement_file_name)
+		print(f'Writing predictor agreement csv file {vkabat_agreement_file_name_path}')
+		df3 = pd.DataFrame(data=agreement, index=predictors, columns=predictors)
+		df3.to_csv(vkabat_agreement_file_name_path)
+
+	if 'parquet' in output_formats:
+		table = vkabat_table(job.name, predictors, ss_matrix, vkabat_out_dict)
+		if job.dataset != None:
+			job.dataset.append(table)
+		else:
+			vkabat_parquet_file_name_path = os.path.join(job.output_directory, str(job.name) + '_vkabat.parquet')
+			print(f'Writing vkabat parquet file {vkabat_parquet_file_name_path}')
+			dataset = ColumnarDataset(vkabat_parquet_file_name_path)
+			dataset.append(table)
+			dataset.close()
 
-		vkabat = k * N / n1
+	if 'npz' in output_formats:
+		vkabat_npz_file_name_path = os.path.join(job.output_directory, str(job.name) + '_vkabat.npz')
+		print(f'Writing vkabat npz file {vkabat_npz_file_name_path}')
+		write_vkabat_npz(vkabat_npz_file_name_path, predictors, ss_matrix, vkabat_out_dict, agreement)
 
-		calc_dict = {
-						'E_COUNT': E_COUNT,
-						'H_COUNT': H_COUNT,
-						'C_COUNT': C_COUNT,
-						'T_COUNT': T_COUNT,
-						'total_counts': total_counts,
-						'E_perc': E_perc,
-						'H_perc': H_perc,
-						'C_perc': C_perc,
-						'T_perc': T_perc,
-						'k': k,
-						'N': N,
-						'n1': n1,
-						'vkabat':vkabat
-						}
-
-		return calc_dict
-
-	i = 0
-	list_2d = []
-	while i < len(sequence):
-		list_1d = []
-		for x in all_algos_dict.values():
-			list_1d.append(x[i])
-		list_2d.append(list_1d)
-		i += 1
-
-	E_COUNT_list = []
-	H_COUNT_list = []
-	C_COUNT_list = []
-	T_COUNT_list = []
-	total_counts_list = []
-	E_perc_list = []
-	H_perc_list = []
-	C_perc_list = []
-	T_perc_list = []
-	k_list = []
-	N_list = []
-	n1_list = []
-	vkabat_list = []
-	for each in list_2d:
-		E_COUNT_list.append(calc_vkabat(each)['E_COUNT'])
-		H_COUNT_list.append(calc_vkabat(each)['H_COUNT'])
-		C_COUNT_list.append(calc_vkabat(each)['C_COUNT'])
-		T_COUNT_list.append(calc_vkabat(each)['T_COUNT'])
-		total_counts_list.append(calc_vkabat(each)['total_counts'])
-		E_perc_list.append(calc_vkabat(each)['E_perc'])
-		H_perc_list.append(calc_vkabat(each)['H_perc'])
-		C_perc_list.append(calc_vkabat(each)['C_perc'])
-		T_perc_list.append(calc_vkabat(each)['T_perc'])
-		k_list.append(calc_vkabat(each)['k'])
-		N_list.append(calc_vkabat(each)['N'])
-		n1_list.append(calc_vkabat(each)['n1'])
-		vkabat_list.append(calc_vkabat(each)['vkabat'])
-
-	vkabat_out_dict = {
-						'E_COUNT': E_COUNT_list,
-						'H_COUNT': H_COUNT_list,
-						'C_COUNT': C_COUNT_list,
-						'T_COUNT': T_COUNT_list,
-						'total_counts': total_counts_list,
-						'E_perc': E_perc_list,
-						'H_perc': H_perc_list,
-						'C_perc': C_perc_list,
-						'T_perc': T_perc_list,
-						'k': k_list,
-						'N': N_list,
-						'n1': n1_list,
-						'vkabat': vkabat_list
-						}
-
-	print(f'vkabat: {vkabat_out_dict["vkabat"]}')
-
-	all_algos_dict.update(vkabat_out_dict)
-	df = pd.DataFrame(data=all_algos_dict)
-
-	print('')
-	print(df)
-	print('')
-
-	# Write DataFrame csv file
-	vkabat_dataframe_file_name = str(seq_name) + '_vkabat_dataframe.csv'
-	vkabat_dataframe_file_name_path = os.path.join(output_directory, vkabat_dataframe_file_name)
-	print(f'Writing vkabat (data frame) csv file {vkabat_dataframe_file_name_path}')
-	df.to_csv(vkabat_dataframe_file_name_path)
-
-	# Write vkabat csv file
-	vkabat_only_file_name = str(seq_name) + '_vkabat.csv'
-	vkabat_only_file_name_path = os.path.join(output_directory, vkabat_only_file_name)
-	print(f'Writing vkabat (only) csv file {vkabat_only_file_name_path}')
-	df2 = pd.DataFrame(data={'vkabat': vkabat_out_dict["vkabat"]})
-	df2.to_csv(vkabat_only_file_name_path, index=False)
 
+	if 'archive' in output_formats:
+		if job.archive != None:
+			job.archive.append(job.name, predictors, ss_matrix)
+		else:
+			vkabat_archive_file_name_path = os.path.join(job.output_directory, str(job.name) + '_vkabat.pvk')
+			print(f'Writing packed prediction archive {vkabat_archive_file_name_path}')
+			archive = PredictionArchive(vkabat_archive_file_name_path)
+			archive.append(job.name, predictors, ss_matrix)
+			archive.close()
 
 	pd_end = time.time()
 	print(f'Processing Data completed in {pd_end - pd_start} seconds')
+	metrics.record('process_data', None, pd_end - pd_start, job.name)
 
 	return vkabat_out_dict
 
+# Typed columnar output
+# Every predictor has a fixed column so the row groups of all sequences in a batch share one schema. Assignments are
+# stored as categoricals (int8 codes into a small dictionary), counts as int16 and percentages/vkabat as float32.
+# The built-in predictors keep this column order; predictors of other registered backends follow.
+builtin_predictor_columns = ('gor1', 'gor3', 'dpm', 'predator', 'hnn', 'sopm', 'mlrc', 'dsc', 'JPred', 'PHD', 'PROF', 'SSPRO', 'JNET', 'PSIPRED', 'YASPIN', 'gor1_local', 'chou_fasman')
+count_columns = ('E_COUNT', 'H_COUNT', 'C_COUNT', 'T_COUNT', 'total_counts', 'k', 'N', 'n1')
+float_columns = ('E_perc', 'H_perc', 'C_perc', 'T_perc', 'vkabat', 'entropy')
+smoothed_columns = ('vkabat_mean', 'vkabat_max') # null unless a smoothing window is set
+
+# The columns, groups and choices below are built from backends each time, so they include backends registered later
+
+def predictor_columns():
+	columns = list(builtin_predictor_columns)
+	for backend in backends.values():
+		columns += [predictor for predictor in backend['predictors'] if predictor not in columns]
+	return tuple(columns)
+
+def predictor_groups():
+	# The predictor columns of each server, so a whole server can be kept or left out by name when recomputing
+	return {name: backend['predictors'] for name, backend in backends.items()}
+
+def predictor_choices():
+	groups = predictor_groups()
+	return list(groups.keys()) + [predictor for predictor in predictor_columns() if predictor not in groups]
+
+def import_pyarrow():
+	try:
+		import pyarrow
+		import pyarrow.parquet
+	except ModuleNotFoundError:
+		raise RuntimeError("The parquet output format needs 'pyarrow'. Install it with:\n$pip install pyarrow")
+	return pyarrow
+
+def vkabat_schema():
+	pa = import_pyarrow()
+	fields = [pa.field('name', pa.dictionary(pa.int32(), pa.string())), pa.field('residue', pa.int32())]
+	fields += [pa.field(predictor, pa.dictionary(pa.int8(), pa.string())) for predictor in predictor_columns() + ('consensus',)]
+	fields += [pa.field(column, pa.int16()) for column in count_columns]
+	fields += [pa.field(column, pa.float32()) for column in float_columns + smoothed_columns]
+	return pa.schema(fields)
+
+def vkabat_table(name, predictors, ss_matrix, vkabat_out_dict):
+	# Builds the arrow table of one sequence (one row per residue) from the encoded (residues x predictors) matrix
+	pa = import_pyarrow()
+	n_residues = ss_matrix.shape[0]
+	ss_type = pa.dictionary(pa.int8(), pa.string())
+
+	columns = {
+				'name': pa.DictionaryArray.from_arrays(np.zeros(n_residues, dtype=np.int32), pa.array([str(name)])),
+				'residue': pa.array(np.arange(1, n_residues + 1, dtype=np.int32))}
+
+	columns_of_predictors = predictor_columns()
+	for predictor in columns_of_predictors:
+		if predictor not in predictors:
+			columns[predictor] = pa.nulls(n_residues, type=ss_type)
+			continue
+		codes = ss_matrix[:, predictors.index(predictor)]
+		symbols, indices = np.unique(codes, return_inverse=True)
+		columns[predictor] = pa.DictionaryArray.from_arrays(indices.astype(np.int8), pa.array([chr(code) for code in symbols]))
+
+	consensus_codes = np.frombuffer(''.join(vkabat_out_dict['consensus']).encode('ascii'), dtype=np.uint8)
+	symbols, indices = np.unique(consensus_codes, return_inverse=True)
+	columns['consensus'] = pa.DictionaryArray.from_arrays(indices.astype(np.int8), pa.array([chr(code) for code in symbols]))
+
+	unknown = [predictor for predictor in predictors if predictor not in columns_of_predictors]
+	if len(unknown) > 0:
+		print(f'Not written to the parquet file (no column for): {", ".join(unknown)}')
+
+	for column in count_columns:
+		columns[column] = pa.array(np.asarray(vkabat_out_dict[column], dtype=np.int16))
+	for column in float_columns:
+		columns[column] = pa.array(np.asarray(vkabat_out_dict[column], dtype=np.float32))
+	for column in smoothed_columns:
+		if column in vkabat_out_dict:
+			columns[column] = pa.array(np.asarray(vkabat_out_dict[column], dtype=np.float32))
+		else:
+			columns[column] = pa.nulls(n_residues, type=pa.float32())
+
+	return pa.Table.from_pydict(columns, schema=vkabat_schema())
+
+class ColumnarDataset:
+	# One parquet file that every sequence of a batch is appended to as its own row group
+
+	def __init__(self, path):
+		pa = import_pyarrow()
+		self.path = path
+		self.writer = pa.parquet.ParquetWriter(path, vkabat_schema())
+		self.row_groups = 0
+
+	def append(self, table):
+		self.writer.write_table(table)
+		self.row_groups += 1
+
+	def close(self):
+		self.writer.close()
+
+def write_vkabat_npz(path, predictors, ss_matrix, vkabat_out_dict, agreement):
+	# Stores the uint8 assignment matrix (ASCII codes, residues x predictors), the predictor names, the typed metrics,
+	# the consensus (ASCII codes) and the predictor agreement matrix (in the order of the predictor names)
+	arrays = {'ss': ss_matrix, 'predictors': np.array(predictors)}
+	arrays['consensus'] = np.frombuffer(''.join(vkabat_out_dict['consensus']).encode('ascii'), dtype=np.uint8)
+	arrays['agreement'] = np.asarray(agreement, dtype=np.float32)
+	for column in count_columns:
+		arrays[column] = np.asarray(vkabat_out_dict[column], dtype=np.int16)
+	for column in float_columns + smoothed_columns:
+		if column in vkabat_out_dict:
+			arrays[column] = np.asarray(vkabat_out_dict[column], dtype=np.float32)
+	np.savez(path, **arrays)
+
+# Packed prediction archive
+# The predictions of a sequence are stored as 2-bit codes (E=0, H=1, C=2, T=3), four predictors per byte and one row of
+# bytes per residue, so 15 predictors take 4 bytes per residue. The offset index (<archive>.index) has one JSON line per
+# sequence with its name, byte offset, number of residues and predictors, and the assignments other than E, H, C and T
+# (kept there as [residue, predictor, symbol], since they do not fit in 2 bits).
+archive_shifts = (0, 2, 4, 6)
+
+def archive_width(n_predictors):
+	# bytes per residue
+	return (n_predictors + 3) // 4
+
+def pack_predictions(ss_matrix):
+	# Packs an encoded (residues x predictors) matrix into (residues x archive_width) uint8 and the list of other symbols
+	n_residues, n_predictors = ss_matrix.shape
+	lookup = np.full(256, 255, dtype=np.uint8)
+	for code, ss in enumerate('EHCT'):
+		lookup[ord(ss)] = code
+	codes = lookup[ss_matrix]
+
+	others = [[int(row), int(column), chr(ss_matrix[row, column])] for row, column in np.argwhere(codes == 255)]
+	codes[codes == 255] = 0
+
+	width = archive_width(n_predictors)
+	padded = np.zeros((n_residues, width * 4), dtype=np.uint8)
+	padded[:, :n_predictors] = codes
+	packed = np.bitwise_or.reduce(padded.reshape(n_residues, width, 4) << np.array(archive_shifts, dtype=np.uint8), axis=2)
+	return packed, others
+
+def unpack_predictions(packed, n_predictors, others=()):
+	# Inverse of pack_predictions: returns the encoded (residues x predictors) uint8 matrix (ASCII codes)
+	codes = (packed[:, :, None] >> np.array(archive_shifts, dtype=np.uint8)) & 3
+	ss_matrix = np.frombuffer(b'EHCT', dtype=np.uint8)[codes.reshape(packed.shape[0], packed.shape[1] * 4)[:, :n_predictors]]
+	for row, column, ss in others:
+		ss_matrix[row, column] = ord(ss)
+	return ss_matrix
+
+class PredictionArchive:
+	# Archive file that the packed predictions of each sequence are appended to. Every sequence adds one line to the
+	# offset index, flushed right away, so a batch that stops early keeps every finished sequence.
+
+	def __init__(self, path):
+		self.path = path
+		self.data = open(path, 'wb')
+		self.index = open(path + '.index', 'w')
+		self.sequences = 0
+
+	def append(self, name, predictors, ss_matrix):
+		packed, others = pack_predictions(ss_matrix)
+		entry = {'name': str(name), 'offset': self.data.tell(), 'residues': int(ss_matrix.shape[0]), 'predictors': list(predictors), 'other': others}
+		self.data.write(packed.tobytes())
+		self.data.flush()
+		self.index.write(json.dumps(entry) + '\n')
+		self.index.flush()
+		self.sequences += 1
+
+	def close(self):
+		self.data.close()
+		self.index.close()
+
+class ArchiveReader:
+	# Memory-maps an archive for lookups by sequence name. packed(name) is a zero-copy view of the sequence's packed
+	# rows; matrix(name) and predictions(name) unpack it. Views must be released before close().
+
+	def __init__(self, path):
+		self.path = path
+		self.entries = dict()
+		with open(path + '.index') as index:
+			for line in index:
+				entry = json.loads(line)
+				self.entries[entry['name']] = entry
+
+		self.file = open(path, 'rb')
+		if os.fstat(self.file.fileno()).st_size > 0:
+			self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+			self.buffer = np.frombuffer(self.mmap, dtype=np.uint8)
+		else:
+			# an empty file cannot be mapped
+			self.mmap = None
+			self.buffer = np.zeros(0, dtype=np.uint8)
+
+	def names(self):
+		return list(self.entries.keys())
+
+	def packed(self, name):
+		entry = self.entries[name]
+		width = archive_width(len(entry['predictors']))
+		return self.buffer[entry['offset']:entry['offset'] + entry['residues'] * width].reshape(entry['residues'], width)
+
+	def matrix(self, name):
+		# Returns (predictors, encoded (residues x predictors) uint8 matrix)
+		entry = self.entries[name]
+		return entry['predictors'], unpack_predictions(self.packed(name), len(entry['predictors']), entry['other'])
+
+	def predictions(self, name):
+		# Returns {predictor: per-residue assignments}, the form process_data takes
+		predictors, ss_matrix = self.matrix(name)
+		return {predictor: list(ss_matrix[:, j].tobytes().decode('ascii')) for j, predictor in enumerate(predictors)}
+
+	def close(self):
+		self.buffer = None
+		if self.mmap != None:
+			self.mmap.close()
+		self.file.close()
+
 def print_banner():
 	print('\n                                 ')
 	print('   R   U   N   N   I   N   G   :	  ')
@@ -926,6 +2737,678 @@ def print_banner():
 	print('                                   ')
 	print('   Code available at: "https://github.com/1000000000000000000000000000000/PyVkabat"\n\n')
 
+def read_fasta(fasta_path):
+	# Lazily yields (name, sequence) for each record so only one record is held in memory at a time
+	with open(fasta_path) as fasta:
+		yield from parse_fasta_lines(fasta)
+
+def parse_fasta_lines(lines):
+	# Yields (name, sequence) for each record of FASTA text given as an iterable of lines
+	name = None
+	sequence_parts = []
+	for line in lines:
+		line = line.strip()
+		if line == '':
+			continue
+		elif line.startswith('>'):
+			if name != None:
+				yield name, ''.join(sequence_parts)
+			header = line[1:].split()
+			name = header[0] if len(header) > 0 else f'record_{uuid.uuid4().hex[:8]}'
+			sequence_parts = []
+		else:
+			sequence_parts.append(line)
+
+	if name != None:
+		yield name, ''.join(sequence_parts)
+
+def chunk_windows(length, max_length, overlap):
+	# Returns (start, end) of equally sized windows of at most max_length residues that cover length residues,
+	# with neighbouring windows overlapping by at least overlap residues
+	if max_length == None or length <= max_length:
+		return [(0, length)]
+	if overlap >= max_length:
+		raise ValueError(f'chunk_overlap ({overlap}) must be smaller than the maximum sequence length ({max_length})')
+
+	n_windows = int(np.ceil((length - overlap) / (max_length - overlap)))
+	size = int(np.ceil((length + (n_windows - 1) * overlap) / n_windows))
+	step = int(np.ceil((length - size) / (n_windows - 1)))
+	return [(idx * step, min(idx * step + size, length)) for idx in range(n_windows - 1)] + [(length - size, length)]
+
+def stitch_windows(windows, window_outputs):
+	# Joins the per-window outputs ({predictor: assignments}) into full-length columns. Between two windows the
+	# cut is made in the middle of their overlap. A predictor is dropped if any window is missing it or has the
+	# wrong length; None is returned when no predictor is left.
+	cuts = [0] + [(windows[idx + 1][0] + windows[idx][1]) // 2 for idx in range(len(windows) - 1)] + [windows[-1][1]]
+
+	predictors = []
+	for output in window_outputs:
+		for predictor in (output or {}).keys():
+			if predictor not in predictors:
+				predictors.append(predictor)
+
+	stitched = dict()
+	for predictor in predictors:
+		column = []
+		for idx, ((start, end), output) in enumerate(zip(windows, window_outputs)):
+			assignments = (output or {}).get(predictor)
+			if assignments == None or len(assignments) != end - start:
+				print(f'{predictor}: window {start + 1}-{end} is missing or has the wrong length, not used')
+				column = None
+				break
+			column.extend(assignments[cuts[idx] - start:cuts[idx + 1] - start])
+		if column != None:
+			stitched[predictor] = column
+
+	if len(stitched) == 0:
+		return None
+	return stitched
+
+async def run_chunked(runner, job, max_length, name=None):
+	# Runs runner on the whole sequence, or on overlapping windows of it (concurrently, under the usual host limits)
+	# when it is longer than max_length, and returns full-length columns. A window that fails counts as a failure of
+	# backend name in the health records; a window skipped by an open circuit breaker skips the whole runner.
+	start_time = time.time()
+	windows = chunk_windows(len(job.sequence), max_length, chunk_overlap)
+	if len(windows) == 1:
+		return await runner(job)
+
+	print(f'{job.name}: splitting {len(job.sequence)} residues into {len(windows)} windows for {runner.__name__}: {windows}')
+	window_outputs = await asyncio.gather(*[runner(job.window(start, end)) for start, end in windows], return_exceptions=True)
+	for output in window_outputs:
+		if isinstance(output, CircuitOpenError):
+			raise output
+	for (start, end), output in zip(windows, window_outputs):
+		if isinstance(output, Exception):
+			print(f'{job.name}: window {start + 1}-{end} failed with {type(output).__name__}: {output}')
+			if name != None:
+				health_record(name, False, time.time() - start_time)
+	return stitch_windows(windows, [None if isinstance(output, Exception) else output for output in window_outputs])
+
+async def run_job_async(job, on_update=None):
+	# Retrieves the predictions for one VkabatJob and writes its vkabat csv files.
+	# Every submission and poll runs on the current event loop, so several jobs can be awaited at once.
+	# on_update (optional) is called with the VkabatAccumulator every time a runner's output is added.
+	run_start_time = time.time()
+
+	runners = {name: backend_function(backend['runner']) for name, backend in backends.items() if backend['enabled']}
+
+	async def run_runner(name):
+		runner_start_time = time.time()
+		try:
+			return name, await run_chunked(runners[name], job, backends[name]['max_length'], name)
+		except CircuitOpenError as e:
+			print(f'{job.name}: {e}')
+			metrics.count('skipped', predictor=name)
+			return name, None
+		except asyncio.CancelledError:
+			# quorum or deadline reached: not an outcome of the server (a request that later hits request_timeout is
+			# recorded when it returns, see RequestScheduler.release_when_returned)
+			if get_health() != None:
+				get_health().release(name, job.id)
+			raise
+		except Exception as e:
+			# includes requests that hit request_timeout
+			print(f'{job.name}: {name} failed with {type(e).__name__}: {e}')
+			health_record(name, False, time.time() - runner_start_time)
+			return name, None
+
+	# Each runner's columns are added to the running count matrix as soon as it finishes
+	accumulator = VkabatAccumulator(len(job.sequence))
+	outputs = {name: None for name in runners.keys()}
+	# The slowest backends are started first, so their requests are queued ahead of the fast ones
+	start_order = sorted(runners.keys(), key=lambda name: backends[name]['latency'], reverse=True)
+	pending = {asyncio.ensure_future(run_runner(name)): name for name in start_order}
+	while len(pending) > 0:
+		if job.quorum != None and len(accumulator.predictors) >= job.quorum:
+			print(f'{job.name}: quorum reached ({len(accumulator.predictors)} predictions)')
+			break
+
+		timeout = None
+		if job.deadline != None:
+			timeout = run_start_time + job.deadline - time.time()
+			if timeout <= 0:
+				print(f'{job.name}: deadline of {job.deadline} seconds reached ({len(accumulator.predictors)} predictions)')
+				break
+
+		done, _ = await asyncio.wait(pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+		for finished in done:
+			pending.pop(finished)
+			name, output = finished.result()
+			print(f'{job.name}: {name} finished after {time.time() - run_start_time} seconds')
+			metrics.record('runner', name, time.time() - run_start_time, job.name)
+			if output == None:
+				continue
+
+			try:
+				accumulator.add(output)
+			except ValueError as e:
+				print(f'{name}: not used: {e}')
+				continue
+			outputs[name] = output
+
+			if on_update != None:
+				on_update(accumulator)
+			if incremental_output:
+				write_partial_vkabat(accumulator, job)
+
+	# Cancel the runners that are still outstanding; their polls are removed from the shared poller
+	for task, name in pending.items():
+		print(f'{job.name}: cancelling {name}')
+		metrics.count('cancelled', predictor=name)
+		task.cancel()
+	await asyncio.gather(*pending.keys(), return_exceptions=True)
+
+	if get_health() != None:
+		await asyncio.get_running_loop().run_in_executor(None, get_health().flush)
+
+	print(f'{job.name}: Total elapsed time to retrieve data: {time.time() - run_start_time} seconds ({len(accumulator.predictors)} predictions)\n')
+
+	metrics.record('retrieve', None, time.time() - run_start_time, job.name)
+
+	algo_list = [outputs[name] for name in runners.keys()]
+	successful_algo_list = []
+	for algo in algo_list:
+		if algo == None:
+			continue
+		else:
+			successful_algo_list.append(algo)
+
+	vkabat_out_dict = process_data(successful_algo_list, job)
+	metrics.record('sequence', None, time.time() - run_start_time, job.name)
+	if metrics_prometheus_file != None:
+		metrics.write_prometheus(metrics_prometheus_file)
+
+	return vkabat_out_dict
+
+def run_job(job, on_update=None):
+	return asyncio.run(run_job_async(job, on_update))
+
+async def run_batch_async(fasta_path):
+	# Runs the records of fasta_path as VkabatJobs, batch_concurrency at a time, through the shared request scheduler.
+	# Records are read only when a slot frees up, each writes its own output files, and one line is appended to the
+	# batch summary as soon as it finishes (so the summary is in order of completion).
+	batch_name = os.path.splitext(os.path.basename(fasta_path))[0]
+	summary_file_name_path = os.path.join(output_directory or os.getcwd(), f'{batch_name}_batch_summary.csv')
+	print(f'Writing batch summary csv file {summary_file_name_path}')
+
+	dataset = None
+	if 'parquet' in output_formats:
+		dataset_file_name_path = os.path.join(output_directory or os.getcwd(), f'{batch_name}_vkabat.parquet')
+		print(f'Writing batch parquet dataset {dataset_file_name_path}')
+		dataset = ColumnarDataset(dataset_file_name_path)
+
+	archive = None
+	if 'archive' in output_formats:
+		archive_file_name_path = os.path.join(output_directory or os.getcwd(), f'{batch_name}_vkabat.pvk')
+		print(f'Writing batch packed prediction archive {archive_file_name_path}')
+		archive = PredictionArchive(archive_file_name_path)
+
+	segment_file = None
+	if segment_threshold != None:
+		segment_file_name_path = os.path.join(output_directory or os.getcwd(), f'{batch_name}_vkabat_segments.csv')
+		print(f'Writing batch vkabat segments csv file {segment_file_name_path}')
+		segment_file = open(segment_file_name_path, 'w')
+		segment_file.write(segment_header)
+
+	async def run_record(job):
+		record_start_time = time.time()
+		try:
+			vkabat_out_dict = await run_job_async(job)
+			status = 'ok'
+			mean_vkabat = float(np.nanmean(vkabat_out_dict['vkabat']))
+			predictions = int(np.max(vkabat_out_dict['N']))
+		except Exception as e:
+			print(f'{job.name}: failed with {type(e).__name__}: {e}')
+			status = 'failed'
+			mean_vkabat = ''
+			predictions = 0
+		return f'{job.name},{len(job.sequence)},{status},{mean_vkabat},{time.time() - record_start_time},{predictions}\n'
+
+	with open(summary_file_name_path, 'w') as summary:
+		summary.write('name,length,status,mean_vkabat,elapsed_seconds,predictions\n')
+		summary.flush()
+
+		records = enumerate(read_fasta(fasta_path), start=1)
+		pending = set()
+		while True:
+			for record_number, (name, record_sequence) in records:
+				job = VkabatJob(record_sequence, name)
+				job.dataset = dataset
+				job.archive = archive
+				job.segment_file = segment_file
+				print(f'Batch record {record_number}: {job.name} (length {len(job.sequence)})')
+				pending.add(asyncio.ensure_future(run_record(job)))
+				if len(pending) >= batch_concurrency:
+					break
+
+			if len(pending) == 0:
+				break
+
+			done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+			for finished in done:
+				summary.write(finished.result())
+			summary.flush()
+
+	if dataset != None:
+		dataset.close()
+		print(f'Batch parquet dataset has {dataset.row_groups} sequences (row groups)')
+	if archive != None:
+		archive.close()
+		print(f'Batch packed prediction archive has {archive.sequences} sequences')
+	if segment_file != None:
+		segment_file.close()
+
+def run_batch(fasta_path):
+	return asyncio.run(run_batch_async(fasta_path))
+
+def expand_predictor_names(names):
+	# Replaces server names by the predictor columns they produce
+	expanded = []
+	groups = predictor_groups()
+	for name in names:
+		for predictor in groups.get(name, (name,)):
+			if predictor not in expanded:
+				expanded.append(predictor)
+	return expanded
+
+def select_predictors(available, keep=None, exclude=None):
+	# The stored predictors (in stored order) that are in keep (None keeps all) and not in exclude
+	selected = list(available)
+	if keep != None:
+		keep = expand_predictor_names(keep)
+		selected = [predictor for predictor in selected if predictor in keep]
+	if exclude != None:
+		exclude = expand_predictor_names(exclude)
+		selected = [predictor for predictor in selected if predictor not in exclude]
+	return selected
+
+stored_suffixes = ('_vkabat_dataframe.csv', '_vkabat.npz', '_vkabat.pvk')
+
+def stored_name(path):
+	# Sequence name of a <name>_vkabat_dataframe.csv, <name>_vkabat.npz or <name>_vkabat.pvk file
+	file_name = os.path.basename(path)
+	for suffix in stored_suffixes:
+		if file_name.endswith(suffix):
+			return file_name[:-len(suffix)]
+	return os.path.splitext(file_name)[0]
+
+def find_stored_predictions(paths):
+	# Yields (path, sequence name) for the stored predictions in the given files and directories: one for every csv or
+	# npz file and one for every sequence in an archive (.pvk). A sequence that is stored more than once is yielded
+	# once, preferring csv over npz over archive files.
+	files = []
+	for path in paths:
+		if os.path.isdir(path):
+			files.extend(os.path.join(path, file_name) for file_name in sorted(os.listdir(path)) if file_name.endswith(stored_suffixes))
+		else:
+			files.append(path)
+	files.sort(key=lambda path: [path.endswith(suffix) for suffix in stored_suffixes].index(True) if path.endswith(stored_suffixes) else 0)
+
+	seen = set()
+	for path in files:
+		if path.endswith('.pvk'):
+			with open(path + '.index') as index:
+				names = [json.loads(line)['name'] for line in index]
+		else:
+			names = [stored_name(path)]
+
+		for name in names:
+			if name not in seen:
+				seen.add(name)
+				yield path, name
+
+stored_archives = dict() # ArchiveReaders opened by this (worker) process, by path
+
+def read_stored_predictions(path, name=None):
+	# Returns (name, {predictor: per-residue assignments}) from a <name>_vkabat_dataframe.csv or <name>_vkabat.npz file,
+	# or for sequence name from an archive
+	if path.endswith('.pvk'):
+		if path not in stored_archives:
+			stored_archives[path] = ArchiveReader(path)
+		return name, stored_archives[path].predictions(name)
+
+	if path.endswith('.npz'):
+		with np.load(path) as stored:
+			ss_matrix = stored['ss']
+			predictors = stored['predictors'].tolist()
+		predictions = {predictor: list(ss_matrix[:, j].tobytes().decode('ascii')) for j, predictor in enumerate(predictors)}
+	else:
+		# only the predictor columns are read; the metrics columns are recomputed
+		metric_columns = set(count_columns + float_columns + smoothed_columns + ('consensus',))
+		df = pd.read_csv(path, index_col=0, dtype=str, keep_default_na=False, usecols=lambda column: column not in metric_columns)
+		predictions = {predictor: df[predictor].tolist() for predictor in df.columns}
+
+	return stored_name(path), predictions
+
+def recompute_worker_init(config):
+	# Worker processes may be started without the parent's globals (spawn), so the settings are passed along
+	globals().update(config)
+
+def recompute_file(path, name=None):
+	# Recomputes vkabat for one stored sequence and returns its summary line (runs in a worker process)
+	start_time = time.time()
+	length = ''
+	try:
+		name, predictions = read_stored_predictions(path, name)
+		selected = select_predictors(predictions.keys(), recompute_predictors, recompute_exclude)
+		if len(selected) == 0:
+			raise ValueError(f'none of the stored predictors ({", ".join(predictions.keys())}) were selected')
+		if os.path.realpath(os.path.dirname(path)) == os.path.realpath(output_directory):
+			raise ValueError(f'the outputs would overwrite the stored predictions in {output_directory} (choose another --dir)')
+
+		length = len(predictions[selected[0]])
+		# the stored files do not keep the sequence itself, only its length
+		job = VkabatJob('X' * length, name)
+		vkabat_out_dict = process_data([{predictor: predictions[predictor] for predictor in selected}], job)
+		status = 'ok'
+		mean_vkabat = float(np.nanmean(vkabat_out_dict['vkabat']))
+		n_predictions = len(selected)
+	except Exception as e:
+		print(f'{path} ({name}): failed with {type(e).__name__}: {e}')
+		status = 'failed'
+		mean_vkabat = ''
+		n_predictions = 0
+	return f'{name},{length},{status},{mean_vkabat},{time.time() - start_time},{n_predictions}\n'
+
+def run_recompute(paths):
+	# Recomputes every stored prediction file in paths on a process pool, without any network traffic, and appends one
+	# line per file to recompute_summary.csv in the output directory as it finishes
+	recompute_directory = output_directory or os.getcwd()
+	os.makedirs(recompute_directory, exist_ok=True)
+	summary_file_name_path = os.path.join(recompute_directory, 'recompute_summary.csv')
+	print(f'Writing recompute summary csv file {summary_file_name_path}')
+
+	config = {setting: globals()[setting] for setting in VkabatJob.settings + ('output_formats', 'recompute_predictors', 'recompute_exclude')}
+	config['output_directory'] = recompute_directory
+
+	counts = {'ok': 0, 'failed': 0}
+	with open(summary_file_name_path, 'w') as summary, concurrent.futures.ProcessPoolExecutor(max_workers=recompute_workers, initializer=recompute_worker_init, initargs=(config,)) as executor:
+		summary.write('name,length,status,mean_vkabat,elapsed_seconds,predictions\n')
+		futures = [executor.submit(recompute_file, path, name) for path, name in find_stored_predictions(paths)]
+		for finished in concurrent.futures.as_completed(futures):
+			line = finished.result()
+			counts[line.split(',')[-4]] += 1
+			summary.write(line)
+			summary.flush()
+
+	print(f'Recomputed {counts["ok"]} stored predictions ({counts["failed"]} failed)')
+	return counts
+
+class ServiceQueue:
+	# The service's jobs, kept in a JSON lines file with one line per change of a job (flushed to disk before the change
+	# is answered) and compacted to one line per job when it is loaded. Jobs that were queued or running when the
+	# service stopped are queued again on restart; the job journal lets them pick up remote jobs they had submitted.
+
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.jobs = dict()
+		if os.path.exists(path):
+			self.load()
+			self.compact()
+		self.queue_file = open(path, 'a')
+
+	def load(self):
+		with open(self.path) as queue_file:
+			for line in queue_file:
+				try:
+					record = json.loads(line)
+				except ValueError:
+					# last line cut short by a crash
+					continue
+				self.jobs[record['id']] = record
+
+	def compact(self):
+		temporary_path = self.path + '.tmp'
+		with open(temporary_path, 'w') as queue_file:
+			for record in self.jobs.values():
+				queue_file.write(json.dumps(record) + '\n')
+		os.replace(temporary_path, self.path)
+
+	def save(self, record):
+		# called with the lock held
+		self.queue_file.write(json.dumps(record) + '\n')
+		self.queue_file.flush()
+		os.fsync(self.queue_file.fileno())
+
+	def add(self, name, sequence):
+		# Returns (record, True) for a new job, or (record, False) for the job that already has this sequence (unless
+		# it failed), so the same work is never queued twice
+		with self.lock:
+			for record in self.jobs.values():
+				if record['sequence'] == sequence and record['status'] != 'failed':
+					return dict(record), False
+
+			record = {'id': uuid.uuid4().hex, 'name': str(name), 'sequence': sequence, 'status': 'queued', 'submitted': time.time(), 'started': None, 'finished': None, 'predictions': None, 'mean_vkabat': None, 'error': None}
+			self.jobs[record['id']] = record
+			self.save(record)
+			return dict(record), True
+
+	def update(self, job_id, **fields):
+		with self.lock:
+			record = self.jobs[job_id]
+			record.update(fields)
+			self.save(record)
+
+	def get(self, job_id):
+		with self.lock:
+			record = self.jobs.get(job_id)
+			return dict(record) if record != None else None
+
+	def list(self):
+		with self.lock:
+			return [dict(record) for record in self.jobs.values()]
+
+	def unfinished(self):
+		# ids of the queued and running jobs, oldest first
+		with self.lock:
+			records = [record for record in self.jobs.values() if record['status'] in ('queued', 'running')]
+		return [record['id'] for record in sorted(records, key=lambda record: record['submitted'])]
+
+class ServiceError(Exception):
+	# A request the service answers with an error status
+	def __init__(self, status, message):
+		super().__init__(message)
+		self.status = status
+
+def job_summary(record):
+	# A job record as returned by the API (without the sequence itself)
+	summary = {key: value for key, value in record.items() if key != 'sequence'}
+	summary['length'] = len(record['sequence'])
+	return summary
+
+def make_service_handler(service):
+	# Request handler class of the service API (made here since http.server is only imported when serving)
+
+	class ServiceHandler(http_server.BaseHTTPRequestHandler):
+		protocol_version = 'HTTP/1.1'
+
+		def log_message(self, format, *args):
+			print(f'Service: {self.address_string()} {format % args}')
+
+		def send(self, status, body, content_type='application/json'):
+			payload = (json.dumps(body, indent=1) if content_type == 'application/json' else body).encode()
+			self.send_response(status)
+			self.send_header('Content-Type', content_type)
+			self.send_header('Content-Length', str(len(payload)))
+			self.end_headers()
+			self.wfile.write(payload)
+
+		def handle_request(self, method):
+			try:
+				self.route(method, urlparse(self.path).path.rstrip('/').split('/')[1:])
+			except ServiceError as e:
+				# the body of a rejected submission may not have been read, so the connection cannot be reused
+				if method == 'POST':
+					self.close_connection = True
+				self.send(e.status, {'error': str(e)})
+
+		def route(self, method, parts):
+			if method == 'POST' and parts == ['jobs']:
+				length = self.headers.get('Content-Length')
+				if length == None:
+					raise ServiceError(411, 'Submissions need a Content-Length header.')
+				if not length.strip().isdigit():
+					raise ServiceError(400, f'Invalid Content-Length {length!r}.')
+				length = int(length)
+				if length > service_max_body:
+					raise ServiceError(413, f'Submissions are limited to {service_max_body} bytes.')
+				body = self.rfile.read(length).decode('utf-8', errors='replace')
+				submitted = service.submit(parse_submission(body, self.headers.get('Content-Type', '')))
+				self.send(202, {'jobs': submitted})
+			elif method == 'GET' and parts == ['jobs']:
+				self.send(200, {'jobs': [job_summary(record) for record in service.queue.list()]})
+			elif method == 'GET' and parts == ['status']:
+				self.send(200, service.status())
+			elif method == 'GET' and len(parts) == 2 and parts[0] == 'jobs':
+				self.send(200, job_summary(service.job(parts[1])))
+			elif method == 'GET' and len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'results':
+				self.send(200, service.results(parts[1]), 'text/csv')
+			else:
+				raise ServiceError(404, 'Not found. Use POST /jobs, GET /jobs, GET /jobs/<id>, GET /jobs/<id>/results or GET /status.')
+
+		def do_GET(self):
+			self.handle_request('GET')
+
+		def do_POST(self):
+			self.handle_request('POST')
+
+	return ServiceHandler
+
+sequence_pattern = re.compile(r'^[A-Za-z]+$')
+
+def parse_submission(body, content_type):
+	# Returns [(name, sequence)] from a JSON body ({"sequence": ..., "name": ...} or {"fasta": ...}) or from a plain
+	# text body holding FASTA or a bare sequence
+	if content_type.startswith('application/json'):
+		try:
+			submission = json.loads(body)
+		except ValueError:
+			raise ServiceError(400, 'The body is not valid JSON.')
+		if not isinstance(submission, dict):
+			raise ServiceError(400, 'Submit a JSON object with "sequence" (and optionally "name") or "fasta".')
+		if 'fasta' in submission:
+			records = list(parse_fasta_lines(str(submission['fasta']).splitlines()))
+		elif 'sequence' in submission:
+			records = [(submission.get('name', 'test'), str(submission['sequence']))]
+		else:
+			raise ServiceError(400, 'Submit a JSON object with "sequence" (and optionally "name") or "fasta".')
+	elif body.lstrip().startswith('>'):
+		records = list(parse_fasta_lines(body.splitlines()))
+	else:
+		records = [('test', ''.join(body.split()))]
+
+	if len(records) == 0:
+		raise ServiceError(400, 'No sequences were submitted.')
+	for name, sequence in records:
+		if sequence_pattern.match(sequence) == None:
+			raise ServiceError(400, f'{name}: a sequence must be 1 letter amino acid abbreviations only.')
+	return [(str(name).replace(os.sep, '_'), sequence.upper()) for name, sequence in records]
+
+class VkabatService:
+	# Runs the jobs of a ServiceQueue on one event loop, service_concurrency at a time, and answers the HTTP API from
+	# the server's threads. New jobs are handed to the event loop with call_soon_threadsafe.
+
+	def __init__(self, queue, jobs_directory):
+		self.queue = queue
+		self.jobs_directory = jobs_directory
+		self.loop = None
+		self.pending = None
+
+	def submit(self, records):
+		submitted = []
+		for name, sequence in records:
+			record, new = self.queue.add(name, sequence)
+			if new:
+				print(f'Service: queued {record["name"]} ({len(sequence)} residues) as job {record["id"]}')
+				self.loop.call_soon_threadsafe(self.pending.put_nowait, record['id'])
+			submitted.append({'id': record['id'], 'name': record['name'], 'status': record['status'], 'duplicate': not new})
+		return submitted
+
+	def job(self, job_id):
+		record = self.queue.get(job_id)
+		if record == None:
+			raise ServiceError(404, f'Unknown job {job_id}')
+		return record
+
+	def results(self, job_id):
+		record = self.job(job_id)
+		if record['status'] != 'finished':
+			raise ServiceError(409, f'Job {job_id} is {record["status"]}.')
+		dataframe_file_name_path = os.path.join(self.jobs_directory, job_id, record['name'] + '_vkabat_dataframe.csv')
+		if not os.path.exists(dataframe_file_name_path):
+			if 'csv' not in output_formats:
+				raise ServiceError(501, f'Results are only served as csv, but this service writes {", ".join(output_formats)}. The files of job {job_id} are in {os.path.join(self.jobs_directory, job_id)}.')
+			raise ServiceError(404, f'The results of job {job_id} are no longer available.')
+		with open(dataframe_file_name_path) as dataframe_file:
+			return dataframe_file.read()
+
+	def status(self):
+		counts = {'queued': 0, 'running': 0, 'finished': 0, 'failed': 0}
+		for record in self.queue.list():
+			counts[record['status']] += 1
+		status = {'jobs': counts, 'connections': session_stats()}
+		if get_cache() != None:
+			status['cache'] = get_cache().stats()
+		if get_health() != None:
+			status['health'] = get_health().report()
+		return status
+
+	async def update(self, job_id, **fields):
+		# The queue file is fsynced on every change, so the event loop hands the write to its default executor
+		await self.loop.run_in_executor(None, functools.partial(self.queue.update, job_id, **fields))
+
+	async def run(self, job_id):
+		record = self.queue.get(job_id)
+		await self.update(job_id, status='running', started=time.time())
+		job_directory = os.path.join(self.jobs_directory, job_id)
+		os.makedirs(job_directory, exist_ok=True)
+		job = VkabatJob(record['sequence'], record['name'], output_directory=job_directory)
+		job.id = job_id
+		try:
+			vkabat_out_dict = await run_job_async(job)
+			await self.update(job_id, status='finished', finished=time.time(), predictions=int(np.max(vkabat_out_dict['N'])), mean_vkabat=float(np.nanmean(vkabat_out_dict['vkabat'])))
+			print(f'Service: job {job_id} ({record["name"]}) finished')
+		except Exception as e:
+			print(f'Service: job {job_id} ({record["name"]}) failed with {type(e).__name__}: {e}')
+			await self.update(job_id, status='failed', finished=time.time(), error=f'{type(e).__name__}: {e}')
+
+	async def worker(self):
+		while True:
+			await self.run(await self.pending.get())
+
+	async def serve(self, host, port):
+		self.loop = asyncio.get_running_loop()
+		self.pending = asyncio.Queue()
+		for job_id in self.queue.unfinished():
+			print(f'Service: queued job {job_id} again')
+			self.pending.put_nowait(job_id)
+
+		# the default listen backlog (5) resets connections when many clients submit at the same moment
+		server = http_server.ThreadingHTTPServer((host, port), make_service_handler(self), bind_and_activate=False)
+		server.request_queue_size = 128
+		server.daemon_threads = True
+		server.server_bind()
+		server.server_activate()
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		print(f'Service listening on http://{host}:{server.server_port}')
+
+		try:
+			await asyncio.gather(*[self.worker() for _ in range(service_concurrency)])
+		finally:
+			server.shutdown()
+			server.server_close()
+
+def run_service():
+	service_directory = output_directory or os.getcwd()
+	queue = ServiceQueue(os.path.join(service_directory, service_queue_file))
+	service = VkabatService(queue, os.path.join(service_directory, 'jobs'))
+	try:
+		asyncio.run(service.serve(service_host, service_port))
+	except KeyboardInterrupt:
+		print('Service stopped; unfinished jobs are queued again on the next start.')
+
 def main():
 
 	# start clock
@@ -935,34 +3418,39 @@ def main():
 	print_banner()
 
 	# argparse code
-	parse_arguments()
+	args = parse_arguments()
 
 	# supress irrelevant warnings in bs4
 	warnings.filterwarnings("ignore", category=UserWarning, module='bs4')
 
-	with concurrent.futures.ThreadPoolExecutor() as executor:
-		prabi_future = executor.submit(runPrabi)
-		jpred_future = executor.submit(run_alt_JPred)
-		yaspin_future = executor.submit(runYaspin)
-		sympred_future = executor.submit(runSympred5)
+	if serve:
+		run_service()
+	elif recompute_paths != None:
+		run_recompute(recompute_paths)
+	elif fasta_file != None:
+		run_batch(fasta_file)
+	else:
+		run_job(VkabatJob(args.sequence, args.name))
 
-		prabi_output = prabi_future.result()
-		jpred_output = jpred_future.result()
-		yaspin_output = yaspin_future.result()
-		sympred_output = sympred_future.result()
+	print('Metrics:')
+	print(metrics.summary())
 
-	print(f'Total elapsed time to retrieve data: {time.time() - prog_start_time} seconds\n')
+	connection_stats = session_stats()
+	print(f'HTTP connections: {connection_stats["requests"]} requests over {connection_stats["connections"]} connections ({connection_stats["reused"]} reused)')
 
-	algo_list = [prabi_output, yaspin_output, jpred_output, sympred_output]
-	successful_algo_list = []
-	failed_algo_list = []
-	for algo in algo_list:
-		if algo == None:
-			continue
-		else:
-			successful_algo_list.append(algo)
+	if get_cache() != None:
+		cache_stats = get_cache().stats()
+		print(f'Prediction cache: {cache_stats["hits"]} hits, {cache_stats["misses"]} misses, {cache_stats["entries"]} entries')
+
+	if get_health() != None:
+		get_health().flush()
+		print('Server health:')
+		print(get_health().summary())
 
-	process_data(successful_algo_list)
+	if parse_executor != None:
+		parse_executor.shutdown()
+	if local_executor != None:
+		local_executor.shutdown()
 
 	print(f'Total running time: {time.time() - prog_start_time} seconds.')
 	print('Done.')
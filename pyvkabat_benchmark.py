@@ -0,0 +1,506 @@
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+import tempfile
+import contextlib
+import multiprocessing
+import subprocess
+import statistics
+
+# Benchmarks for PyVkabat
+# $ python pyvkabat_benchmark.py parsers
+# $ python pyvkabat_benchmark.py parsers --pages <directory of recorded result pages>
+# $ python pyvkabat_benchmark.py end_to_end --sizes 1 100 1000
+# $ python pyvkabat_benchmark.py startup
+# $ python pyvkabat_benchmark.py archive --sequences 20000
+
+import PyVkabat
+from pyvkabat_mock_server import MockServer, start_mock_server, services, random_sequence, make_prabi_page, make_jpred_page, make_sympred_result, make_yaspin_result
+
+################################ Recorded / synthetic pages ################################
+
+def load_pages(directory):
+	# Recorded pages: PRABI pages contain "prabi" in their file name, JPred pages end with ".simple.html",
+	# Sympred results end with ".hpred" and Yaspin results with ".out"
+	pages = {'PRABI': [], 'JPred': [], 'Sympred': [], 'YASPIN': []}
+	for file_name in sorted(os.listdir(directory)):
+		with open(os.path.join(directory, file_name), encoding='utf-8', errors='replace') as page_file:
+			if file_name.endswith('.simple.html'):
+				pages['JPred'].append(page_file.read())
+			elif file_name.endswith('.hpred'):
+				pages['Sympred'].append(page_file.read())
+			elif file_name.endswith('.out'):
+				pages['YASPIN'].append(page_file.read())
+			elif 'prabi' in file_name.lower():
+				pages['PRABI'].append(page_file.read())
+	return pages
+
+def synthetic_pages(lengths):
+	pages = {'PRABI': [], 'JPred': [], 'Sympred': [], 'YASPIN': []}
+	for length in lengths:
+		sequence = random_sequence(length, seed=length)
+		pages['PRABI'].append(make_prabi_page(sequence, seed=length))
+		pages['JPred'].append(make_jpred_page(sequence, seed=length))
+		pages['Sympred'].append(make_sympred_result(sequence, seed=length))
+		pages['YASPIN'].append(make_yaspin_result(sequence, seed=length))
+	return pages
+
+################################ Parsers ################################
+
+def legacy_parse_prabi_page(page):
+	# PRABI parsing as done before the targeted parsers (BeautifulSoup over the whole page)
+	from bs4 import BeautifulSoup
+	soup = BeautifulSoup(page, features='html.parser')
+
+	output_list = []
+	for x in soup.find('code').findChildren('font'):
+		output_list.append(x.text)
+
+	modified_output_list = []
+	for letter in output_list:
+		letter = letter.upper()
+		if letter == 'T':
+			modified_output_list.append(letter.replace('T', 'C'))
+		else:
+			modified_output_list.append(letter)
+	return modified_output_list
+
+def legacy_parse_jpred_page(page):
+	# JPred parsing as done before the targeted parsers (BeautifulSoup and string concatenation)
+	from bs4 import BeautifulSoup
+	jpred_soup = BeautifulSoup(page, 'html.parser')
+
+	jpred_file_string = ''
+	for x in jpred_soup.find('code'):
+		jpred_file_string = jpred_file_string + x.text
+
+	string_list = jpred_file_string.split('\n')
+
+	out = ''
+	for i, string in enumerate(string_list):
+		if (i != 0) and (i % 2 != 0):
+			out = out + string
+
+	out_list = []
+	for letter in out:
+		if letter == '-':
+			out_list.append(letter.replace('-', 'C'))
+		else:
+			out_list.append(letter)
+	return out_list
+
+def legacy_parse_sympred_page(page):
+	# Sympred parsing as done before the streaming parsers (six line lists, slicing and character loops)
+	text_lines = page.split('\n')
+	text_lines_no_comments = []
+	for line in text_lines:
+		if "#" in line:
+			continue
+		elif line == '':
+			continue
+		else:
+			text_lines_no_comments.append(line)
+
+	AA_lines = []
+	PHD_lines = []
+	PROF_lines = []
+	SSPRO_lines = []
+	JNET_lines = []
+	PSIPRED_lines = []
+	#SYMPRED_lines = []
+
+	for line in text_lines_no_comments:
+		if 'AA    ' in line:
+			AA_lines.append(line)
+		elif 'PHD    ' in line:
+			PHD_lines.append(line)
+		elif 'PROF    ' in line:
+			PROF_lines.append(line)
+		elif 'SSPRO    ' in line:
+			SSPRO_lines.append(line)
+		elif 'JNET    ' in line:
+			JNET_lines.append(line)
+		elif 'PSIPRED    ' in line:
+			PSIPRED_lines.append(line)
+		#elif 'SYMPRED    ' in line:
+			#SYMPRED_lines.append(line)
+		else:
+			pass
+
+	space_count = 0
+	for letter in AA_lines[0]:
+		if letter == ' ':
+			space_count += 1
+	space_count += 2
+
+	aa = ''
+	for line in AA_lines:
+		aa += line.replace(line, line[space_count:])
+
+	phd = ''
+	for line in PHD_lines:
+		phd += line.replace(line, line[space_count:])
+
+	prof = ''
+	for line in PROF_lines:
+		prof += line.replace(line, line[space_count:])
+
+	sspro = ''
+	for line in SSPRO_lines:
+		sspro += line.replace(line, line[space_count:])
+
+	jnet = ''
+	for line in JNET_lines:
+		jnet += line.replace(line, line[space_count:])
+
+	psipred = ''
+	for line in PSIPRED_lines:
+		psipred += line.replace(line, line[space_count:])
+
+	#sympred = ''
+	#for line in SYMPRED_lines:
+		#sympred += line.replace(line, line[space_count:])
+
+	def replace_space_with_c(letter):
+		if letter == ' ':
+			out = letter.replace(letter, "C")
+		else:
+			out = letter
+
+		return(out)
+
+	aa_list = []
+	for letter in aa:
+		aa_list.append(letter)
+	aa_dict = {'AA':aa_list}
+
+	phd_list = []
+	for letter in phd:
+		phd_list.append(replace_space_with_c(letter))
+	phd_dict = {'PHD':phd_list}
+
+	prof_list = []
+	for letter in prof:
+		prof_list.append(replace_space_with_c(letter))
+	prof_dict = {'PROF':prof_list}
+
+	sspro_list = []
+	for letter in sspro:
+		sspro_list.append(replace_space_with_c(letter))
+	sspro_dict = {'SSPRO':sspro_list}
+
+	jnet_list = []
+	for letter in jnet:
+		jnet_list.append(replace_space_with_c(letter))
+	jnet_dict = {'JNET':jnet_list}
+
+	psipred_list = []
+	for letter in psipred:
+		psipred_list.append(replace_space_with_c(letter))
+	psipred_dict = {'PSIPRED':psipred_list}
+
+	# ~ sympred_list = []
+	# ~ for letter in sympred:
+		# ~ sympred_list.append(replace_space_with_c(letter))
+	# ~ sympred_dict = {'SYMPRED':sympred_list}
+
+
+	output_data = dict()
+	for dictionary in [phd_dict, prof_dict, sspro_dict, jnet_dict, psipred_dict]:
+		output_data.update(dictionary)
+	return output_data
+
+def legacy_parse_yaspin_page(page):
+	# Yaspin parsing as done before the streaming parsers (string += and a character loop)
+	text_lines = page.split('\n')
+	yaspin_string = ''
+	for line in text_lines:
+		if '*' in line:
+			continue
+		elif 'Pred: ' in line:
+			yaspin_string += line.split('Pred: ')[1].split('\n')[0]
+		else:
+			continue
+
+	yaspin_out = []
+	for letter in yaspin_string:
+		if letter == '-':
+			yaspin_out.append(letter.replace('-', 'C'))
+		else:
+			yaspin_out.append(letter)
+
+	yaspin = {'YASPIN': yaspin_out}
+	return yaspin
+
+def time_parser(parser, pages, repeat):
+	# Returns the best total time (seconds) of parsing every page, and the parsed outputs
+	best = float('inf')
+	for _ in range(repeat):
+		start = time.perf_counter()
+		outputs = [parser(page) for page in pages]
+		best = min(best, time.perf_counter() - start)
+	return best, outputs
+
+def benchmark_parsers(args):
+	warnings.filterwarnings('ignore', category=UserWarning, module='bs4')
+	warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+	if args.pages != None:
+		pages = load_pages(args.pages)
+	else:
+		pages = synthetic_pages(args.lengths)
+
+	parsers = {
+				'PRABI': (legacy_parse_prabi_page, PyVkabat.parse_prabi_page),
+				'JPred': (legacy_parse_jpred_page, PyVkabat.parse_jpred_page),
+				'Sympred': (legacy_parse_sympred_page, PyVkabat.parse_sympred_page),
+				'YASPIN': (legacy_parse_yaspin_page, PyVkabat.parse_yaspin_page)
+				}
+
+	print(f'{"parser":<10}{"pages":>8}{"legacy (ms)":>14}{"fast (ms)":>12}{"speedup":>10}')
+	for name, (legacy_parser, fast_parser) in parsers.items():
+		if len(pages[name]) == 0:
+			continue
+
+		legacy_time, legacy_outputs = time_parser(legacy_parser, pages[name], args.repeat)
+		fast_time, fast_outputs = time_parser(fast_parser, pages[name], args.repeat)
+		if legacy_outputs != fast_outputs:
+			print(f'{name}: fast parser output differs from the legacy parser!')
+
+		print(f'{name:<10}{len(pages[name]):>8}{legacy_time * 1000:>14.2f}{fast_time * 1000:>12.2f}{legacy_time / fast_time:>9.1f}x')
+
+################################ End to end ################################
+
+def write_fasta(path, n_sequences, length):
+	with open(path, 'w') as fasta:
+		for i in range(n_sequences):
+			fasta.write(f'>benchmark_{i}\n{random_sequence(length, seed=i)}\n')
+
+def peak_memory_mb():
+	import resource
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+	return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+def run_batch_process(fasta_path, output_directory, server, poll_delay, cli_options, results):
+	# Runs one PyVkabat batch in a fresh process, so the peak memory belongs to this run only
+	PyVkabat.poll_initial_delay = poll_delay
+	PyVkabat.poll_max_delay = max(poll_delay, 0.5)
+	sys.argv = ['PyVkabat.py', '--fasta', fasta_path, '--dir', output_directory, '--server', server, '--no_cache'] + cli_options
+
+	start = time.perf_counter()
+	with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+		PyVkabat.main()
+	results.put({'wall_seconds': time.perf_counter() - start, 'peak_memory_mb': peak_memory_mb()})
+
+def benchmark_end_to_end(args):
+	mock = MockServer(
+						response_delay={service: args.delay for service in services},
+						job_time={service: args.job_time for service in services},
+						error_rate={service: args.error_rate for service in services})
+	server, server_url = start_mock_server(mock)
+
+	cli_options = []
+	if not args.respect_limits:
+		cli_options += ['--requests_per_second', '1000', '--max_concurrent', '16']
+
+	context = multiprocessing.get_context('spawn')
+	rows = []
+	print(f'{"sequences":>10}{"wall (s)":>10}{"s/seq":>8}{"requests":>10}{"req/seq":>9}{"failed":>8}{"peak MB":>9}  statuses')
+	for n_sequences in args.sizes:
+		with tempfile.TemporaryDirectory() as directory:
+			fasta_path = os.path.join(directory, 'benchmark.fasta')
+			write_fasta(fasta_path, n_sequences, args.length)
+			mock.reset_stats()
+
+			results = context.Queue()
+			process = context.Process(target=run_batch_process, args=(fasta_path, directory, server_url, args.poll_delay, cli_options, results))
+			process.start()
+			result = results.get()
+			process.join()
+
+			with open(os.path.join(directory, 'benchmark_batch_summary.csv')) as summary:
+				failed = sum(1 for line in summary if ',failed,' in line)
+
+		with mock.lock:
+			stats = json.loads(json.dumps(mock.stats))
+
+		row = {
+				'sequences': n_sequences,
+				'length': args.length,
+				'wall_seconds': result['wall_seconds'],
+				'requests': stats['requests'],
+				'failed': failed,
+				'peak_memory_mb': result['peak_memory_mb'],
+				'statuses': stats['by_status']}
+		rows.append(row)
+		print(f'{n_sequences:>10}{row["wall_seconds"]:>10.2f}{row["wall_seconds"] / n_sequences:>8.3f}{row["requests"]:>10}{row["requests"] / n_sequences:>9.1f}{failed:>8}{row["peak_memory_mb"]:>9.1f}  {row["statuses"]}')
+
+	server.shutdown()
+
+	if args.output != None:
+		with open(args.output, 'a') as output:
+			for row in rows:
+				output.write(json.dumps(row) + '\n')
+		print(f'Appended results to {args.output}')
+
+################################ Startup ################################
+
+startup_commands = {
+					'import PyVkabat': ['-c', 'import PyVkabat'],
+					'PyVkabat.py --help': [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PyVkabat.py'), '--help'],
+					'import numpy, pandas': ['-c', 'import numpy, pandas']}
+
+def time_command(arguments, repeat):
+	# Wall times (seconds) of running the python interpreter with arguments in a fresh process
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		subprocess.run([sys.executable] + arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+		times.append(time.perf_counter() - start)
+	return times
+
+def slowest_imports(n_modules):
+	# Cumulative import time (microseconds) of the modules imported by "import PyVkabat", from python -X importtime.
+	# importtime lists the imports of a module (indented) right before the module itself.
+	result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import PyVkabat'], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+	imports = []
+	for line in result.stderr.splitlines():
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		_, cumulative, name = line.split('|')
+		depth = (len(name) - len(name.lstrip()) - 1) // 2
+		if depth == 0 and name.strip() != 'PyVkabat':
+			# imported by the interpreter itself (site, encodings, ...)
+			imports = []
+		elif depth == 0:
+			break
+		elif depth == 1:
+			imports.append((int(cumulative), name.strip()))
+	return sorted(imports, reverse=True)[:n_modules]
+
+def benchmark_startup(args):
+	# "import numpy, pandas" is the cost the lazy imports avoid on paths that do not need them
+	print(f'{"command":<24}{"best (ms)":>11}{"median (ms)":>13}')
+	rows = []
+	for name, arguments in startup_commands.items():
+		times = time_command(arguments, args.repeat)
+		row = {'command': name, 'best_ms': min(times) * 1000, 'median_ms': statistics.median(times) * 1000}
+		rows.append(row)
+		print(f'{name:<24}{row["best_ms"]:>11.1f}{row["median_ms"]:>13.1f}')
+
+	if args.imports > 0:
+		print('\nSlowest imports of "import PyVkabat":')
+		for cumulative, name in slowest_imports(args.imports):
+			print(f'  {name:<24}{cumulative / 1000:>8.1f} ms')
+
+	if args.output != None:
+		with open(args.output, 'a') as output:
+			for row in rows:
+				output.write(json.dumps(row) + '\n')
+		print(f'Appended results to {args.output}')
+
+################################ Packed archive ################################
+
+def list_columns_bytes(predictions):
+	# Memory held by {predictor: list of one-character strings}: the list objects and their pointers (the
+	# one-character strings themselves are interned by CPython and shared)
+	return sum(sys.getsizeof(column) for column in predictions.values())
+
+def benchmark_archive(args):
+	import numpy as np
+
+	rng = np.random.default_rng(0)
+	symbols = np.frombuffer(b'EHCT', dtype=np.uint8)
+	predictors = list(PyVkabat.predictor_columns())
+	names = [f'benchmark_{i}' for i in range(args.sequences)]
+	lengths = rng.integers(args.length // 2, args.length * 3 // 2 + 1, size=args.sequences)
+
+	with tempfile.TemporaryDirectory() as directory:
+		archive_path = os.path.join(directory, 'benchmark_vkabat.pvk')
+		list_bytes = 0
+		pack_seconds = 0
+		archive = PyVkabat.PredictionArchive(archive_path)
+		for name, length in zip(names, lengths):
+			ss_matrix = symbols[rng.integers(0, 4, size=(length, len(predictors)))]
+			list_bytes += list_columns_bytes({predictor: list(ss_matrix[:, j].tobytes().decode('ascii')) for j, predictor in enumerate(predictors)})
+			start = time.perf_counter()
+			archive.append(name, predictors, ss_matrix)
+			pack_seconds += time.perf_counter() - start
+		archive.close()
+		archive_bytes = os.path.getsize(archive_path)
+		index_bytes = os.path.getsize(archive_path + '.index')
+
+		start = time.perf_counter()
+		reader = PyVkabat.ArchiveReader(archive_path)
+		open_seconds = time.perf_counter() - start
+
+		lookups = [names[i] for i in rng.integers(0, len(names), size=args.lookups)]
+		start = time.perf_counter()
+		for name in lookups:
+			reader.packed(name)
+		packed_seconds = time.perf_counter() - start
+		start = time.perf_counter()
+		for name in lookups:
+			reader.matrix(name)
+		matrix_seconds = time.perf_counter() - start
+		reader.close()
+
+	residues = int(lengths.sum())
+	row = {
+			'sequences': args.sequences, 'residues': residues, 'list_mb': list_bytes / 1e6, 'archive_mb': archive_bytes / 1e6,
+			'index_mb': index_bytes / 1e6, 'pack_seconds': pack_seconds, 'open_ms': open_seconds * 1000,
+			'packed_lookup_us': packed_seconds / args.lookups * 1e6, 'matrix_lookup_us': matrix_seconds / args.lookups * 1e6
+			}
+	print(f'{args.sequences} sequences, {residues} residues x {len(predictors)} predictors')
+	print(f'Python lists: {row["list_mb"]:.1f} MB, archive: {row["archive_mb"]:.1f} MB (+ {row["index_mb"]:.1f} MB index)')
+	print(f'Packing: {pack_seconds:.2f} s, opening: {row["open_ms"]:.1f} ms')
+	print(f'Lookup: packed (zero-copy) {row["packed_lookup_us"]:.2f} us, unpacked matrix {row["matrix_lookup_us"]:.2f} us')
+
+	if args.output != None:
+		with open(args.output, 'a') as output:
+			output.write(json.dumps(row) + '\n')
+		print(f'Appended results to {args.output}')
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmarks for PyVkabat.')
+	subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+	parsers_parser = subparsers.add_parser('parsers', help='Compare the result page parsers with the legacy BeautifulSoup parsing.')
+	parsers_parser.add_argument('--pages', metavar='<directory>', type=str, help='Directory of recorded result pages (PRABI pages have "prabi" in the file name, JPred pages end with ".simple.html", Sympred results with ".hpred" and Yaspin results with ".out"). Synthetic pages are used if omitted.')
+	parsers_parser.add_argument('--lengths', metavar='<length>', type=int, nargs='+', default=[100, 1000, 5000, 30000], help='Sequence lengths of the synthetic pages.')
+	parsers_parser.add_argument('--repeat', metavar='<times>', type=int, default=3, help='Number of timing repeats (the best is reported).')
+	parsers_parser.set_defaults(function=benchmark_parsers)
+
+	end_to_end_parser = subparsers.add_parser('end_to_end', help='Run batches against the offline mock server and report wall time, request counts and peak memory.')
+	end_to_end_parser.add_argument('--sizes', metavar='<sequences>', type=int, nargs='+', default=[1, 100, 1000], help='Number of sequences per batch.')
+	end_to_end_parser.add_argument('--length', metavar='<residues>', type=int, default=200, help='Length of each sequence.')
+	end_to_end_parser.add_argument('--delay', metavar='<seconds>', type=float, default=0.0, help='Mock server delay before every response.')
+	end_to_end_parser.add_argument('--job_time', metavar='<seconds>', type=float, default=0.0, help='Mock server time until a JPred/Sympred/Yaspin job is finished.')
+	end_to_end_parser.add_argument('--error_rate', metavar='<fraction>', type=float, default=0.0, help='Fraction of mock server responses that are errors.')
+	end_to_end_parser.add_argument('--poll_delay', metavar='<seconds>', type=float, default=0.05, help='Initial delay between result checks.')
+	end_to_end_parser.add_argument('--respect_limits', action='store_true', help='Keep the configured per-host limits instead of lifting them for the benchmark.')
+	end_to_end_parser.add_argument('--output', metavar='<file>', type=str, help='Append the results as JSON lines to this file (for tracking regressions).')
+	end_to_end_parser.set_defaults(function=benchmark_end_to_end)
+
+	startup_parser = subparsers.add_parser('startup', help='Time interpreter startup plus "import PyVkabat" and "PyVkabat.py --help" in fresh processes.')
+	startup_parser.add_argument('--repeat', metavar='<times>', type=int, default=10, help='Number of runs of each command.')
+	startup_parser.add_argument('--imports', metavar='<modules>', type=int, default=10, help='Number of slowest imports to list (0 to skip).')
+	startup_parser.add_argument('--output', metavar='<file>', type=str, help='Append the results as JSON lines to this file (for tracking regressions).')
+	startup_parser.set_defaults(function=benchmark_startup)
+
+	archive_parser = subparsers.add_parser('archive', help='Write a packed prediction archive of random sequences and time opening it and looking sequences up.')
+	archive_parser.add_argument('--sequences', metavar='<sequences>', type=int, default=20000, help='Number of sequences in the archive.')
+	archive_parser.add_argument('--length', metavar='<residues>', type=int, default=400, help='Mean length of each sequence.')
+	archive_parser.add_argument('--lookups', metavar='<lookups>', type=int, default=100000, help='Number of random lookups timed.')
+	archive_parser.add_argument('--output', metavar='<file>', type=str, help='Append the results as JSON lines to this file (for tracking regressions).')
+	archive_parser.set_defaults(function=benchmark_archive)
+
+	args = parser.parse_args()
+	args.function(args)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import http.server
+import zlib
+from urllib.parse import urlparse, parse_qs
+
+# Offline stand-in for the web servers used by PyVkabat. It answers the PRABI secpred_*.pl forms, the JPred
+# form and .simple.html results, Sympred (redirect to a 202 job page, then result.hpred) and Yaspin
+# (results.out) with synthetic predictions for the submitted sequence, or with recorded responses.
+#
+# $ python pyvkabat_mock_server.py --port 8000 --job_time 10
+# $ python PyVkabat.py <sequence> --server http://127.0.0.1:8000
+#
+# PyVkabat's --server option sends every request to <server>/<original host><original path>.
+
+services = ('prabi', 'jpred', 'sympred', 'yaspin')
+
+################################ Synthetic responses ################################
+
+amino_acids = 'ACDEFGHIKLMNPQRSTVWY'
+
+def random_sequence(length, seed=0):
+	rng = random.Random(seed)
+	return ''.join(rng.choice(amino_acids) for _ in range(length))
+
+def random_assignments(length, alphabet, seed=0):
+	rng = random.Random(seed)
+	return ''.join(rng.choice(alphabet) for _ in range(length))
+
+def make_prabi_page(sequence, seed=0):
+	# Mimics a PRABI secpred_*.pl result page: the prediction is a <code> block with one <font> per residue
+	colors = {'h': 'blue', 'e': 'red', 'c': 'orange', 't': 'green'}
+	assignments = random_assignments(len(sequence), 'hect', seed)
+	lines = []
+	for start in range(0, len(sequence), 100):
+		lines.append(sequence[start:start + 100])
+		lines.append(''.join(f'<FONT COLOR="{colors[letter]}">{letter}</FONT>' for letter in assignments[start:start + 100]))
+	return f'<HTML><HEAD><TITLE>NPSA</TITLE></HEAD><BODY><P>Prediction result</P><CODE>{"<BR>".join(lines)}</CODE><P>Sequence length : {len(sequence)}</P></BODY></HTML>'
+
+def make_jpred_submission_page(job_id):
+	return f'<html><body><div id="content"><p>Your job has been submitted.</p><a href="/cgi-bin/chklog?{job_id}">http://www.compbio.dundee.ac.uk/jpred4/cgi-bin/chklog?{job_id}</a></div></body></html>'
+
+def make_jpred_page(sequence, seed=0):
+	# Mimics a JPred .simple.html page: a <code> block alternating sequence and prediction lines
+	assignments = random_assignments(len(sequence), 'HE-', seed)
+	lines = []
+	for start in range(0, len(sequence), 100):
+		lines.append(sequence[start:start + 100])
+		lines.append(assignments[start:start + 100])
+	return '<html><head><title>JPred</title></head><body><code>' + '\n'.join(lines) + '\n</code></body></html>'
+
+def make_sympred_result(sequence, seed=0):
+	# Mimics a Sympred result.hpred file: blocks of AA/PHD/PROF/SSPRO/JNET/PSIPRED/SYMPRED tracks (coil is a space)
+	tracks = ['PHD', 'PROF', 'SSPRO', 'JNET', 'PSIPRED', 'SYMPRED']
+	predictions = {track: random_assignments(len(sequence), 'HE ', seed + idx) for idx, track in enumerate(tracks)}
+	lines = ['# SymPred consensus prediction', '# Mock server output', '']
+	for start in range(0, len(sequence), 60):
+		lines.append(f'{"AA":<12}{sequence[start:start + 60]}')
+		for track in tracks:
+			lines.append(f'{track:<12}{predictions[track][start:start + 60]}')
+		lines.append('')
+	return '\n'.join(lines) + '\n'
+
+def make_yaspin_result(sequence, seed=0):
+	# Mimics a Yaspin results.out file: "Pred: " lines with H, E and - (coil)
+	assignments = random_assignments(len(sequence), 'HE-', seed)
+	lines = ['*' * 60, '* YASPIN prediction (mock server)', '*' * 60, '']
+	for start in range(0, len(sequence), 60):
+		lines.append(f' AA:   {sequence[start:start + 60]}')
+		lines.append(f' Pred: {assignments[start:start + 60]}')
+		lines.append(f' Conf: {"9" * len(assignments[start:start + 60])}')
+		lines.append('')
+	return '\n'.join(lines) + '\n'
+
+################################ Server ################################
+
+def form_value(body, content_type, name):
+	# Extracts one field from a urlencoded or multipart form body
+	if content_type.startswith('multipart/form-data'):
+		match = re.search(r'name="' + re.escape(name) + r'"\r\n(?:[^\r\n]*\r\n)*?\r\n(.*?)\r\n--', body, re.DOTALL)
+		return match.group(1) if match != None else ''
+	return parse_qs(body).get(name, [''])[0]
+
+def clean_sequence(sequence):
+	# Drops a FASTA defline and whitespace
+	lines = [line.strip() for line in sequence.splitlines() if not line.startswith('>')]
+	return ''.join(lines)
+
+class MockServer:
+	# Job state, configuration and request statistics shared by all handler threads.
+	# response_delay, job_time and error_rate are per service (prabi, jpred, sympred, yaspin).
+
+	def __init__(self, response_delay=None, job_time=None, error_rate=None, error_status=500, recordings=None, seed=0):
+		self.response_delay = {service: 0.0 for service in services}
+		self.job_time = {service: 0.0 for service in services}
+		self.error_rate = {service: 0.0 for service in services}
+		self.response_delay.update(response_delay or {})
+		self.job_time.update(job_time or {})
+		self.error_rate.update(error_rate or {})
+		self.error_status = error_status
+		self.recordings = recordings
+		self.random = random.Random(seed)
+		self.jobs = dict()
+		self.stats = {'requests': 0, 'by_service': {service: 0 for service in services}, 'by_status': dict(), 'bytes_sent': 0}
+		self.lock = threading.Lock()
+
+	def recorded(self, file_name):
+		# Returns a recorded response body, or None when there are no recordings for it
+		if self.recordings == None:
+			return None
+		path = os.path.join(self.recordings, file_name)
+		if not os.path.exists(path):
+			return None
+		with open(path, encoding='utf-8', errors='replace') as recording:
+			return recording.read()
+
+	def new_job(self, service, sequence):
+		job_id = f'{service[:2]}_{uuid.uuid4().hex[:12]}'
+		with self.lock:
+			self.jobs[job_id] = {'service': service, 'sequence': sequence, 'ready_at': time.time() + self.job_time[service]}
+		return job_id
+
+	def job(self, job_id):
+		with self.lock:
+			return self.jobs.get(job_id)
+
+	def inject_error(self, service):
+		with self.lock:
+			return self.random.random() < self.error_rate[service]
+
+	def count(self, service, status, n_bytes):
+		with self.lock:
+			self.stats['requests'] += 1
+			if service != None:
+				self.stats['by_service'][service] += 1
+			self.stats['by_status'][str(status)] = self.stats['by_status'].get(str(status), 0) + 1
+			self.stats['bytes_sent'] += n_bytes
+
+	def reset_stats(self):
+		with self.lock:
+			self.stats = {'requests': 0, 'by_service': {service: 0 for service in services}, 'by_status': dict(), 'bytes_sent': 0}
+
+def make_handler(mock):
+
+	class MockHandler(http.server.BaseHTTPRequestHandler):
+		protocol_version = 'HTTP/1.1'
+
+		def log_message(self, format, *args):
+			pass
+
+		def send(self, service, status, body='', headers=None):
+			payload = body.encode()
+			self.send_response(status)
+			for name, value in (headers or {}).items():
+				self.send_header(name, value)
+			self.send_header('Content-Type', 'text/html' if body.lstrip().startswith('<') else 'text/plain')
+			self.send_header('Content-Length', str(len(payload)))
+			self.end_headers()
+			self.wfile.write(payload)
+			mock.count(service, status, len(payload))
+
+		def service(self, path):
+			if '/cgi-bin/secpred_' in path:
+				return 'prabi'
+			elif 'jpred' in path:
+				return 'jpred'
+			elif 'sympred' in path or path.endswith('/result.hpred'):
+				return 'sympred'
+			elif 'yaspin' in path or path.endswith('/results.out'):
+				return 'yaspin'
+			return None
+
+		def handle_request(self, method):
+			path = urlparse(self.path).path
+			if path == '/__stats':
+				# send() counts the response under mock.lock, so the stats are copied first
+				with mock.lock:
+					stats = json.dumps(mock.stats)
+				self.send(None, 200, stats)
+				return
+
+			body = ''
+			if method == 'POST':
+				body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8', errors='replace')
+
+			service = self.service(path)
+			if service == None:
+				self.send(None, 404, 'Not found')
+				return
+
+			time.sleep(mock.response_delay[service])
+			if mock.inject_error(service):
+				self.send(service, mock.error_status, 'Injected error')
+				return
+
+			content_type = self.headers.get('Content-Type', '')
+			if service == 'prabi':
+				sequence = clean_sequence(form_value(body, content_type, 'notice'))
+				page = mock.recorded(os.path.basename(path).replace('.pl', '.html')) or make_prabi_page(sequence, seed=zlib.crc32(path.encode()) % 1000)
+				self.send(service, 200, page)
+
+			elif method == 'POST' and path.endswith('/jpred_form'):
+				job_id = mock.new_job('jpred', clean_sequence(form_value(body, content_type, 'seq')))
+				self.send(service, 200, make_jpred_submission_page(job_id))
+
+			elif method == 'POST':
+				# Sympred and Yaspin redirect to the job page, which answers 202 while the job is queued
+				job_id = mock.new_job(service, clean_sequence(form_value(body, content_type, 'seq')))
+				self.send(service, 303, '', {'Location': f'{path.rstrip("/")}/jobs/{job_id}/'})
+
+			elif re.search(r'/jobs/[^/]+/$', path):
+				self.send(service, 202, 'Your job is queued.')
+
+			else:
+				job = mock.job(path.strip('/').split('/')[-2])
+				if job == None:
+					self.send(service, 404, 'Not found')
+				elif time.time() < job['ready_at']:
+					self.send(service, 202 if service == 'sympred' else 404, 'Not ready', {'Retry-After': '1'} if service == 'sympred' else None)
+				elif service == 'jpred':
+					self.send(service, 200, mock.recorded('jpred.simple.html') or make_jpred_page(job['sequence']))
+				elif service == 'sympred':
+					self.send(service, 200, mock.recorded('sympred.hpred') or make_sympred_result(job['sequence']))
+				else:
+					self.send(service, 200, mock.recorded('yaspin.out') or make_yaspin_result(job['sequence']))
+
+		def do_GET(self):
+			self.handle_request('GET')
+
+		def do_POST(self):
+			self.handle_request('POST')
+
+	return MockHandler
+
+class MockHTTPServer(http.server.ThreadingHTTPServer):
+	# The default listen backlog (5) resets connections when many windows/jobs connect at the same moment
+	request_queue_size = 128
+
+def start_mock_server(mock, host='127.0.0.1', port=0):
+	# Serves mock in a background thread; returns (server, base URL)
+	server = MockHTTPServer((host, port), make_handler(mock))
+	server.daemon_threads = True
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	return server, f'http://{host}:{server.server_port}'
+
+def parse_service_values(values, default):
+	# "--delay 0.5" applies to every service, "--delay jpred=5" to one service
+	out = {service: default for service in services}
+	for value in values or []:
+		if '=' in value:
+			service, number = value.split('=', 1)
+			out[service] = float(number)
+		else:
+			out = {service: float(value) for service in services}
+	return out
+
+def main():
+	parser = argparse.ArgumentParser(description='Offline mock of the PRABI, JPred, Sympred and Yaspin web servers used by PyVkabat.')
+	parser.add_argument('--host', metavar='<host>', type=str, default='127.0.0.1', help='Enter the address to listen on.')
+	parser.add_argument('--port', metavar='<port>', type=int, default=8000, help='Enter the port to listen on.')
+	parser.add_argument('--delay', metavar='<[service=]seconds>', type=str, action='append', help='Delay before every response (all services, or one of prabi, jpred, sympred, yaspin).')
+	parser.add_argument('--job_time', metavar='<[service=]seconds>', type=str, action='append', help='Time until a submitted JPred/Sympred/Yaspin job is finished.')
+	parser.add_argument('--error_rate', metavar='<[service=]fraction>', type=str, action='append', help='Fraction of requests answered with --error_status.')
+	parser.add_argument('--error_status', metavar='<status>', type=int, default=500, help='Enter the HTTP status of injected errors.')
+	parser.add_argument('--recordings', metavar='<directory>', type=str, help='Directory of recorded responses (secpred_*.html, jpred.simple.html, sympred.hpred, yaspin.out) replayed instead of synthetic ones.')
+	args = parser.parse_args()
+
+	mock = MockServer(parse_service_values(args.delay, 0.0), parse_service_values(args.job_time, 0.0), parse_service_values(args.error_rate, 0.0), args.error_status, args.recordings)
+	server = MockHTTPServer((args.host, args.port), make_handler(mock))
+	print(f'Mock server listening on http://{args.host}:{server.server_port} (statistics at /__stats)')
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,40 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+import PyVkabat
+
+# The 2-bit packing of predictions and the memory-mapped archive must give back exactly what was stored,
+# including symbols other than E, H, C and T
+
+def random_predictions(n_residues, seed):
+	rng = random.Random(seed)
+	return {f'predictor_{idx}': [rng.choice('EHCTX' if idx == 5 else 'EHCT') for _ in range(n_residues)] for idx in range(15)}
+
+@pytest.mark.parametrize('n_residues, n_predictors', [(0, 15), (1, 1), (37, 4), (500, 15), (64, 17)])
+def test_pack_round_trip(n_residues, n_predictors):
+	rng = np.random.default_rng(n_residues)
+	ss_matrix = np.frombuffer(b'EHCT', dtype=np.uint8)[rng.integers(0, 4, size=(n_residues, n_predictors))].copy()
+	if n_residues > 0:
+		ss_matrix[rng.integers(0, n_residues, size=3), rng.integers(0, n_predictors, size=3)] = ord('X')
+
+	packed, others = PyVkabat.pack_predictions(ss_matrix)
+	assert packed.shape == (n_residues, PyVkabat.archive_width(n_predictors))
+	assert all(ss == 'X' for _, _, ss in others)
+	np.testing.assert_array_equal(PyVkabat.unpack_predictions(packed, n_predictors, others), ss_matrix)
+
+def test_archive_round_trip(tmp_path):
+	path = os.path.join(tmp_path, 'test_vkabat.pvk')
+	archive = PyVkabat.PredictionArchive(path)
+	sequences = {f'sequence_{idx}': random_predictions(length, seed=idx) for idx, length in enumerate((120, 33))}
+	for name, predictions in sequences.items():
+		archive.append(name, list(predictions.keys()), PyVkabat.encode_predictions(predictions))
+	archive.close()
+
+	reader = PyVkabat.ArchiveReader(path)
+	assert reader.names() == list(sequences.keys())
+	for name in reader.names():
+		assert reader.predictions(name) == sequences[name]
+	reader.close()
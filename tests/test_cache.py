@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import PyVkabat
+
+# The prediction cache: expiry after cache_ttl and least recently used eviction down to cache_evict_to
+
+class Clock:
+	def __init__(self):
+		self.now = 1000.0
+
+	def __call__(self):
+		return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+	clock = Clock()
+	monkeypatch.setattr(PyVkabat.time, 'time', clock)
+	return clock
+
+def prediction(idx):
+	return {'PHD': ['H', 'E', 'C'][idx % 3:] + ['C']}
+
+def test_round_trip_and_ttl(tmp_path, clock):
+	cache = PyVkabat.PredictionCache(os.path.join(tmp_path, 'cache.sqlite'), 100, 10)
+	cache.put('MKV', 'Sympred', {'a': 1}, prediction(0))
+	assert cache.get('MKV', 'Sympred', {'a': 1}) == prediction(0)
+	# another predictor or other parameters are other entries
+	assert cache.get('MKV', 'YASPIN', {'a': 1}) == None
+	assert cache.get('MKV', 'Sympred', {'a': 2}) == None
+
+	clock.now += 101
+	assert cache.get('MKV', 'Sympred', {'a': 1}) == None
+	assert cache.stats() == {'hits': 1, 'misses': 3, 'entries': 1}
+
+def test_lru_eviction(tmp_path, clock, monkeypatch):
+	monkeypatch.setattr(PyVkabat, 'cache_evict_to', 0.5)
+	path = os.path.join(tmp_path, 'cache.sqlite')
+	cache = PyVkabat.PredictionCache(path, 100, 10)
+	for idx in range(10):
+		clock.now += 1
+		cache.put(f'SEQ{idx}', 'JPred', {}, prediction(idx))
+	# replacing an entry does not grow the cache
+	cache.put('SEQ9', 'JPred', {}, prediction(9))
+	assert cache.stats()['entries'] == 10
+
+	# SEQ0 is used again, so SEQ1 to SEQ6 are the least recently used when the eleventh entry is added
+	clock.now += 1
+	assert cache.get('SEQ0', 'JPred', {}) == prediction(0)
+	clock.now += 1
+	cache.put('SEQ10', 'JPred', {}, prediction(10))
+	assert cache.stats()['entries'] == 5
+	kept = [idx for idx in range(11) if cache.get(f'SEQ{idx}', 'JPred', {}) != None]
+	assert kept == [0, 7, 8, 9, 10]
+
+	# expired entries go first
+	clock.now += 100
+	for idx in range(11, 17):
+		clock.now += 1
+		cache.put(f'SEQ{idx}', 'JPred', {}, prediction(idx))
+	assert cache.stats()['entries'] == 5
+	kept = [idx for idx in range(17) if cache.get(f'SEQ{idx}', 'JPred', {}) != None]
+	assert kept == [12, 13, 14, 15, 16]
+	assert PyVkabat.PredictionCache(path, 100, 10).stats()['entries'] == 5
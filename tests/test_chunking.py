@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+import PyVkabat
+
+# Long sequences are split into overlapping windows and the per-window predictions stitched back together
+
+def random_columns(n_residues, n_predictors, seed):
+	rng = random.Random(seed)
+	return {f'predictor_{idx}': [rng.choice('EHCT') for _ in range(n_residues)] for idx in range(n_predictors)}
+
+@pytest.mark.parametrize('length, max_length, overlap', [(50, 800, 100), (800, 800, 100), (801, 800, 100), (2500, 800, 100), (1000, 300, 0), (997, 120, 40)])
+def test_chunk_windows(length, max_length, overlap):
+	windows = PyVkabat.chunk_windows(length, max_length, overlap)
+	assert windows[0][0] == 0 and windows[-1][1] == length
+	for start, end in windows:
+		assert 0 < end - start <= max_length
+	for (_, end), (next_start, _) in zip(windows, windows[1:]):
+		assert end - next_start >= overlap
+
+@pytest.mark.parametrize('length, max_length, overlap', [(801, 800, 100), (2500, 800, 100), (997, 120, 40)])
+def test_stitch_windows_round_trip(length, max_length, overlap):
+	predictions = random_columns(length, 3, seed=2)
+	windows = PyVkabat.chunk_windows(length, max_length, overlap)
+	window_outputs = [{predictor: column[start:end] for predictor, column in predictions.items()} for start, end in windows]
+	assert PyVkabat.stitch_windows(windows, window_outputs) == predictions
+
+def test_stitch_windows_drops_incomplete_predictors():
+	predictions = random_columns(2500, 2, seed=3)
+	windows = PyVkabat.chunk_windows(2500, 800, 100)
+	window_outputs = [{predictor: column[start:end] for predictor, column in predictions.items()} for start, end in windows]
+	del window_outputs[1]['predictor_0']
+	assert PyVkabat.stitch_windows(windows, window_outputs) == {'predictor_1': predictions['predictor_1']}
+	assert PyVkabat.stitch_windows(windows, [None] * len(windows)) == None
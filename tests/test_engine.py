@@ -0,0 +1,75 @@
+import random
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+import PyVkabat
+
+# Checks of the vectorized vkabat engine and the running accumulator against the original per-residue computation
+
+def legacy_calc_vkabat(ss_assignment_list):
+	# The original per-residue computation of process_data, kept as the reference for the vectorized engine
+	N = len(ss_assignment_list)
+	k = len(np.unique(np.array(ss_assignment_list)))
+
+	E_COUNT = ss_assignment_list.count('E')
+	H_COUNT = ss_assignment_list.count('H')
+	C_COUNT = ss_assignment_list.count('C')
+	T_COUNT = ss_assignment_list.count('T')
+	counts_list = [E_COUNT, H_COUNT, C_COUNT, T_COUNT]
+	total_counts = sum(counts_list)
+	n1 = max(counts_list)
+
+	return {
+			'E_COUNT': E_COUNT,
+			'H_COUNT': H_COUNT,
+			'C_COUNT': C_COUNT,
+			'T_COUNT': T_COUNT,
+			'total_counts': total_counts,
+			'E_perc': round(Decimal(str(E_COUNT / total_counts * 100)), 2),
+			'H_perc': round(Decimal(str(H_COUNT / total_counts * 100)), 2),
+			'C_perc': round(Decimal(str(C_COUNT / total_counts * 100)), 2),
+			'T_perc': round(Decimal(str(T_COUNT / total_counts * 100)), 2),
+			'k': k,
+			'N': N,
+			'n1': n1,
+			'vkabat': k * N / n1}
+
+def random_predictions(n_residues, n_predictors=15, seed=0):
+	# Random assignments; two predictors also return symbols the engine does not count (X and ?)
+	rng = random.Random(seed)
+	predictions = dict()
+	for idx in range(n_predictors):
+		symbols = 'EHCCT' if idx < 3 else 'EHC'
+		if idx in (5, 11):
+			symbols += 'X?'
+		predictions[f'predictor_{idx}'] = [rng.choice(symbols) for _ in range(n_residues)]
+	return predictions
+
+def assert_matches_legacy(result, predictions):
+	n_residues = len(next(iter(predictions.values())))
+	for residue in range(n_residues):
+		expected = legacy_calc_vkabat([column[residue] for column in predictions.values()])
+		for column, value in expected.items():
+			assert float(result[column][residue]) == float(value), (column, residue)
+
+def test_calc_vkabat_matches_legacy():
+	predictions = random_predictions(500)
+	result = PyVkabat.calc_vkabat_matrix(PyVkabat.encode_predictions(predictions))
+	assert_matches_legacy(result, predictions)
+
+def test_accumulator_matches_legacy():
+	# Unknown symbols first appear in a later group, so the accumulator has to add count columns for them
+	predictions = random_predictions(300, seed=1)
+	items = list(predictions.items())
+	accumulator = PyVkabat.VkabatAccumulator(300)
+	for group in (items[:4], items[4:9], items[9:]):
+		accumulator.add(dict(group))
+	assert accumulator.predictors == list(predictions.keys())
+	assert_matches_legacy(accumulator.result(), predictions)
+
+def test_accumulator_rejects_wrong_length():
+	accumulator = PyVkabat.VkabatAccumulator(10)
+	with pytest.raises(ValueError):
+		accumulator.add({'predictor': ['H'] * 9})
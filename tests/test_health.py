@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import PyVkabat
+
+# The circuit breaker of the health tracker: open after breaker_failures failures in a row, one half-open probe
+# after the cooldown, closed again by a success
+
+@pytest.fixture
+def health(tmp_path, monkeypatch):
+	monkeypatch.setattr(PyVkabat, 'breaker_failures', 3)
+	monkeypatch.setattr(PyVkabat, 'breaker_cooldown', 600)
+	return PyVkabat.HealthTracker(os.path.join(tmp_path, 'health.json'))
+
+def expire_cooldown(health, predictor):
+	health.records[predictor]['opened'] -= PyVkabat.breaker_cooldown
+
+def test_opens_after_failures_in_a_row(health):
+	health.record('JPred', False, 1.0)
+	health.record('JPred', True, 1.0)
+	health.record('JPred', False)
+	health.record('JPred', False)
+	assert health.records['JPred']['state'] == 'closed'
+	assert health.allow('JPred', 'job_1')
+
+	health.record('JPred', False)
+	assert health.records['JPred']['state'] == 'open'
+	assert health.records['JPred']['failures'] == 3
+	assert not health.allow('JPred', 'job_1')
+	assert health.allow('Sympred', 'job_1')
+
+def test_half_open_probe(health):
+	for _ in range(3):
+		health.record('YASPIN', False)
+	expire_cooldown(health, 'YASPIN')
+
+	# one job probes the server, the others keep skipping it until the probe has an outcome
+	assert health.allow('YASPIN', 'job_1')
+	assert health.allow('YASPIN', 'job_1')
+	assert not health.allow('YASPIN', 'job_2')
+
+	# a failed probe opens the circuit for another cooldown
+	health.record('YASPIN', False)
+	assert health.records['YASPIN']['state'] == 'open'
+	assert not health.allow('YASPIN', 'job_2')
+
+	# a cancelled probe gives its turn to the next job, and a successful one closes the circuit
+	expire_cooldown(health, 'YASPIN')
+	assert health.allow('YASPIN', 'job_2')
+	health.release('YASPIN', 'job_2')
+	assert health.allow('YASPIN', 'job_3')
+	health.record('YASPIN', True, 2.5)
+	assert health.records['YASPIN']['state'] == 'closed'
+	assert health.records['YASPIN']['failures'] == 0
+	assert health.allow('YASPIN', 'job_4')
+
+def test_saved_on_state_change_and_flush(health):
+	health.record('PRABI', False)
+	assert not os.path.exists(health.path)
+	health.record('PRABI', False)
+	health.record('PRABI', False)
+	with open(health.path) as health_file:
+		assert json.load(health_file)['PRABI']['state'] == 'open'
+
+	health.record('Sympred', True, 3.0)
+	health.flush()
+	reloaded = PyVkabat.HealthTracker(health.path)
+	assert reloaded.records['Sympred']['latencies'] == [3.0]
+	assert not reloaded.allow('PRABI', 'job_1')
+
+def test_run_chunked_skips_on_open_circuit(monkeypatch):
+	# a window refused by an open circuit breaker skips the runner instead of counting as a failure
+	recorded = []
+	monkeypatch.setattr(PyVkabat, 'health_record', lambda *args: recorded.append(args))
+
+	async def runner(job):
+		if job.sequence.startswith('M'):
+			return {'predictor': ['C'] * len(job.sequence)}
+		raise PyVkabat.CircuitOpenError('predictor skipped')
+
+	job = PyVkabat.VkabatJob('M' + 'A' * 299, 'test')
+	with pytest.raises(PyVkabat.CircuitOpenError):
+		asyncio.run(PyVkabat.run_chunked(runner, job, 200, 'JPred'))
+	assert recorded == []
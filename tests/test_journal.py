@@ -0,0 +1,76 @@
+import asyncio
+import os
+import time
+import types
+
+import pytest
+import requests
+
+import PyVkabat
+
+# The job journal lets a later run reattach to the remote jobs an interrupted run had submitted, and the shared
+# poller keeps checking a results page through transient errors
+
+def test_reattach_after_restart(tmp_path):
+	path = os.path.join(tmp_path, 'journal.jsonl')
+	journal = PyVkabat.JobJournal(path)
+	journal.submitted('key_1', 'JPred', 'seq_1', 'jp_1', 'http://example.org/jp_1')
+	journal.submitted('key_2', 'YASPIN', 'seq_1', 'ya_1', 'http://example.org/ya_1')
+	journal.submitted('key_3', 'Sympred', 'seq_2', 'sy_1', 'http://example.org/sy_1')
+	journal.finished('key_2', 'finished')
+	journal.finished('key_2', 'failed')
+	journal.journal.close()
+	# a crash in the middle of a line
+	with open(path, 'a') as journal_file:
+		journal_file.write('{"event": "finished", "ke')
+
+	reopened = PyVkabat.JobJournal(path)
+	assert reopened.lookup('key_1', 60)['job_id'] == 'jp_1'
+	assert reopened.lookup('key_1', 60)['results_url'] == 'http://example.org/jp_1'
+	assert reopened.lookup('key_2', 60) == None
+	assert reopened.lookup('key_3', 60)['predictor'] == 'Sympred'
+	# too old to be still running on the server
+	reopened.in_flight['key_3']['submitted'] -= 120
+	assert reopened.lookup('key_3', 60) == None
+
+	# the journal was compacted to the jobs in flight
+	reopened.journal.close()
+	with open(path) as journal_file:
+		assert len(journal_file.readlines()) == 2
+
+def make_poller(responses):
+	# A poller whose scheduler answers every check with the next of responses (raising it if it is an exception)
+	async def request(method, url, **kwargs):
+		response = responses.pop(0) if len(responses) > 1 else responses[0]
+		if isinstance(response, Exception):
+			raise response
+		return response
+	scheduler = types.SimpleNamespace(loop=asyncio.get_running_loop(), request=request)
+	return PyVkabat.ResultPoller(scheduler)
+
+@pytest.fixture
+def fast_polls(monkeypatch):
+	monkeypatch.setattr(PyVkabat, 'poll_initial_delay', 0.01)
+	monkeypatch.setattr(PyVkabat, 'poll_max_delay', 0.02)
+
+def test_poll_retries_transient_errors(fast_polls):
+	pending = types.SimpleNamespace(status_code=404, headers={})
+	ready = types.SimpleNamespace(status_code=200, headers={})
+
+	async def poll():
+		poller = make_poller([requests.exceptions.ConnectionError('reset'), pending, requests.exceptions.ReadTimeout('slow'), ready])
+		return await poller.wait_for('JPred', 'http://example.org/jp_1', time.time() + 5)
+	assert asyncio.run(poll()) is ready
+
+def test_poll_fails_when_every_check_fails(fast_polls):
+	async def poll():
+		poller = make_poller([requests.exceptions.ConnectionError('refused')])
+		return await poller.wait_for('JPred', 'http://example.org/jp_1', time.time() + 0.2)
+	with pytest.raises(requests.exceptions.ConnectionError):
+		asyncio.run(poll())
+
+def test_poll_times_out_while_pending(fast_polls):
+	async def poll():
+		poller = make_poller([types.SimpleNamespace(status_code=404, headers={})])
+		return await poller.wait_for('JPred', 'http://example.org/jp_1', time.time() + 0.2)
+	assert asyncio.run(poll()) == None
@@ -0,0 +1,50 @@
+import json
+import os
+import random
+
+import PyVkabat
+
+# The local Chou-Fasman and GOR I predictors
+
+myoglobin = 'VLSEGEWQLVLHVWAKVEADVAGHGQDILIRLFKSHPETLEKFDRFKHLKTEAEMKASEDLKKHGVTVLTALGAILKKKGHHEAELKPLAQSHATKHKIPIKYLEFISEAIIHVLHSRHPGDFGADAQGAMNKALELFRKDIAAKYKELGYQG'
+
+def fraction(prediction, state):
+	return prediction.count(state) / len(prediction)
+
+def test_chou_fasman_myoglobin():
+	# sperm whale myoglobin is about 75% helix and has no sheet
+	prediction = PyVkabat.predict_chou_fasman(myoglobin)
+	assert len(prediction) == len(myoglobin)
+	assert 0.6 < fraction(prediction, 'H') < 0.85
+	assert fraction(prediction, 'E') < 0.3
+	assert 'C' in prediction
+
+def test_chou_fasman_regions_stop():
+	# a proline/glycine stretch ends a helix, and a sequence of breakers has no regions at all
+	prediction = PyVkabat.predict_chou_fasman('AEELLKKAAEELLKKA' + 'GPGPGP' + 'AEELLKKAAEELLKKA')
+	assert prediction[18:20] == ['C'] * 2
+	assert prediction[:16] == ['H'] * 16 and prediction[22:] == ['H'] * 16
+	assert PyVkabat.predict_chou_fasman('GPGPNGSPGPNGSGPG') == ['C'] * 16
+
+def test_chou_fasman_random_sequences():
+	# random sequences break up into many regions instead of one state from end to end
+	for seed in range(5):
+		rng = random.Random(seed)
+		prediction = PyVkabat.predict_chou_fasman(''.join(rng.choice(PyVkabat.amino_acids) for _ in range(300)))
+		assert fraction(prediction, 'C') > 0.1
+		assert sum(a != b for a, b in zip(prediction, prediction[1:])) >= 15
+
+def test_gor1(tmp_path):
+	# C carries no information; H is favoured on A and on the residue before a P, E on V
+	table = {state: {aa: [0] * 17 for aa in PyVkabat.amino_acids} for state in 'CHE'}
+	table['H']['A'][8] = 100
+	table['H']['P'][9] = 100
+	table['E']['V'][8] = 100
+	path = os.path.join(tmp_path, 'gor.json')
+	with open(path, 'w') as table_file:
+		json.dump(table, table_file)
+
+	assert PyVkabat.predict_gor1('AAVVGGSP', path) == list('HHEECCHC')
+	assert PyVkabat.predict_gor1('AAVVGGSP', path, {'H': 0, 'E': 150, 'T': 0, 'C': 0}) == list('EEEEEEEE')
+	assert PyVkabat.predict_gor1('', path) == []
+	assert PyVkabat.predict_local('AAVVGGSP', table_file=path) == {'chou_fasman': PyVkabat.predict_chou_fasman('AAVVGGSP'), 'gor1_local': list('HHEECCHC')}
@@ -0,0 +1,20 @@
+import PyVkabat
+
+# The Prometheus textfile of the metrics recorder
+
+def test_prometheus_labels():
+	recorder = PyVkabat.MetricsRecorder()
+	recorder.record('retrieve', None, 0.3, 'one')
+	recorder.record('poll', 'JPred', 2.0, 'one')
+	recorder.count('http_responses', host='www.compbio.dundee.ac.uk', status=200)
+	recorder.count('cancelled', predictor=None)
+	recorder.count('skipped', predictor='odd "name"\\\n')
+
+	lines = recorder.prometheus_text().splitlines()
+	assert 'pyvkabat_stage_seconds_count{stage="retrieve"} 1' in lines
+	assert 'pyvkabat_stage_seconds_bucket{stage="retrieve",le="+Inf"} 1' in lines
+	assert 'pyvkabat_stage_seconds_sum{stage="poll",predictor="JPred"} 2.0' in lines
+	assert 'pyvkabat_http_responses_total{host="www.compbio.dundee.ac.uk",status="200"} 1' in lines
+	assert 'pyvkabat_cancelled_total 1' in lines
+	assert 'pyvkabat_skipped_total{predictor="odd \\"name\\"\\\\\\n"} 1' in lines
+	assert not any('None' in line for line in lines)
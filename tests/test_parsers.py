@@ -0,0 +1,61 @@
+import pytest
+
+import PyVkabat
+import pyvkabat_mock_server
+
+# The result parsers of PRABI, JPred, Sympred and Yaspin, on small hand-written pages and on the mock server's
+# multi-block pages
+
+sequence = pyvkabat_mock_server.random_sequence(250, seed=3)
+
+def test_prabi_page():
+	page = '<HTML><BODY><CODE>MKVA<BR><font color="blue">h</font><FONT COLOR="red">E</FONT><font>t</font><font>c</font></CODE><P>Sequence length : 4</P></BODY></HTML>'
+	assert PyVkabat.parse_prabi_page(page) == ['H', 'E', 'C', 'C']
+	with pytest.raises(ValueError):
+		PyVkabat.parse_prabi_page('<HTML><BODY>Server busy</BODY></HTML>')
+
+def test_prabi_mock_page():
+	page = pyvkabat_mock_server.make_prabi_page(sequence, seed=5)
+	assignments = pyvkabat_mock_server.random_assignments(len(sequence), 'hect', 5)
+	assert PyVkabat.parse_prabi_page(page) == list(assignments.upper().replace('T', 'C'))
+
+def test_jpred_page():
+	page = '<html><body><code>MKVAGG\nHHE--E\nPLW\n-EE\n</code></body></html>'
+	assert PyVkabat.parse_jpred_page(page) == list('HHECCECEE')
+	with pytest.raises(ValueError):
+		PyVkabat.parse_jpred_page('<html><body>Job not found</body></html>')
+
+def test_jpred_mock_page():
+	page = pyvkabat_mock_server.make_jpred_page(sequence, seed=5)
+	assert PyVkabat.parse_jpred_page(page) == list(pyvkabat_mock_server.random_assignments(len(sequence), 'HE-', 5).replace('-', 'C'))
+
+def test_sympred_result():
+	result = '# SymPred\n\nAA      MKVA\nPHD     HH E\nPROF    EEEE\nSSPRO   H\nJNET     H  \nPSIPRED HHHH\n\nAA      GS\nPHD     EH\nPROF    CC\nJNET    EE\nPSIPRED  H\n'
+	output = PyVkabat.parse_sympred_page(result, n_residues=6)
+	assert output == {'PHD': list('HHCEEH'), 'PROF': list('EEEECC'), 'JNET': list('CHCCEE'), 'PSIPRED': list('HHHHCH')}
+	# without the sequence length the AA track is used
+	assert PyVkabat.parse_sympred_page(result) == output
+
+	with pytest.raises(ValueError):
+		PyVkabat.parse_sympred_page('PHD     HHHH\nAA      MKVA\n')
+	with pytest.raises(ValueError):
+		PyVkabat.parse_sympred_page('# no results\n')
+	with pytest.raises(ValueError):
+		PyVkabat.parse_sympred_page(result, n_residues=7)
+
+def test_sympred_mock_result():
+	output = PyVkabat.parse_sympred_page(pyvkabat_mock_server.make_sympred_result(sequence, seed=5), n_residues=len(sequence))
+	assert list(output.keys()) == list(PyVkabat.sympred_tracks)
+	for idx, track in enumerate(PyVkabat.sympred_tracks):
+		assert output[track] == list(pyvkabat_mock_server.random_assignments(len(sequence), 'HE ', 5 + idx).replace(' ', 'C'))
+
+def test_yaspin_result():
+	result = '*****\n* Pred: not a prediction\n*****\n AA:   MKVA\n Pred: HH-E\n Conf: 9999\n\n AA:   GS\n Pred: -E\n'
+	assert PyVkabat.parse_yaspin_page(result, n_residues=6) == {'YASPIN': list('HHCECE')}
+	assert PyVkabat.parse_yaspin_page(result) == {'YASPIN': list('HHCECE')}
+	with pytest.raises(ValueError):
+		PyVkabat.parse_yaspin_page(result, n_residues=5)
+
+def test_yaspin_mock_result():
+	output = PyVkabat.parse_yaspin_page(pyvkabat_mock_server.make_yaspin_result(sequence, seed=5), n_residues=len(sequence))
+	assert output == {'YASPIN': list(pyvkabat_mock_server.random_assignments(len(sequence), 'HE-', 5).replace('-', 'C'))}
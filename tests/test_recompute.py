@@ -0,0 +1,74 @@
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import PyVkabat
+
+# Recomputing vkabat from stored predictions, keeping or leaving out predictors and whole servers by name
+
+stored_predictors = ('gor1', 'gor3', 'JPred', 'PHD', 'PROF', 'SSPRO', 'JNET', 'PSIPRED', 'YASPIN')
+
+def random_predictions(n_residues, seed):
+	rng = random.Random(seed)
+	return {predictor: [rng.choice('EHCT') for _ in range(n_residues)] for predictor in stored_predictors}
+
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+	# One sequence stored as csv (and as npz, which the csv takes precedence over) in tmp_path/stored
+	monkeypatch.setattr(PyVkabat, 'output_formats', ('csv', 'npz'))
+	stored_directory = os.path.join(tmp_path, 'stored')
+	os.makedirs(stored_directory)
+	predictions = random_predictions(40, 1)
+	PyVkabat.process_data([dict(predictions)], PyVkabat.VkabatJob('X' * 40, 'one', output_directory=stored_directory))
+	monkeypatch.setattr(PyVkabat, 'output_formats', ('csv',))
+	return stored_directory, predictions
+
+def test_expand_predictor_names():
+	assert PyVkabat.expand_predictor_names(['Sympred', 'JPred', 'PHD']) == ['PHD', 'PROF', 'SSPRO', 'JNET', 'PSIPRED', 'JPred']
+	assert PyVkabat.expand_predictor_names(['gor1', 'unknown']) == ['gor1', 'unknown']
+
+def test_select_predictors():
+	assert PyVkabat.select_predictors(stored_predictors) == list(stored_predictors)
+	assert PyVkabat.select_predictors(stored_predictors, exclude=['Sympred']) == ['gor1', 'gor3', 'JPred', 'YASPIN']
+	assert PyVkabat.select_predictors(stored_predictors, keep=['PRABI', 'JPred']) == ['gor1', 'gor3', 'JPred']
+	assert PyVkabat.select_predictors(stored_predictors, keep=['PRABI', 'Sympred'], exclude=['gor3', 'PHD']) == ['gor1', 'PROF', 'SSPRO', 'JNET', 'PSIPRED']
+
+def test_find_stored_predictions(stored):
+	stored_directory, _ = stored
+	assert list(PyVkabat.find_stored_predictions([stored_directory])) == [(os.path.join(stored_directory, 'one_vkabat_dataframe.csv'), 'one')]
+
+def test_recompute_exclude(stored, tmp_path, monkeypatch):
+	stored_directory, predictions = stored
+	output_directory = os.path.join(tmp_path, 'recomputed')
+	os.makedirs(output_directory)
+	monkeypatch.setattr(PyVkabat, 'output_directory', output_directory)
+	monkeypatch.setattr(PyVkabat, 'recompute_exclude', ('Sympred', 'gor3'))
+
+	line = PyVkabat.recompute_file(os.path.join(stored_directory, 'one_vkabat_dataframe.csv'))
+	name, length, status, mean_vkabat, _, n_predictions = line.strip().split(',')
+	assert (name, length, status, n_predictions) == ('one', '40', 'ok', '3')
+
+	kept = {predictor: predictions[predictor] for predictor in ('gor1', 'JPred', 'YASPIN')}
+	expected = PyVkabat.calc_vkabat_matrix(PyVkabat.encode_predictions(kept))
+	df = pd.read_csv(os.path.join(output_directory, 'one_vkabat_dataframe.csv'), index_col=0, keep_default_na=False)
+	assert [column for column in df.columns if column in stored_predictors] == ['gor1', 'JPred', 'YASPIN']
+	np.testing.assert_allclose(df['vkabat'], expected['vkabat'])
+	assert float(mean_vkabat) == pytest.approx(np.nanmean(expected['vkabat']))
+
+	# the npz copy gives the same result
+	npz_line = PyVkabat.recompute_file(os.path.join(stored_directory, 'one_vkabat.npz'))
+	assert npz_line.split(',')[:4] == line.split(',')[:4]
+
+def test_recompute_failures(stored, monkeypatch):
+	stored_directory, _ = stored
+	path = os.path.join(stored_directory, 'one_vkabat_dataframe.csv')
+	# the outputs would overwrite the stored files
+	monkeypatch.setattr(PyVkabat, 'output_directory', stored_directory)
+	assert PyVkabat.recompute_file(path).split(',')[2] == 'failed'
+	# nothing is left to recompute
+	monkeypatch.setattr(PyVkabat, 'output_directory', os.path.dirname(stored_directory))
+	monkeypatch.setattr(PyVkabat, 'recompute_predictors', ('Local',))
+	assert PyVkabat.recompute_file(path).split(',')[2] == 'failed'
@@ -0,0 +1,35 @@
+import asyncio
+import threading
+import time
+
+import PyVkabat
+
+# Every host group gets as many request threads as its max_concurrent, including groups added after the
+# scheduler was made
+
+def test_host_group_added_later_gets_its_own_threads(monkeypatch):
+	running = []
+	lock = threading.Lock()
+	peak = []
+
+	def blocking_call():
+		with lock:
+			running.append(1)
+			peak.append(len(running))
+		time.sleep(0.1)
+		with lock:
+			running.pop()
+		return threading.current_thread().name
+
+	async def run():
+		scheduler = PyVkabat.RequestScheduler(PyVkabat.host_limits, asyncio.get_running_loop())
+		monkeypatch.setitem(PyVkabat.host_limits, 'late.example.org', {'hosts': ['late.example.org'], 'max_concurrent': 8, 'requests_per_second': 1000, 'burst': 8})
+		try:
+			return await asyncio.gather(*[scheduler.call('late.example.org', blocking_call) for _ in range(16)])
+		finally:
+			scheduler.close()
+
+	thread_names = asyncio.run(run())
+	assert max(peak) == 8
+	assert all(name.startswith('pyvkabat_late.example.org') for name in thread_names)
+	assert len(set(thread_names)) == 8
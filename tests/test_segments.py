@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import PyVkabat
+
+# Rolling vkabat profiles and the segments above a threshold, against straightforward per-residue loops
+
+def naive_rolling(vkabat, window):
+	mean, maximum = [], []
+	for position in range(len(vkabat)):
+		values = [value for value in vkabat[max(position - (window - 1) // 2, 0):position + window // 2 + 1] if not np.isnan(value)]
+		mean.append(sum(values) / len(values) if len(values) > 0 else np.nan)
+		maximum.append(max(values) if len(values) > 0 else np.nan)
+	return mean, maximum
+
+@pytest.mark.parametrize('window', [1, 2, 5, 8, 40])
+def test_rolling_vkabat(window):
+	rng = np.random.default_rng(window)
+	vkabat = rng.uniform(1, 8, size=31)
+	vkabat[[0, 7, 8, 9, 10, 11, 12, 13, 30]] = np.nan
+
+	rolling = PyVkabat.rolling_vkabat(vkabat, window)
+	mean, maximum = naive_rolling(vkabat.tolist(), window)
+	np.testing.assert_allclose(rolling['vkabat_mean'], mean)
+	np.testing.assert_allclose(rolling['vkabat_max'], maximum)
+
+def test_find_segments():
+	profile = [1, 5, 5, 2, 4, 4, 4, 1, 6]
+	starts, ends = PyVkabat.find_segments(profile, 4)
+	assert starts.tolist() == [1, 4, 8] and ends.tolist() == [3, 7, 9]
+	starts, ends = PyVkabat.find_segments(profile, 4, min_length=3)
+	assert starts.tolist() == [4] and ends.tolist() == [7]
+	starts, ends = PyVkabat.find_segments(profile, 7)
+	assert len(starts) == 0 and len(ends) == 0
+	# nan is never above the threshold
+	starts, ends = PyVkabat.find_segments([np.nan, 5, np.nan], 4)
+	assert starts.tolist() == [1] and ends.tolist() == [2]
+
+def test_segment_rows():
+	vkabat = [1, 5, 6, np.nan, 2, 4, 4]
+	starts, ends = PyVkabat.find_segments(PyVkabat.rolling_vkabat(vkabat, 1)['vkabat_mean'], 4)
+	rows = PyVkabat.segment_rows('one', vkabat, starts, ends)
+	assert rows == ['one,2,3,2,5.5,6.0\n', 'one,6,7,2,4.0,4.0\n']
+	assert PyVkabat.segment_rows('one', vkabat, starts[:0], ends[:0]) == []
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+
+import PyVkabat
+
+# Submissions to the service, its job queue and its /status report
+
+def test_parse_json_submissions():
+	assert PyVkabat.parse_submission('{"sequence": "mkvlaa", "name": "one"}', 'application/json; charset=utf-8') == [('one', 'MKVLAA')]
+	assert PyVkabat.parse_submission('{"sequence": "MKVLAA"}', 'application/json') == [('test', 'MKVLAA')]
+	fasta = json.dumps({'fasta': '>one\nMKV\nLAA\n>two\nGGSP\n'})
+	assert PyVkabat.parse_submission(fasta, 'application/json') == [('one', 'MKVLAA'), ('two', 'GGSP')]
+
+def test_parse_text_submissions():
+	assert PyVkabat.parse_submission('>one\nMKV\nLAA\n>two\nGGSP\n', 'text/plain') == [('one', 'MKVLAA'), ('two', 'GGSP')]
+	assert PyVkabat.parse_submission(' mkv laa\n', '') == [('test', 'MKVLAA')]
+	assert PyVkabat.parse_submission(f'>a{os.sep}b\nMKV\n', 'text/plain') == [('a_b', 'MKV')]
+
+@pytest.mark.parametrize('body, content_type', [
+	('{"sequence": ', 'application/json'),
+	('["MKV"]', 'application/json'),
+	('{"name": "one"}', 'application/json'),
+	('{"fasta": ""}', 'application/json'),
+	('{"sequence": "MKV1"}', 'application/json'),
+	('>one\nMKV*\n', 'text/plain'),
+	('', 'text/plain')])
+def test_rejected_submissions(body, content_type):
+	with pytest.raises(PyVkabat.ServiceError) as error:
+		PyVkabat.parse_submission(body, content_type)
+	assert error.value.status == 400
+
+def test_queue_survives_restart(tmp_path):
+	path = os.path.join(tmp_path, 'queue.jsonl')
+	queue = PyVkabat.ServiceQueue(path)
+	first, new = queue.add('one', 'MKVLAA')
+	assert new and first['status'] == 'queued'
+	assert queue.add('again', 'MKVLAA') == (first, False)
+	second, _ = queue.add('two', 'GGSP')
+	third, _ = queue.add('three', 'PPGG')
+	queue.update(first['id'], status='finished')
+	queue.update(second['id'], status='running')
+	queue.update(third['id'], status='failed')
+	queue.queue_file.close()
+
+	restarted = PyVkabat.ServiceQueue(path)
+	assert restarted.unfinished() == [second['id']]
+	assert restarted.get(first['id'])['status'] == 'finished'
+	# a failed sequence may be submitted again
+	assert restarted.add('three', 'PPGG')[1]
+	restarted.queue_file.close()
+
+def test_status_reports_health_records(tmp_path, monkeypatch):
+	health = PyVkabat.HealthTracker(os.path.join(tmp_path, 'health.json'))
+	health.record('JPred', True, 10.0)
+	health.record('JPred', True, 20.0)
+	health.record('YASPIN', False)
+	monkeypatch.setattr(PyVkabat, 'get_health', lambda: health)
+	monkeypatch.setattr(PyVkabat, 'get_cache', lambda: None)
+
+	service = PyVkabat.VkabatService(PyVkabat.ServiceQueue(os.path.join(tmp_path, 'queue.jsonl')), tmp_path)
+	status = json.loads(json.dumps(service.status()))
+	assert status['jobs'] == {'queued': 0, 'running': 0, 'finished': 0, 'failed': 0}
+	assert status['health']['JPred']['state'] == 'closed'
+	assert status['health']['JPred']['latency']['p50'] == 15.0
+	assert status['health']['JPred']['last_success'] != None
+	assert status['health']['YASPIN']['failures'] == 1
+	assert status['health']['YASPIN']['latency'] == None
+	service.queue.queue_file.close()